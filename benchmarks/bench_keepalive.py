@@ -0,0 +1,485 @@
+#!/usr/bin/env python3
+"""Offline benchmark for the keepalive watchdog.
+
+Runs main()-equivalent cycles of the watchdog against local stand-ins, with
+no AWS account, Docker daemon or JVMs needed:
+- CloudWatch/SNS: in-process stub clients that record calls and request bytes
+- Docker: a fake Engine API server on a unix socket
+- Java apps: sleeper processes whose argv carries the app's main class
+- Jolokia: a fake bulk-read endpoint fanning wildcard MBeans out to K series
+
+Measures per-phase cycle latency, API calls per cycle, fleet throughput at
+N clusters, peak memory and import time, and writes everything as JSON.
+With --baseline, compares against an earlier results file and exits 1 on
+a regression beyond --tolerance.
+
+    python3 benchmarks/bench_keepalive.py --output bench.json
+    python3 benchmarks/bench_keepalive.py --baseline bench.json --clusters 500 --series 50
+"""
+import argparse
+import collections
+import contextlib
+import json
+import os
+import platform
+import resource
+import shutil
+import socketserver
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MONITORING_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'monitoring')
+sys.path.insert(0, MONITORING_DIR)
+
+import app_supervisor  # noqa: E402
+import docker_api  # noqa: E402
+import fleet  # noqa: E402
+import jmx_collector  # noqa: E402
+import widget_verifier  # noqa: E402
+from aggregator import MetricAggregator, encoded_size  # noqa: E402
+from freshness import FreshnessIndex, series_key  # noqa: E402
+from sinks import PutMetricDataSink  # noqa: E402
+
+try:
+    from anomaly import AnomalyEngine
+except ImportError:  # numpy not installed
+    AnomalyEngine = None
+
+MODULES = ['aggregator', 'anomaly', 'app_supervisor', 'consumer_lag', 'docker_api', 'fleet', 'freshness',
+           'instrumentation', 'jmx_collector', 'log_tailer', 'scheduler', 'sinks', 'spool', 'widget_verifier']
+
+
+class FakeAWS:
+    """Stub CloudWatch + SNS client: answers every call and records it"""
+
+    def __init__(self):
+        self.calls = collections.Counter()
+        self.bytes = collections.Counter()
+
+    def _record(self, operation, kwargs):
+        self.calls[operation] += 1
+        self.bytes[operation] += len(json.dumps(kwargs, default=str, separators=(',', ':')))
+
+    def put_metric_data(self, **kwargs):
+        self._record('PutMetricData', kwargs)
+        return {}
+
+    def get_metric_data(self, **kwargs):
+        self._record('GetMetricData', kwargs)
+        return {'MetricDataResults': [{'Id': q['Id'], 'Values': [1.0]} for q in kwargs['MetricDataQueries']]}
+
+    def publish(self, **kwargs):
+        self._record('Publish', kwargs)
+        return {'MessageId': 'bench'}
+
+
+class FakeDockerDaemon:
+    """Docker Engine API subset served on a unix socket"""
+
+    def __init__(self, socket_path, containers, processes):
+        self.containers = containers
+        self.processes = processes  # [(pid, command line)] reported by /top
+        self.requests = collections.Counter()
+        daemon = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _reply(self, status, body=None):
+                data = json.dumps(body).encode() if body is not None else b''
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _route(self, method):
+                length = int(self.headers.get('Content-Length') or 0)
+                if length:
+                    self.rfile.read(length)
+                path = self.path.split('?', 1)[0].split('/', 2)[-1]  # strip /v1.41
+                parts = path.split('/')
+                route = f"{method} /{parts[0]}/{'{id}/' + parts[2] if len(parts) > 2 else parts[1]}"
+                daemon.requests[route] += 1
+                if route == 'GET /containers/json':
+                    self._reply(200, [{'Names': [f'/{name}'], 'State': 'running', 'Status': 'Up 2 hours'}
+                                      for name in daemon.containers])
+                elif route == 'GET /containers/{id}/top':
+                    self._reply(200, {'Titles': ['PID', 'COMMAND'],
+                                      'Processes': [[str(pid), cmd] for pid, cmd in daemon.processes]})
+                elif route == 'POST /containers/{id}/exec':
+                    self._reply(201, {'Id': 'bench-exec'})
+                else:
+                    self._reply(204)
+
+            def do_GET(self):
+                self._route('GET')
+
+            def do_POST(self):
+                self._route('POST')
+
+            def log_message(self, *args):
+                pass
+
+        class Server(socketserver.ThreadingUnixStreamServer):
+            daemon_threads = True
+            request_queue_size = 128  # like dockerd; the default of 5 refuses concurrent fleet checks
+
+        self.server = Server(socket_path, Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class FakeJolokia:
+    """Bulk-read Jolokia endpoint; every wildcard MBean matches `fanout` concrete MBeans"""
+
+    def __init__(self, fanout):
+        self.fanout = fanout
+        self.tick = 0
+        self.requests = 0
+        # (mbean, attribute) -> composite paths read from it
+        self.paths = collections.defaultdict(set)
+        for metrics in jmx_collector.METRICS_BY_KIND.values():
+            for m in metrics:
+                if m.path:
+                    self.paths[(m.mbean, m.attribute)].add(m.path)
+        jolokia = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                reads = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                jolokia.requests += 1
+                jolokia.tick += 1
+                data = json.dumps([jolokia.reply(r) for r in reads]).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            daemon_threads = True
+            request_queue_size = 128
+
+        self.server = Server(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/jolokia/'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def _value(self, mbean, attribute, i):
+        number = float(self.tick * 10 + i)  # monotonic, so counter deltas stay positive
+        paths = self.paths.get((mbean, attribute))
+        return {p: number for p in paths} if paths else number
+
+    def reply(self, read):
+        mbean, attribute = read['mbean'], read['attribute']
+        if '*' not in mbean:
+            return {'status': 200, 'value': self._value(mbean, attribute, 0)}
+        return {'status': 200, 'value': {mbean.replace('*', f'bench-{i}'): {attribute: self._value(mbean, attribute, i)}
+                                         for i in range(self.fanout)}}
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def spawn_fake_apps(apps):
+    """One sleeping process per app, with the main class as its own argv entry like `java ... Main`"""
+    return [subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(86400)', app.main_class])
+            for app in apps]
+
+
+def summarize(samples):
+    """Latency list -> {p50, p95, max, mean} in seconds"""
+    ordered = sorted(samples)
+    return {
+        'p50': round(statistics.median(ordered), 6),
+        'p95': round(ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)], 6),
+        'max': round(ordered[-1], 6),
+        'mean': round(statistics.fmean(ordered), 6)
+    }
+
+
+def bench_single_host(apps_count, fanout, cycles, samples_per_cycle, workdir):
+    """main()-equivalent cycles for one host: containers, apps, sampling, publish, alerts, verify"""
+    apps = [app_supervisor.AppSpec(f'BenchApp{i}', f'BenchApp{i}', 9200 + i, f'/tmp/bench{i}.log')
+            for i in range(apps_count)]
+    procs = spawn_fake_apps(apps)
+    daemon = FakeDockerDaemon(os.path.join(workdir, 'docker.sock'), docker_api.COMPOSE_CONTAINERS,
+                              [(p.pid, f'java -cp /tmp {app.main_class}') for p, app in zip(procs, apps)])
+    jolokia = FakeJolokia(fanout)
+    aws = FakeAWS()
+    try:
+        docker = docker_api.DockerClient(f"unix://{daemon.server.server_address}")
+        supervisor = app_supervisor.AppSupervisor(docker, apps)
+        targets = [jmx_collector.Target(app.name, 'consumer' if i % 2 else 'producer', None, jolokia.url)
+                   for i, app in enumerate(apps)]
+        targets += [jmx_collector.Target(f'kafka-{b}', 'broker', None, jolokia.url) for b in (1, 2, 3)]
+        jmx = jmx_collector.JolokiaCollector('i-bench', targets, jolokia.url)
+        aggregator = MetricAggregator('statistics')
+        sink = PutMetricDataSink(aws)
+        freshness = FreshnessIndex()
+        freshness.expect(series_key(name, dict(dims, InstanceId='i-bench'))
+                         for name, dims in widget_verifier.WIDGET_METRICS)
+        anomalies = AnomalyEngine() if AnomalyEngine else None
+
+        phases = collections.defaultdict(list)
+        totals = []
+        series = datums = 0
+        jmx.collect()  # prime the counter baselines
+        primed = jolokia.requests
+
+        tracemalloc.start()
+        for _ in range(cycles):
+            cycle_start = time.perf_counter()
+
+            def timed(phase, func):
+                start = time.perf_counter()
+                result = func()
+                phases[phase].append(time.perf_counter() - start)
+                return result
+
+            timed('containers', lambda: docker.container_states(docker_api.COMPOSE_CONTAINERS))
+            timed('apps', supervisor.check)
+            for _ in range(samples_per_cycle):
+                samples = timed('sample', jmx.collect)
+                aggregator.add_samples(samples)
+                if anomalies:
+                    timed('anomaly_observe', lambda: anomalies.observe(samples))
+            series = len(aggregator)
+            flushed = timed('flush', aggregator.flush)
+            datums = len(flushed)
+            timed('publish', lambda: sink.send(flushed))
+            timed('freshness', lambda: (freshness.record(flushed), freshness.alerts_due()))
+            if anomalies:
+                timed('anomaly_evaluate', anomalies.evaluate)
+            timed('verify', lambda: widget_verifier.verify_widgets(aws, 'i-bench'))
+            totals.append(time.perf_counter() - cycle_start)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        return {
+            'params': {'apps': apps_count, 'series_per_wildcard': fanout, 'cycles': cycles,
+                       'samples_per_cycle': samples_per_cycle, 'anomaly_engine': anomalies is not None},
+            'series_per_cycle': series,
+            'datums_per_cycle': datums,
+            'payload_bytes_per_cycle': round(sum(encoded_size(d) for d in flushed)),
+            'cycle_seconds': summarize(totals),
+            'phase_seconds': {phase: summarize(values) for phase, values in phases.items()},
+            'series_per_second': round(series / statistics.median(totals), 1),
+            'aws_calls_per_cycle': {op: n / cycles for op, n in aws.calls.items()},
+            'aws_request_bytes_per_cycle': {op: n / cycles for op, n in aws.bytes.items()},
+            'docker_requests_per_cycle': {route: n / cycles for route, n in daemon.requests.items()},
+            'jolokia_requests_per_cycle': (jolokia.requests - primed) / cycles,
+            'tracemalloc_peak_bytes': peak
+        }
+    finally:
+        for p in procs:
+            p.kill()
+            p.wait()
+        daemon.close()
+        jolokia.close()
+
+
+def bench_fleet(clusters, replicas, ticks, workdir):
+    """Fleet-mode ticks: N clusters sharded over R replicas, measured on one replica"""
+    daemon = FakeDockerDaemon(os.path.join(workdir, 'fleet-docker.sock'), docker_api.COMPOSE_CONTAINERS, [])
+    aws = FakeAWS()
+    try:
+        socket_url = f"unix://{daemon.server.server_address}"
+        targets = [fleet.ClusterTarget(f'cluster-{i}', 'us-west-2', f'i-{i:08x}', socket_url, '/tmp', 'arn:bench',
+                                       docker_api.COMPOSE_CONTAINERS) for i in range(clusters)]
+        leases = fleet.FileLeaseStore(os.path.join(workdir, 'leases'), ttl=3600)
+        for r in range(1, replicas):
+            leases.heartbeat(f'replica-{r}')
+        watchdog = fleet.FleetWatchdog(targets, leases, member_id='replica-0',
+                                       cw_factory=lambda region: aws, sns_factory=lambda region: aws)
+        owned = len(watchdog.rebalance())
+
+        container_ticks, widget_ticks = [], []
+        for _ in range(ticks):
+            start = time.perf_counter()
+            watchdog.rebalance()
+            watchdog.tick_containers()
+            container_ticks.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            watchdog.tick_widgets()
+            widget_ticks.append(time.perf_counter() - start)
+        watchdog.close()
+
+        return {
+            'params': {'clusters': clusters, 'replicas': replicas, 'ticks': ticks},
+            'owned_clusters': owned,
+            'container_tick_seconds': summarize(container_ticks),
+            'widget_tick_seconds': summarize(widget_ticks),
+            'clusters_per_second': round(owned / statistics.median(container_ticks), 1),
+            'aws_calls_per_tick': {op: n / ticks for op, n in aws.calls.items()},
+            'docker_requests_per_tick': {route: n / ticks for route, n in daemon.requests.items()}
+        }
+    finally:
+        daemon.close()
+
+
+def bench_imports(repeat, workdir):
+    """Best-of-N cold import time per module, in fresh interpreters"""
+    results = {}
+    for module in MODULES:
+        code = (f"import sys, time; sys.path.insert(0, {MONITORING_DIR!r}); t = time.perf_counter(); "
+                f"import {module}; print(time.perf_counter() - t)")
+        times = []
+        for _ in range(repeat):
+            proc = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+            if proc.returncode != 0:
+                times = None
+                results[module] = {'skipped': proc.stderr.strip().splitlines()[-1]}
+                break
+            times.append(float(proc.stdout))
+        if times:
+            results[module] = {'seconds': round(min(times), 6)}
+
+    # The watchdog itself: module-level setup creates its clients, spool and tailer
+    env = dict(os.environ, METRIC_SPOOL_DIR=os.path.join(workdir, 'spool'), DOCKER_HOST='unix:///nonexistent',
+               LOG_CHECKPOINT=os.path.join(workdir, 'log-offsets.json'), AWS_DEFAULT_REGION='us-west-2')
+    script = os.path.join(MONITORING_DIR, 'kafka-keepalive.py')
+    code = (f"import importlib.util, sys, time; sys.path.insert(0, {MONITORING_DIR!r}); t = time.perf_counter(); "
+            f"spec = importlib.util.spec_from_file_location('keepalive', {script!r}); "
+            f"spec.loader.exec_module(importlib.util.module_from_spec(spec)); print(time.perf_counter() - t)")
+    times = []
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, env=env)
+        if proc.returncode != 0:
+            results['kafka-keepalive'] = {'skipped': proc.stderr.strip().splitlines()[-1]}
+            break
+        times.append(float(proc.stdout.strip().splitlines()[-1]))
+    if times:
+        results['kafka-keepalive'] = {'seconds': round(min(times), 6)}
+    return results
+
+
+def flatten(results, prefix=''):
+    for key, value in results.items():
+        name = f'{prefix}.{key}' if prefix else key
+        if isinstance(value, dict):
+            yield from flatten(value, name)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield name, value
+
+
+def lower_is_better(name):
+    if '.params.' in name or name.startswith('meta.'):
+        return False
+    return any(word in name for word in ('seconds', 'bytes', 'calls', 'requests'))
+
+
+def compare(current, baseline, tolerance, noise_floor):
+    """Print metric-by-metric deltas; returns the names that regressed"""
+    base = dict(flatten(baseline))
+    regressions = []
+    for name, value in flatten(current):
+        if '.params.' in name and base.get(name, value) != value:
+            print(f"⚠️ {name} differs from the baseline ({base[name]} -> {value}); results are not comparable")
+    print(f"\n{'metric':<70} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, value in flatten(current):
+        if name not in base:
+            continue
+        if not lower_is_better(name) and not name.endswith('_per_second'):
+            continue
+        old = base[name]
+        change = (value - old) / old if old else 0.0
+        worse = change > tolerance if lower_is_better(name) else change < -tolerance
+        # Scheduler jitter on millisecond-scale phases is not a regression
+        if worse and 'seconds' in name and abs(value - old) < noise_floor:
+            worse = False
+        marker = ' ❌' if worse else ''
+        print(f"{name:<70} {old:>12.6g} {value:>12.6g} {change:>+7.1%}{marker}")
+        if worse:
+            regressions.append(name)
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=MONITORING_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--apps', type=int, default=len(app_supervisor.APPS), help='M supervised apps per host')
+    parser.add_argument('--series', type=int, default=5, help='K series per wildcard MBean per target')
+    parser.add_argument('--clusters', type=int, default=100, help='N clusters in the fleet benchmark')
+    parser.add_argument('--replicas', type=int, default=1, help='live fleet replicas sharing the clusters')
+    parser.add_argument('--cycles', type=int, default=20)
+    parser.add_argument('--samples-per-cycle', type=int, default=12,
+                        help='JMX samples per publish (METRIC_COLLECTION_INTERVAL / METRIC_SAMPLE_INTERVAL)')
+    parser.add_argument('--import-repeat', type=int, default=3)
+    parser.add_argument('--skip-imports', action='store_true')
+    parser.add_argument('--output', help='write results JSON here (default: stdout)')
+    parser.add_argument('--baseline', help='results JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative regression (0.2 = 20%%)')
+    parser.add_argument('--noise-floor', type=float, default=0.005,
+                        help='latency changes smaller than this many seconds never count as regressions')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-keepalive-')
+    try:
+        started = time.perf_counter()
+        quiet = open(os.devnull, 'w')
+        results = {
+            'meta': {
+                'timestamp': datetime.utcnow().isoformat() + 'Z',
+                'git_revision': git_revision(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpus': os.cpu_count()
+            },
+        }
+        # The watchdog's emoji logging still runs (and is measured), it just doesn't reach the terminal
+        with contextlib.redirect_stdout(quiet):
+            results['single_host'] = bench_single_host(args.apps, args.series, args.cycles, args.samples_per_cycle,
+                                                       workdir)
+            results['fleet'] = bench_fleet(args.clusters, args.replicas, max(args.cycles // 4, 3), workdir)
+        quiet.close()
+        if not args.skip_imports:
+            results['imports'] = bench_imports(args.import_repeat, workdir)
+        results['meta']['bench_seconds'] = round(time.perf_counter() - started, 2)
+        # ru_maxrss is KiB on Linux
+        results['peak_rss_bytes'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+        print(f"📊 Results written to {args.output}")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance, args.noise_floor)
+        if regressions:
+            print(f"\n🚨 {len(regressions)} metrics regressed by more than {args.tolerance:.0%}")
+            return 1
+        print("\n✅ No regressions against baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
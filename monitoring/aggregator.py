@@ -0,0 +1,159 @@
+"""Client-side pre-aggregation of high-frequency samples for PutMetricData.
+
+Samples taken every few seconds are folded into per-series accumulators and
+flushed once per collection interval as a single datum per series, either as
+a StatisticSet (min/max/sum/count) or as Values/Counts arrays. Series from the
+compiled metric catalog carry their key precomputed, and each series' datum
+template (name, unit, dimensions) is kept across flushes, so a flush only
+fills in values and timestamps. Flushed datums
+are packed into as few PutMetricData requests as the API limits allow, and
+large request bodies are gzip-compressed by botocore.
+
+Counter series (counter=True in the catalog) are sampled as deltas since the
+previous sample, so a flushed Sum is the counter's increase over the whole
+interval, exactly what one sample per interval used to publish. The
+dashboards read every counter with the Sum stat; Average would be the
+per-sample increase and shrink with METRIC_SAMPLE_INTERVAL.
+"""
+import json
+import threading
+from array import array
+from collections import Counter
+from datetime import datetime
+
+MAX_DATUMS_PER_REQUEST = 1000
+MAX_REQUEST_BYTES = 1000000
+MAX_VALUES_PER_DATUM = 150
+COMPRESS_ABOVE_BYTES = 10240
+
+
+class SeriesAccumulator:
+    """Running statistics for one series, plus raw values in 'values' mode"""
+
+    __slots__ = ('metric', 'unit', 'dims', 'minimum', 'maximum', 'total', 'count', 'values')
+
+    def __init__(self, metric, unit, dims, keep_values):
+        self.metric = metric
+        self.unit = unit
+        self.dims = dims
+        self.minimum = float('inf')
+        self.maximum = float('-inf')
+        self.total = 0.0
+        self.count = 0
+        self.values = array('d') if keep_values else None
+
+    def add(self, value):
+        if value < self.minimum:
+            self.minimum = value
+        if value > self.maximum:
+            self.maximum = value
+        self.total += value
+        self.count += 1
+        if self.values is not None:
+            self.values.append(value)
+
+
+class MetricAggregator:
+    """Buffers samples per series between flushes (thread-safe)"""
+
+    def __init__(self, mode='statistics'):
+        if mode not in ('statistics', 'values'):
+            raise ValueError(f"unknown aggregation mode {mode!r}")
+        self.mode = mode
+        self._series = {}
+        self._templates = {}  # key -> datum without values/timestamp, for series seen last flush
+        self._lock = threading.Lock()
+
+    def add(self, metric, value, unit, dims):
+        """Record one sample; dims is the usual [{'Name':..., 'Value':...}] list"""
+        # Interned catalog dims (catalog.SeriesDims) carry their key
+        dim_key = getattr(dims, 'key', None)
+        if dim_key is None:
+            dim_key = tuple((d['Name'], d['Value']) for d in dims)
+        key = (metric, unit, dim_key)
+        with self._lock:
+            acc = self._series.get(key)
+            if acc is None:
+                acc = self._series[key] = SeriesAccumulator(metric, unit, dims, self.mode == 'values')
+            acc.add(float(value))
+
+    def add_samples(self, samples):
+        """Record [(metric, value, unit, dims), ...] from a collector"""
+        for metric, value, unit, dims in samples:
+            self.add(metric, value, unit, dims)
+
+    def __len__(self):
+        return len(self._series)
+
+    def flush(self, timestamp=None):
+        """Swap out the buffered series and return one PutMetricData datum per series"""
+        with self._lock:
+            series, self._series = self._series, {}
+            previous = self._templates
+
+        timestamp = timestamp or datetime.utcnow()
+        datums = []
+        templates = {}
+        for key, acc in series.items():
+            template = previous.get(key)
+            if template is None:
+                template = {'MetricName': acc.metric, 'Unit': acc.unit, 'Dimensions': acc.dims}
+            templates[key] = template
+            base = dict(template, Timestamp=timestamp)
+            if acc.values is None:
+                datums.append(dict(base, StatisticValues={
+                    'SampleCount': acc.count,
+                    'Sum': acc.total,
+                    'Minimum': acc.minimum,
+                    'Maximum': acc.maximum
+                }))
+                continue
+            counts = sorted(Counter(acc.values).items())
+            for i in range(0, len(counts), MAX_VALUES_PER_DATUM):
+                chunk = counts[i:i + MAX_VALUES_PER_DATUM]
+                datums.append(dict(base, Values=[v for v, _ in chunk], Counts=[float(c) for _, c in chunk]))
+        with self._lock:
+            self._templates = templates  # series that stopped reporting drop out
+        return datums
+
+
+def encoded_size(datum):
+    """Conservative estimate of a datum's size in a query-encoded request body"""
+    # Query-protocol keys (MetricData.member.N.Dimensions.member.M.Name=...) roughly
+    # double the JSON size of a datum
+    return 2 * len(json.dumps(datum, default=str))
+
+
+def pack(datums, max_datums=MAX_DATUMS_PER_REQUEST, max_bytes=MAX_REQUEST_BYTES):
+    """Split datums into batches within the per-request datum and size limits"""
+    batch, batch_bytes = [], 0
+    for datum in datums:
+        size = encoded_size(datum)
+        if batch and (len(batch) >= max_datums or batch_bytes + size > max_bytes):
+            yield batch
+            batch, batch_bytes = [], 0
+        batch.append(datum)
+        batch_bytes += size
+    if batch:
+        yield batch
+
+
+def make_client(region, endpoint_url=None):
+    """CloudWatch client that gzips PutMetricData bodies above COMPRESS_ABOVE_BYTES"""
+    import boto3
+    from botocore.config import Config
+    try:
+        config = Config(request_min_compression_size_bytes=COMPRESS_ABOVE_BYTES,
+                        disable_request_compression=False)
+    except TypeError:
+        config = None  # botocore < 1.31 has no request compression
+    return boto3.client('cloudwatch', region_name=region, endpoint_url=endpoint_url, config=config)
+
+
+def publish(cw, datums, namespace='CWAgent'):
+    """Send datums in as few PutMetricData calls as possible, return the call count"""
+    calls = 0
+    for batch in pack(datums):
+        cw.put_metric_data(Namespace=namespace, MetricData=batch)
+        calls += 1
+    return calls
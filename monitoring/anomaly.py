@@ -0,0 +1,176 @@
+"""Streaming rolling-window anomaly/threshold engine.
+
+Keeps the last `window` samples of every series in one preallocated NumPy
+ring buffer (one row per series) and evaluates all rules across all series
+in a single vectorized pass per tick: rolling mean/stddev/percentiles,
+z-score of the latest sample against the rest of the window, and the slope
+of a least-squares trend line. Memory is bounded by max_series * window.
+"""
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+# kind: 'threshold' (latest op value), 'zscore' (|z| > value), 'trend' (slope per sample > value)
+Rule = namedtuple('Rule', ['name', 'metric', 'kind', 'op', 'value', 'min_samples'])
+
+DEFAULT_RULES = [
+    Rule('under-replicated partitions', 'kafka.partition.under_replicated', 'threshold', '>', 0, 1),
+    Rule('offline partitions', 'kafka.partition.offline', 'threshold', '>', 0, 1),
+    Rule('consumer lag high', 'kafka.consumer.records-lag-max', 'threshold', '>', 10000, 1),
+    Rule('consumer lag growing', 'kafka.consumer.records-lag-max', 'trend', '>', 50, 12),
+    Rule('consumer lag spike', 'kafka.consumer.records-lag-max', 'zscore', '>', 4, 24),
+    Rule('consumer group falling behind', 'kafka.consumer.group.lag.sum', 'trend', '>', 100, 10),
+    Rule('produce latency spike', 'kafka.request.time.avg', 'zscore', '>', 4, 24),
+    Rule('producer errors', 'kafka.producer.record-error-rate', 'threshold', '>', 1, 1),
+]
+
+Alert = namedtuple('Alert', ['rule', 'metric', 'dimensions', 'value', 'detail'])
+
+
+class RollingWindows:
+    """Fixed-size ring buffer per series, all series in one 2-D array"""
+
+    def __init__(self, window=120, max_series=10000, initial_capacity=256):
+        self.window = window
+        self.max_series = max_series
+        self.data = np.full((initial_capacity, window), np.nan)
+        self.pos = np.zeros(initial_capacity, dtype=np.int64)
+        self.filled = np.zeros(initial_capacity, dtype=np.int64)
+        self.metric_ids = np.full(initial_capacity, -1, dtype=np.int64)
+        self.rows = {}      # series key -> row
+        self.keys = []      # row -> series key
+        self.metrics = {}   # metric name -> id
+        self.dropped = 0    # samples for series beyond max_series
+
+    def _grow(self):
+        capacity = min(len(self.pos) * 2, self.max_series)
+        extra = capacity - len(self.pos)
+        self.data = np.vstack([self.data, np.full((extra, self.window), np.nan)])
+        self.pos = np.concatenate([self.pos, np.zeros(extra, dtype=np.int64)])
+        self.filled = np.concatenate([self.filled, np.zeros(extra, dtype=np.int64)])
+        self.metric_ids = np.concatenate([self.metric_ids, np.full(extra, -1, dtype=np.int64)])
+
+    def row_for(self, key):
+        row = self.rows.get(key)
+        if row is None:
+            if len(self.keys) >= self.max_series:
+                return None
+            if len(self.keys) == len(self.pos):
+                self._grow()
+            row = self.rows[key] = len(self.keys)
+            self.keys.append(key)
+            self.metric_ids[row] = self.metrics.setdefault(key[0], len(self.metrics))
+        return row
+
+    def push(self, keys, values):
+        """Append one sample to each of the given series (the max of any duplicates)"""
+        rows = []
+        kept = []
+        for key, value in zip(keys, values):
+            row = self.row_for(key)
+            if row is None:
+                self.dropped += 1
+                continue
+            rows.append(row)
+            kept.append(value)
+        if not rows:
+            return
+        rows = np.asarray(rows)
+        values = np.asarray(kept, dtype=float)
+        # Series with several samples in one push (e.g. one per broker) get one: the max,
+        # so the result doesn't depend on which scrape finished last
+        order = np.lexsort((values, rows))
+        rows, values = rows[order], values[order]
+        last = np.append(rows[1:] != rows[:-1], True)
+        rows, values = rows[last], values[last]
+        self.data[rows, self.pos[rows]] = values
+        self.pos[rows] = (self.pos[rows] + 1) % self.window
+        self.filled[rows] = np.minimum(self.filled[rows] + 1, self.window)
+
+    def stats(self):
+        """Vectorized per-series statistics over the live rows"""
+        n = len(self.keys)
+        data = self.data[:n]
+        filled = self.filled[:n]
+        idx = np.arange(n)
+        latest_pos = (self.pos[:n] - 1) % self.window
+        latest = data[idx, latest_pos]
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            total = np.nansum(data, axis=1)
+            # Baseline excludes the latest sample, so a spike doesn't mask itself
+            prev_n = filled - 1
+            prev_mean = (total - latest) / prev_n
+            # Centered sum of squares: E[x²] - E[x]² cancels catastrophically for large, steady values
+            dev = data - prev_mean[:, None]
+            dev[idx, latest_pos] = 0
+            prev_std = np.sqrt(np.nansum(dev * dev, axis=1) / prev_n)
+            zscore = (latest - prev_mean) / prev_std
+
+            # Least-squares slope against sample order (oldest = 0)
+            age = (self.pos[:n, None] - 1 - np.arange(self.window)[None, :]) % self.window
+            t = (self.window - 1 - age).astype(float)
+            t[np.isnan(data)] = np.nan
+            t_mean = np.nanmean(t, axis=1, keepdims=True)
+            x_mean = (total / filled)[:, None]
+            slope = np.nansum((t - t_mean) * (data - x_mean), axis=1) / np.nansum((t - t_mean) ** 2, axis=1)
+
+            mean = total / filled
+            p95 = np.nanpercentile(data, 95, axis=1)
+
+        return {
+            'latest': latest, 'mean': mean, 'p95': p95, 'zscore': zscore,
+            'slope': slope, 'filled': filled, 'std': prev_std
+        }
+
+
+class AnomalyEngine:
+    """Evaluates threshold, z-score and trend rules over every series each tick"""
+
+    def __init__(self, rules=DEFAULT_RULES, window=120, max_series=10000, cooldown=900):
+        self.rules = list(rules)
+        self.windows = RollingWindows(window, max_series)
+        self.cooldown = cooldown
+        self._alerted = {}  # (rule name, series key) -> epoch seconds
+        self._lock = threading.Lock()
+
+    def observe(self, samples):
+        """Feed [(metric, value, unit, dims), ...] from a collector"""
+        keys, values = [], []
+        for metric, value, _, dims in samples:
+            keys.append((metric, tuple((d['Name'], d['Value']) for d in dims)))
+            values.append(value)
+        with self._lock:
+            self.windows.push(keys, values)
+
+    def evaluate(self, now=None):
+        """Return new Alerts (deduplicated with a per-series cool-down)"""
+        now = time.time() if now is None else now
+        with self._lock:
+            w = self.windows
+            if not w.keys:
+                return []
+            stats = w.stats()
+            metric_ids = w.metric_ids[:len(w.keys)]
+            fired = []
+            for rule in self.rules:
+                metric_id = w.metrics.get(rule.metric)
+                if metric_id is None:
+                    continue
+                mask = (metric_ids == metric_id) & (stats['filled'] >= rule.min_samples)
+                series = {'threshold': stats['latest'], 'zscore': stats['zscore'], 'trend': stats['slope']}[rule.kind]
+                observed = np.abs(series) if rule.kind == 'zscore' else series
+                hit = observed > rule.value if rule.op == '>' else observed < rule.value
+                for row in np.flatnonzero(mask & hit):
+                    key = w.keys[row]
+                    last = self._alerted.get((rule.name, key))
+                    if last is not None and now - last < self.cooldown:
+                        continue
+                    self._alerted[(rule.name, key)] = now
+                    detail = (f"latest={stats['latest'][row]:.2f} mean={stats['mean'][row]:.2f} "
+                              f"p95={stats['p95'][row]:.2f} z={stats['zscore'][row]:.1f} "
+                              f"slope={stats['slope'][row]:.2f}/sample")
+                    fired.append(Alert(rule.name, key[0], key[1], float(stats['latest'][row]), detail))
+            return fired
@@ -0,0 +1,190 @@
+"""Supervisor for the Java producer/consumer apps running inside kafka-1.
+
+Apps are declared once in APPS. The supervisor tracks each app's real PID,
+checks liveness with signal 0 plus /proc/<pid>/cmdline (no process listing),
+and only lists the container's processes when an app has no known PID.
+Restarts use exponential backoff, and an app that keeps crashing trips a
+circuit breaker instead of getting a new JVM every check.
+
+Every app JVM gets remote JMX (published from kafka-1 on its jmx_port, with
+the RMI port pinned to it so it works through Docker's port mapping) and a
+Jolokia agent on jmx_port + JOLOKIA_PORT_OFFSET for the collector.
+"""
+import os
+import time
+from collections import deque, namedtuple
+
+CONTAINER = 'kafka-1'
+CLASSPATH = '/tmp:/usr/share/java/kafka/*:/usr/share/java/cp-base-new/*'
+JOLOKIA_AGENT = '/opt/jolokia/jolokia-jvm-agent.jar'  # infrastructure/jolokia, mounted by docker-compose
+JOLOKIA_PORT_OFFSET = 1000
+# Plain `java` ignores KAFKA_JMX_OPTS (only kafka-run-class reads it), so these go on the command line
+JVM_OPTS = ('-Dcom.sun.management.jmxremote -Dcom.sun.management.jmxremote.port={port} '
+            '-Dcom.sun.management.jmxremote.rmi.port={port} -Djava.rmi.server.hostname=localhost '
+            '-Dcom.sun.management.jmxremote.authenticate=false -Dcom.sun.management.jmxremote.ssl=false '
+            '-javaagent:{agent}=host=0.0.0.0,port={jolokia_port}')
+
+AppSpec = namedtuple('AppSpec', ['name', 'main_class', 'jmx_port', 'log_path'])
+
+APPS = [
+    AppSpec('KafkaProducer1', 'KafkaProducer1', 9104, '/tmp/producer1.log'),
+    AppSpec('KafkaProducer2', 'KafkaProducer2', 9105, '/tmp/producer2.log'),
+    AppSpec('KafkaConsumer1', 'KafkaConsumer1', 9106, '/tmp/consumer1.log'),
+    AppSpec('KafkaConsumer2', 'KafkaConsumer2', 9107, '/tmp/consumer2.log'),
+    AppSpec('HighThroughputProducer', 'HighThroughputProducer', 9108, '/tmp/high-throughput.log'),
+    AppSpec('ContinuousProducer', 'ContinuousProducer', 9109, '/tmp/continuous-producer.log'),  # 72-hour run
+    AppSpec('ContinuousConsumer', 'ContinuousConsumer', 9110, '/tmp/continuous-consumer.log'),  # 72-hour run
+]
+
+
+def jolokia_port(app):
+    """Port of the app's Jolokia agent (published from kafka-1 like the JMX port)"""
+    return app.jmx_port + JOLOKIA_PORT_OFFSET
+
+
+def launch_command(app):
+    """Shell command that starts an app with JMX and Jolokia enabled (appending, so logs can be copytruncated)"""
+    opts = JVM_OPTS.format(port=app.jmx_port, agent=JOLOKIA_AGENT, jolokia_port=jolokia_port(app))
+    return f'java {opts} -cp {CLASSPATH} {app.main_class} >> {app.log_path} 2>&1'
+
+
+def pid_alive(pid, main_class):
+    """Cheap liveness check: signal 0, then confirm the PID wasn't reused"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # exists, owned by someone else
+    try:
+        with open(f'/proc/{pid}/cmdline', 'rb') as f:
+            return main_class.encode() in f.read().split(b'\0')
+    except OSError:
+        return False
+
+
+class AppState:
+    """Runtime state for one supervised app"""
+
+    def __init__(self, app):
+        self.app = app
+        self.pid = None
+        self.started_at = None
+        self.launched_at = None  # launched but PID not discovered yet
+        self.restarts = 0
+        self.consecutive_failures = 0
+        self.next_attempt = 0.0
+        self.circuit_open_until = 0.0
+        self.recent_restarts = deque()
+
+    def uptime(self, now=None):
+        if self.started_at is None:
+            return 0.0
+        return (time.time() if now is None else now) - self.started_at
+
+
+class AppSupervisor:
+    """Keeps every app in APPS running, with backoff and crash-loop detection"""
+
+    def __init__(self, docker, apps=APPS, container=CONTAINER, backoff_base=5, backoff_max=300,
+                 stable_after=120, launch_grace=30, crash_loop_restarts=5, crash_loop_window=900,
+                 crash_loop_cooldown=1800, clock=time.time):
+        self.docker = docker
+        self.clock = clock
+        self.container = container
+        self.states = {app.name: AppState(app) for app in apps}
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stable_after = stable_after
+        self.launch_grace = launch_grace
+        self.crash_loop_restarts = crash_loop_restarts
+        self.crash_loop_window = crash_loop_window
+        self.crash_loop_cooldown = crash_loop_cooldown
+
+    def discover(self):
+        """Map main class -> PID from one process listing of the container"""
+        pids = {}
+        classes = {state.app.main_class for state in self.states.values()}
+        for proc in self.docker.top(self.container):
+            args = (proc.get('COMMAND') or proc.get('CMD') or '').split()
+            if not args or 'java' not in os.path.basename(args[0]):
+                continue  # skip the `bash -c` wrapper
+            for main_class in classes.intersection(args):
+                pids[main_class] = int(proc['PID'])
+        return pids
+
+    def check(self):
+        """Check every app, restart the dead ones that are due; returns names restarted"""
+        now = self.clock()
+        unknown = []
+        for state in self.states.values():
+            if state.pid and pid_alive(state.pid, state.app.main_class):
+                if state.uptime(now) >= self.stable_after:
+                    state.consecutive_failures = 0
+                continue
+            if state.pid:
+                print(f"💥 {state.app.name} (pid {state.pid}) exited after {state.uptime(now):.0f}s")
+                state.pid = None
+                state.started_at = None
+            unknown.append(state)
+
+        if not unknown:
+            return []
+
+        pids = self.discover()
+        restarted = []
+        for state in unknown:
+            pid = pids.get(state.app.main_class)
+            if pid:
+                state.pid = pid
+                state.started_at = state.launched_at or now
+                state.launched_at = None
+                continue
+            if state.launched_at and now - state.launched_at < self.launch_grace:
+                continue  # JVM still starting
+            state.launched_at = None
+            if self._restart(state, now):
+                restarted.append(state.app.name)
+        return restarted
+
+    def _restart(self, state, now):
+        if now < state.circuit_open_until:
+            return False
+        if now < state.next_attempt:
+            return False
+
+        while state.recent_restarts and now - state.recent_restarts[0] > self.crash_loop_window:
+            state.recent_restarts.popleft()
+        if len(state.recent_restarts) >= self.crash_loop_restarts:
+            state.circuit_open_until = now + self.crash_loop_cooldown
+            state.recent_restarts.clear()
+            print(f"🚫 {state.app.name} is crash-looping ({self.crash_loop_restarts} restarts in "
+                  f"{self.crash_loop_window}s) - pausing restarts for {self.crash_loop_cooldown}s")
+            return False
+
+        print(f"🔄 Restarting {state.app.name}...")
+        try:
+            self.docker.exec_detached(self.container, ['bash', '-c', launch_command(state.app)])
+        except Exception as e:
+            print(f"❌ Failed to restart {state.app.name}: {e}")
+        state.restarts += 1
+        state.consecutive_failures += 1
+        state.recent_restarts.append(now)
+        state.launched_at = now
+        delay = min(self.backoff_base * 2 ** (state.consecutive_failures - 1), self.backoff_max)
+        state.next_attempt = now + delay
+        return True
+
+    def stats(self):
+        """Per-app PID, restart count, uptime and circuit state"""
+        now = self.clock()
+        return {
+            name: {
+                'pid': s.pid,
+                'restarts': s.restarts,
+                'uptime': round(s.uptime(now), 1),
+                'consecutive_failures': s.consecutive_failures,
+                'circuit_open': now < s.circuit_open_until
+            }
+            for name, s in self.states.items()
+        }
@@ -0,0 +1,348 @@
+"""Metric catalog: every series the watchdog publishes, declared once.
+
+Each entry maps a JMX MBean attribute onto the CloudWatch metric name, unit
+and dimensions the dashboards use, and names the series the dashboard widgets
+expect. The Jolokia collector, the widget verifier, the CloudWatch agent
+config and the dashboard optimizer are all generated from it.
+
+CompiledCatalog compiles the catalog once per instance: every series gets one
+interned Dimensions list (with its aggregation key precomputed) on first
+sight, which every later sample and flush reuses. A cardinality guard caps
+the distinct group/topic/client-id series per metric; series beyond the cap are
+rolled into one 'other' series per metric, and slots idle for longer than
+idle_after are recycled. Dashboard series are pinned and never rolled up.
+The per-group consumer lag series (lag_catalog(), fed from committed offsets
+rather than JMX) go through the same guard, capped per group/topic.
+
+    python3 catalog.py agent-config > ../configs/cloudwatch-agent-config.json
+    python3 catalog.py widgets
+"""
+import json
+import os
+import sys
+import threading
+import time
+from collections import namedtuple
+
+CLUSTER_NAME = os.environ.get('KAFKA_CLUSTER_NAME', 'kafka-cluster')
+# Distinct group/topic/client-id series per metric before new ones roll into 'other' (0 disables the guard)
+MAX_SERIES_PER_METRIC = int(os.environ.get('METRIC_MAX_SERIES_PER_METRIC', '20'))
+SERIES_IDLE_AFTER = int(os.environ.get('METRIC_SERIES_IDLE_AFTER', '3600'))
+GUARDED_DIMS = ('client-id', 'group', 'topic')
+OTHER = 'other'
+
+# The series the dashboard widgets are built around
+PRODUCER_CLIENT = 'dashboard-java-producer'
+CONSUMER_CLIENT = 'dashboard-java-consumer'
+TOPIC = 'dashboard-metrics-test'
+YOUNG_GC = 'G1 Young Generation'
+
+# kind: which Jolokia targets expose it (producer, consumer, broker)
+# mbean pattern, attribute, path into composite value, metric name, unit,
+# mbean key properties copied into dimensions, static dimensions, counter?,
+# key dimension values of the dashboard series (None: no widget checks it),
+# how one series scraped from several targets (one per broker) is combined:
+# 'sum' for counts and rates, 'max' for gauges
+MetricSpec = namedtuple('MetricSpec', ['kind', 'mbean', 'attribute', 'path', 'metric', 'unit',
+                                       'key_dims', 'dims', 'counter', 'expected', 'reduce'])
+
+
+def _spec(kind, mbean, attribute, metric, unit, key_dims=None, dims=None, path=None, counter=False, expected=None,
+          reduce=None):
+    if reduce is None:
+        reduce = 'sum' if counter or unit.endswith('/Second') else 'max'
+    return MetricSpec(kind, mbean, attribute, path, metric, unit, key_dims or {}, dims or {}, counter, expected,
+                      reduce)
+
+
+_PRODUCER = 'kafka.producer:type=producer-metrics,client-id=*'
+_PRODUCER_TOPIC = 'kafka.producer:type=producer-topic-metrics,client-id=*,topic=*'
+_CONSUMER = 'kafka.consumer:type=consumer-fetch-manager-metrics,client-id=*'
+_CONSUMER_TOPIC = 'kafka.consumer:type=consumer-fetch-manager-metrics,client-id=*,topic=*'
+_GC = 'java.lang:type=GarbageCollector,name=*'
+_CLIENT = {'client-id': 'client-id'}
+_CLIENT_TOPIC = {'client-id': 'client-id', 'topic': 'topic'}
+_PRODUCER_GROUP = {'ProducerGroupName': 'KafkaProducer'}
+_CONSUMER_GROUP = {'ConsumerGroupName': 'KafkaConsumer'}
+_PRODUCER_SERIES = {'client-id': PRODUCER_CLIENT}
+_PRODUCER_TOPIC_SERIES = {'client-id': PRODUCER_CLIENT, 'topic': TOPIC}
+_CONSUMER_SERIES = {'client-id': CONSUMER_CLIENT}
+_CONSUMER_TOPIC_SERIES = {'client-id': CONSUMER_CLIENT, 'topic': TOPIC}
+_JVM = {'ProcessGroupName': CLUSTER_NAME}
+_CLUSTER = {'ClusterName': CLUSTER_NAME}
+
+
+def _jvm_specs():
+    specs = [
+        _spec('broker', 'java.lang:type=ClassLoading', 'LoadedClassCount', 'jvm.classes.loaded', 'Count',
+              dims=_JVM, expected={}),
+    ]
+    # GC widgets query both ProcessGroupName values
+    for group in (CLUSTER_NAME, 'KafkaClusterName'):
+        specs += [
+            _spec('broker', _GC, 'CollectionCount', 'jvm.gc.collections.count', 'Count', {'name': 'name'},
+                  {'ProcessGroupName': group}, counter=True, expected={'name': YOUNG_GC}),
+            _spec('broker', _GC, 'CollectionTime', 'jvm.gc.collections.elapsed', 'Milliseconds', {'name': 'name'},
+                  {'ProcessGroupName': group}, counter=True, expected={'name': YOUNG_GC}),
+        ]
+    for attribute, area in (('HeapMemoryUsage', 'heap'), ('NonHeapMemoryUsage', 'nonheap')):
+        for path in ('committed', 'max', 'used'):
+            specs.append(_spec('broker', 'java.lang:type=Memory', attribute, f'jvm.memory.{area}.{path}', 'Bytes',
+                               dims=_JVM, path=path, expected={}))
+    specs.append(_spec('broker', 'java.lang:type=Threading', 'ThreadCount', 'jvm.threads.count', 'Count',
+                       dims=_JVM, expected={}))
+    return specs
+
+
+CATALOG = [
+    _spec('producer', _PRODUCER, 'request-rate', 'kafka.producer.request-rate', 'Count/Second',
+          _CLIENT, _PRODUCER_GROUP, expected=_PRODUCER_SERIES),
+    _spec('producer', _PRODUCER, 'response-rate', 'kafka.producer.response-rate', 'Count/Second',
+          _CLIENT, _PRODUCER_GROUP, expected=_PRODUCER_SERIES),
+    _spec('producer', _PRODUCER, 'request-latency-avg', 'kafka.producer.request-latency-avg', 'Milliseconds',
+          _CLIENT, _PRODUCER_GROUP, expected=_PRODUCER_SERIES),
+    _spec('producer', _PRODUCER_TOPIC, 'record-send-rate', 'kafka.producer.record-send-rate', 'Count/Second',
+          _CLIENT_TOPIC, _PRODUCER_GROUP, expected=_PRODUCER_TOPIC_SERIES),
+    _spec('producer', _PRODUCER_TOPIC, 'record-error-rate', 'kafka.producer.record-error-rate', 'Count/Second',
+          _CLIENT_TOPIC, _PRODUCER_GROUP, expected=_PRODUCER_TOPIC_SERIES),
+    _spec('producer', _PRODUCER_TOPIC, 'byte-rate', 'kafka.producer.byte-rate', 'Bytes/Second',
+          _CLIENT_TOPIC, _PRODUCER_GROUP, expected=_PRODUCER_TOPIC_SERIES),
+
+    _spec('consumer', _CONSUMER, 'fetch-rate', 'kafka.consumer.fetch-rate', 'Count/Second',
+          _CLIENT, _CONSUMER_GROUP, expected=_CONSUMER_SERIES),
+    _spec('consumer', _CONSUMER, 'bytes-consumed-rate', 'kafka.consumer.total.bytes-consumed-rate', 'Bytes/Second',
+          _CLIENT, _CONSUMER_GROUP, expected=_CONSUMER_SERIES),
+    _spec('consumer', _CONSUMER, 'records-lag-max', 'kafka.consumer.records-lag-max', 'Count',
+          _CLIENT, _CONSUMER_GROUP, expected=_CONSUMER_SERIES),
+    _spec('consumer', _CONSUMER_TOPIC, 'records-consumed-rate', 'kafka.consumer.records-consumed-rate', 'Count/Second',
+          _CLIENT_TOPIC, _CONSUMER_GROUP, expected=_CONSUMER_TOPIC_SERIES),
+    _spec('consumer', _CONSUMER_TOPIC, 'bytes-consumed-rate', 'kafka.consumer.bytes-consumed-rate', 'Bytes/Second',
+          _CLIENT_TOPIC, _CONSUMER_GROUP, expected=_CONSUMER_TOPIC_SERIES),
+
+    _spec('broker', 'kafka.server:type=ReplicaManager,name=IsrExpandsPerSec', 'Count',
+          'kafka.isr.operation.count', 'Count', dims=dict(_CLUSTER, operation='expand'), counter=True, expected={}),
+    _spec('broker', 'kafka.server:type=ReplicaManager,name=IsrShrinksPerSec', 'Count',
+          'kafka.isr.operation.count', 'Count', dims=dict(_CLUSTER, operation='shrink'), counter=True),
+    _spec('broker', 'kafka.controller:type=ControllerStats,name=LeaderElectionRateAndTimeMs', 'OneMinuteRate',
+          'kafka.leader.election.rate', 'Count/Second', dims=_CLUSTER, expected={}),
+    _spec('broker', 'kafka.server:type=BrokerTopicMetrics,name=BytesInPerSec', 'OneMinuteRate',
+          'kafka.network.io', 'Bytes/Second', dims=dict(_CLUSTER, state='in'), expected={}),
+    _spec('broker', 'kafka.server:type=BrokerTopicMetrics,name=BytesOutPerSec', 'OneMinuteRate',
+          'kafka.network.io', 'Bytes/Second', dims=dict(_CLUSTER, state='out')),
+    _spec('broker', 'kafka.controller:type=KafkaController,name=OfflinePartitionsCount', 'Value',
+          'kafka.partition.offline', 'Count', dims=_CLUSTER, expected={}),
+    _spec('broker', 'kafka.server:type=ReplicaManager,name=UnderReplicatedPartitions', 'Value',
+          'kafka.partition.under_replicated', 'Count', dims=_CLUSTER, expected={}, reduce='sum'),
+    _spec('broker', 'kafka.server:type=DelayedOperationPurgatory,delayedOperation=Produce,name=PurgatorySize', 'Value',
+          'kafka.purgatory.size', 'Count', dims=dict(_CLUSTER, type='produce'), expected={}, reduce='sum'),
+    _spec('broker', 'kafka.network:type=RequestMetrics,name=RequestsPerSec,request=Produce', 'Count',
+          'kafka.request.count', 'Count', dims=dict(_CLUSTER, type='produce'), counter=True, expected={}),
+    _spec('broker', 'kafka.server:type=BrokerTopicMetrics,name=FailedProduceRequestsPerSec', 'Count',
+          'kafka.request.failed', 'Count', dims=dict(_CLUSTER, type='produce'), counter=True, expected={}),
+    _spec('broker', 'kafka.network:type=RequestMetrics,name=TotalTimeMs,request=Produce', 'Mean',
+          'kafka.request.time.avg', 'Milliseconds', dims=dict(_CLUSTER, type='produce'), expected={}),
+] + _jvm_specs()
+
+
+def lag_catalog(cluster_name=CLUSTER_NAME):
+    """Series consumer_lag.LagEngine publishes per consumer group and topic (no MBean behind them)"""
+    group_topic = {'group': 'group', 'topic': 'topic'}
+    cluster = {'ClusterName': cluster_name}
+    return [
+        _spec('lag', None, None, 'kafka.consumer.group.lag.max', 'Count', group_topic, cluster),
+        _spec('lag', None, None, 'kafka.consumer.group.lag.sum', 'Count', group_topic, cluster, reduce='sum'),
+        _spec('lag', None, None, 'kafka.consumer.group.lag.p99', 'Count', group_topic, cluster),
+        _spec('lag', None, None, 'kafka.consumer.group.lag.rate', 'Count/Second', group_topic, cluster),
+        _spec('lag', None, None, 'kafka.consumer.group.time-to-catch-up', 'Seconds', group_topic, cluster),
+    ]
+
+
+REDUCERS = {'sum': lambda a, b: a + b, 'max': max}
+
+
+def reduce_samples(samples, ops):
+    """Merge samples of one series (same interned dims) into one; ops maps metric -> 'sum' or 'max'"""
+    merged = {}
+    for sample in samples:
+        metric, value, unit, dims = sample
+        key = (metric, unit, dims.key)
+        previous = merged.get(key)
+        if previous is not None:
+            sample = (metric, REDUCERS[ops.get(metric, 'max')](previous[1], value), unit, dims)
+        merged[key] = sample
+    return list(merged.values())
+
+
+def by_kind(catalog=CATALOG):
+    """{target kind: [MetricSpec, ...]}"""
+    kinds = {}
+    for spec in catalog:
+        kinds.setdefault(spec.kind, []).append(spec)
+    return kinds
+
+
+def widget_series(catalog=CATALOG):
+    """[(metric, dims without InstanceId), ...] for every series a dashboard widget expects"""
+    series = []
+    for spec in catalog:
+        if spec.expected is None:
+            continue
+        dims = dict(spec.dims)
+        dims.update((dim, spec.expected[dim]) for dim in spec.key_dims.values() if dim in spec.expected)
+        if (spec.metric, dims) not in series:
+            series.append((spec.metric, dims))
+    return series
+
+
+def known_series(catalog=CATALOG):
+    """[(metric, dims, dynamic dim names), ...] for every series whose dimensions the catalog can name"""
+    series = []
+    for spec in catalog:
+        if spec.key_dims and spec.expected is None:
+            continue  # values only known at scrape time
+        dims = dict(spec.dims)
+        dims.update((dim, spec.expected[dim]) for dim in spec.key_dims.values() if dim in spec.expected)
+        entry = (spec.metric, dims, frozenset(spec.key_dims.values()))
+        if entry not in series:
+            series.append(entry)
+    return series
+
+
+def agent_config(catalog=CATALOG, interval=60, jmx_host='127.0.0.1', jmx_port='9999'):
+    """CloudWatch agent config collecting every catalog metric"""
+    sections = {}
+    for spec in catalog:
+        sections.setdefault(spec.metric.split('.')[0], set()).add(spec.metric)
+    return {
+        'agent': {'metrics_collection_interval': interval, 'run_as_user': 'cwagent'},
+        'metrics': {
+            'namespace': 'CWAgent',
+            'metrics_collected': {
+                section: {
+                    'measurement': sorted(metrics),
+                    'metrics_collection_interval': interval,
+                    'totalmetrics': False,
+                    'jmx': {'host': jmx_host, 'port': jmx_port}
+                } for section, metrics in sorted(sections.items())
+            }
+        },
+        'logs': {'metrics_collected': {'emf': {}}}
+    }
+
+
+class SeriesDims(list):
+    """Interned Dimensions list carrying its (Name, Value) aggregation key"""
+
+    __slots__ = ('key',)
+
+
+class CompiledCatalog:
+    """Catalog compiled for one instance: interned series dimensions behind a cardinality guard"""
+
+    def __init__(self, instance_id, catalog=CATALOG, max_series=MAX_SERIES_PER_METRIC, idle_after=SERIES_IDLE_AFTER):
+        self.instance_id = instance_id
+        self.catalog = catalog
+        self.max_series = max_series
+        self.idle_after = idle_after
+        self.by_kind = {}  # target kind -> [(index, MetricSpec), ...]
+        self._static = []  # index -> InstanceId + static Dimensions
+        self._guarded = []  # index -> positions of guarded key dims
+        for index, spec in enumerate(catalog):
+            self.by_kind.setdefault(spec.kind, []).append((index, spec))
+            self._static.append([{'Name': 'InstanceId', 'Value': instance_id}] +
+                                [{'Name': k, 'Value': v} for k, v in spec.dims.items()])
+            self._guarded.append([n for n, dim in enumerate(spec.key_dims.values()) if dim in GUARDED_DIMS])
+        self._resolved = {}  # (index, key values) -> (SeriesDims, last-seen map or None)
+        self._others = {}  # (index, rolled-up key values) -> SeriesDims
+        self._admitted = {}  # metric -> {(index, key values): last seen}
+        self._pinned = set()
+        self.rolled_up = {}  # metric -> {(index, key values) currently in 'other'}
+        self._lock = threading.Lock()
+        for index, spec in enumerate(catalog):
+            if spec.expected is not None and self._guarded[index]:
+                key = (index, tuple(spec.expected.get(dim) for dim in spec.key_dims.values()))
+                self._pinned.add(key)
+                self._admitted.setdefault(spec.metric, {})[key] = float('inf')
+
+    def _build(self, index, values):
+        spec = self.catalog[index]
+        dims = SeriesDims(self._static[index])
+        dims.extend({'Name': dim, 'Value': value} for dim, value in zip(spec.key_dims.values(), values)
+                    if value is not None)
+        dims.key = tuple((d['Name'], d['Value']) for d in dims)
+        return dims
+
+    def dims(self, index, values, now=None):
+        """Interned Dimensions for catalog entry index with key dim values (in key_dims order, None if absent)"""
+        key = (index, values)
+        if now is None:
+            now = time.monotonic()
+        entry = self._resolved.get(key)
+        if entry is not None and entry[1] is None:
+            return entry[0]  # unguarded or rolled up: no slot to keep alive
+        with self._lock:
+            # Last-seen is written under the lock that _evict_idle deletes under, and re-resolved
+            # if the slot was recycled meanwhile, so an evicted key can't come back without one
+            entry = self._resolved.get(key) or self._resolve(key, now)
+            dims, seen = entry
+            if seen is not None:
+                seen[key] = now
+        return dims
+
+    def _resolve(self, key, now):
+        index, values = key
+        guarded = self._guarded[index]
+        seen = None
+        if guarded and self.max_series:
+            metric = self.catalog[index].metric
+            seen = self._admitted.setdefault(metric, {})
+            if key not in seen and len(seen) >= self.max_series:
+                self._evict_idle(metric, seen, now)
+            if key not in seen and len(seen) >= self.max_series:
+                rolled = self.rolled_up.setdefault(metric, set())
+                if not rolled:
+                    dims = '/'.join(dim for dim in self.catalog[index].key_dims.values() if dim in GUARDED_DIMS)
+                    print(f"⚠️ {metric} has {len(seen)} {dims} series - rolling new ones into '{OTHER}'")
+                rolled.add(key)
+                other = (index, tuple(OTHER if n in guarded and v is not None else v for n, v in enumerate(values)))
+                if other not in self._others:
+                    self._others[other] = self._build(*other)
+                self._resolved[key] = entry = (self._others[other], None)
+                return entry
+        self._resolved[key] = entry = (self._build(index, values), seen)
+        if seen is not None:
+            seen[key] = now
+        return entry
+
+    def _evict_idle(self, metric, seen, now):
+        idle = [k for k, last in seen.items() if now - last > self.idle_after and k not in self._pinned]
+        for k in idle:
+            del seen[k]
+            self._resolved.pop(k, None)
+        if idle:
+            # Series rolled into 'other' get another chance at a free slot
+            for k in self.rolled_up.pop(metric, ()):
+                self._resolved.pop(k, None)
+
+    def stats(self):
+        """{metric: (admitted series, series rolled into 'other')} for guarded metrics"""
+        with self._lock:
+            return {metric: (len(seen), len(self.rolled_up.get(metric, ())))
+                    for metric, seen in self._admitted.items()}
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else 'widgets'
+    if command == 'agent-config':
+        print(json.dumps(agent_config(), indent=2))
+    elif command == 'widgets':
+        for metric, dims in widget_series():
+            print(f"{metric} {' '.join(f'{k}={v}' for k, v in dims.items())}")
+    else:
+        print(f"usage: {sys.argv[0]} [agent-config|widgets]")
+        return 2
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,294 @@
+"""Incremental per-partition consumer-lag engine.
+
+Committed and log-end offsets for every (group, topic, partition) come from
+a pluggable offset source in one batched fetch per tick, and are kept in
+columnar NumPy arrays (one row per partition). Each tick only touches the
+rows that were fetched: consume/produce rates are exponentially weighted
+from the offset deltas since the previous tick, and max/sum/p99 lag, lag
+rate and time-to-catch-up are recomputed only over the rows of (group, topic)
+pairs whose offsets or rates actually changed. Rows of partitions that stop
+being reported expire after stale_after seconds and are reused.
+
+Published series get their dimensions from a CompiledCatalog over
+catalog.lag_catalog(), so the unbounded group x topic space sits behind the
+same cardinality guard as the JMX series: past the per-metric cap, new
+pairs roll into group/topic 'other' (one sample per tick, summed or maxed
+per the catalog's reduce op).
+
+Sources yield PartitionOffsets. ConsumerGroupsSource streams the output of
+`kafka-consumer-groups --describe --all-groups` from inside a broker
+container; DescribeFileSource replays recorded output of the same command.
+"""
+import itertools
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+import docker_api
+from catalog import CompiledCatalog, lag_catalog, reduce_samples
+
+CONSUMER_GROUPS_CMD = '/usr/bin/kafka-consumer-groups'
+
+PartitionOffsets = namedtuple('PartitionOffsets', ['group', 'topic', 'partition', 'committed', 'log_end'])
+LagSummary = namedtuple('LagSummary', ['group', 'topic', 'partitions', 'max_lag', 'sum_lag', 'p99_lag',
+                                       'lag_rate', 'time_to_catch_up'])
+
+
+def _offset(value):
+    return float('nan') if value == '-' else float(value)
+
+
+def parse_describe(lines):
+    """Stream PartitionOffsets out of `kafka-consumer-groups --describe` output"""
+    columns = None
+    for line in lines:
+        fields = line.split()
+        if not fields:
+            continue
+        if fields[0] == 'GROUP' and 'PARTITION' in fields:
+            columns = (fields.index('GROUP'), fields.index('TOPIC'), fields.index('PARTITION'),
+                       fields.index('CURRENT-OFFSET'), fields.index('LOG-END-OFFSET'))
+            width = max(columns) + 1
+            continue
+        if columns is None or len(fields) < width:
+            continue  # "Consumer group 'x' has no active members." and other chatter
+        group, topic, partition, committed, log_end = (fields[i] for i in columns)
+        try:
+            yield PartitionOffsets(group, topic, int(partition), _offset(committed), _offset(log_end))
+        except ValueError:
+            continue
+
+
+class DescribeFileSource:
+    """Replays recorded `kafka-consumer-groups --describe` output from a file"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def fetch(self):
+        with open(self.path) as f:
+            yield from parse_describe(f)
+
+
+class ConsumerGroupsSource:
+    """Describes every consumer group with one kafka-consumer-groups run inside a broker container"""
+
+    def __init__(self, docker, container='kafka-1', bootstrap_servers='localhost:9092', timeout=60):
+        self.docker = docker
+        self.container = container
+        self.bootstrap_servers = bootstrap_servers
+        self.timeout = timeout
+
+    def fetch(self):
+        cmd = [CONSUMER_GROUPS_CMD, '--bootstrap-server', self.bootstrap_servers, '--describe', '--all-groups']
+        # Blank KAFKA_OPTS so the CLI doesn't try to start the broker's Jolokia agent a second time
+        return parse_describe(self.docker.exec_lines(self.container, cmd, timeout=self.timeout, env=['KAFKA_OPTS=']))
+
+
+def make_source(spec):
+    """'file:/path/to/describe.txt' or 'docker:<container>'"""
+    kind, _, arg = spec.partition(':')
+    if kind == 'file':
+        return DescribeFileSource(arg)
+    if kind == 'docker':
+        return ConsumerGroupsSource(docker_api.get_client(), container=arg or 'kafka-1')
+    raise ValueError(f"unknown consumer lag source {spec!r}")
+
+
+def _same(a, b):
+    """Elementwise equality that treats NaN == NaN"""
+    return (a == b) | (np.isnan(a) & np.isnan(b))
+
+
+class LagEngine:
+    """Columnar per-partition offsets with incremental per-(group, topic) lag summaries"""
+
+    def __init__(self, alpha=0.3, stale_after=300, initial_capacity=1024, catalog=None, rate_floor=1e-3):
+        self.alpha = alpha
+        self.catalog = None
+        if catalog is not None:
+            self._compile(catalog)
+        self.stale_after = stale_after
+        self.rate_floor = rate_floor  # EWMA rates decaying below this snap to 0, so idle partitions settle
+        self.committed = np.full(initial_capacity, np.nan)
+        self.log_end = np.full(initial_capacity, np.nan)
+        self.consume_rate = np.full(initial_capacity, np.nan)
+        self.produce_rate = np.full(initial_capacity, np.nan)
+        self.updated = np.zeros(initial_capacity)
+        self.key_ids = np.full(initial_capacity, -1, dtype=np.int64)
+        self.rows = {}      # (group, topic, partition) -> row
+        self.row_keys = []  # row -> (group, topic, partition), None while free
+        self.key_index = {}  # (group, topic) -> key id
+        self.keys = []      # key id -> (group, topic), None while free
+        self.key_rows = {}  # key id -> set of rows
+        self.summaries = {}  # (group, topic) -> LagSummary
+        self._free_rows = []
+        self._free_keys = []
+        self._dirty = set()
+        self._lock = threading.Lock()
+
+    def _compile(self, catalog):
+        self.catalog = catalog  # CompiledCatalog over lag_catalog()
+        self._spec_index = {spec.metric: i for i, spec in enumerate(catalog.catalog)}
+        self._reduce = {spec.metric: spec.reduce for spec in catalog.catalog}
+
+    def _grow(self):
+        extra = len(self.updated)
+        self.committed = np.concatenate([self.committed, np.full(extra, np.nan)])
+        self.log_end = np.concatenate([self.log_end, np.full(extra, np.nan)])
+        self.consume_rate = np.concatenate([self.consume_rate, np.full(extra, np.nan)])
+        self.produce_rate = np.concatenate([self.produce_rate, np.full(extra, np.nan)])
+        self.updated = np.concatenate([self.updated, np.zeros(extra)])
+        self.key_ids = np.concatenate([self.key_ids, np.full(extra, -1, dtype=np.int64)])
+
+    def _row_for(self, group, topic, partition):
+        row = self.rows.get((group, topic, partition))
+        if row is None:
+            if self._free_rows:
+                row = self._free_rows.pop()
+                self.row_keys[row] = (group, topic, partition)
+            else:
+                if len(self.row_keys) == len(self.updated):
+                    self._grow()
+                row = len(self.row_keys)
+                self.row_keys.append((group, topic, partition))
+            self.rows[(group, topic, partition)] = row
+            key_id = self.key_index.get((group, topic))
+            if key_id is None:
+                if self._free_keys:
+                    key_id = self._free_keys.pop()
+                    self.keys[key_id] = (group, topic)
+                else:
+                    key_id = len(self.keys)
+                    self.keys.append((group, topic))
+                self.key_index[(group, topic)] = key_id
+                self.key_rows[key_id] = set()
+            self.key_rows[key_id].add(row)
+            self.key_ids[row] = key_id
+        return row
+
+    def _free(self, row):
+        """Return an expired row, and its (group, topic) once that has no rows left, for reuse"""
+        group, topic, partition = self.row_keys[row]
+        key_id = int(self.key_ids[row])
+        del self.rows[(group, topic, partition)]
+        self.row_keys[row] = None
+        self.committed[row] = self.log_end[row] = self.consume_rate[row] = self.produce_rate[row] = np.nan
+        self.updated[row] = 0
+        self.key_ids[row] = -1
+        self._free_rows.append(row)
+        rows = self.key_rows[key_id]
+        rows.discard(row)
+        if not rows:
+            del self.key_rows[key_id], self.key_index[(group, topic)]
+            self.keys[key_id] = None
+            self._free_keys.append(key_id)
+            self._dirty.discard(key_id)
+            self.summaries.pop((group, topic), None)
+
+    def _ewma(self, rates, sample, ok):
+        blended = np.where(np.isnan(rates), sample, self.alpha * sample + (1 - self.alpha) * rates)
+        blended = np.where(np.abs(blended) < self.rate_floor, 0.0, blended)
+        return np.where(ok, blended, rates)
+
+    def update(self, offsets, now=None):
+        """Apply one batch of PartitionOffsets; returns the number of partitions fetched"""
+        now = time.time() if now is None else now
+        # Drain the source (a whole kafka-consumer-groups run) before blocking refresh() and samples()
+        offsets = list(offsets)
+        if not offsets:
+            return 0
+        with self._lock:
+            rows = np.fromiter((self._row_for(o.group, o.topic, o.partition) for o in offsets),
+                               dtype=np.int64, count=len(offsets))
+            committed = np.fromiter((o.committed for o in offsets), dtype=float, count=len(offsets))
+            log_end = np.fromiter((o.log_end for o in offsets), dtype=float, count=len(offsets))
+
+            dt = now - self.updated[rows]
+            seen = (self.updated[rows] > 0) & (dt > 0)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                consumed = (committed - self.committed[rows]) / dt
+                produced = (log_end - self.log_end[rows]) / dt
+            # Offsets going backwards (reset, topic recreated) carry no rate information
+            consume_rate = self._ewma(self.consume_rate[rows], consumed, seen & (consumed >= 0))
+            produce_rate = self._ewma(self.produce_rate[rows], produced, seen & (produced >= 0))
+            changed = ~(_same(committed, self.committed[rows]) & _same(log_end, self.log_end[rows]) &
+                        _same(consume_rate, self.consume_rate[rows]) & _same(produce_rate, self.produce_rate[rows]))
+            self.consume_rate[rows] = consume_rate
+            self.produce_rate[rows] = produce_rate
+            self.committed[rows] = committed
+            self.log_end[rows] = log_end
+            self.updated[rows] = now
+            if changed.any():
+                self._dirty.update(np.unique(self.key_ids[rows[changed]]).tolist())
+            return len(rows)
+
+    def refresh(self, now=None):
+        """Recompute summaries for changed (group, topic) pairs; returns every current LagSummary"""
+        now = time.time() if now is None else now
+        with self._lock:
+            n = len(self.row_keys)
+            # Partitions that disappeared from the source (group deleted) age out and free their rows
+            expired = np.flatnonzero((self.updated[:n] > 0) & (self.updated[:n] < now - self.stale_after))
+            for row in expired.tolist():
+                self._dirty.add(int(self.key_ids[row]))
+                self._free(row)
+            if not self._dirty:
+                return list(self.summaries.values())
+
+            dirty = sorted(self._dirty)
+            self._dirty.clear()
+            for key_id in dirty:
+                self.summaries.pop(self.keys[key_id], None)
+            rows = np.fromiter(itertools.chain.from_iterable(self.key_rows[key_id] for key_id in dirty),
+                               dtype=np.int64)
+            with np.errstate(invalid='ignore'):
+                lag = np.maximum(self.log_end[rows] - self.committed[rows], 0)
+            mask = ~np.isnan(lag)
+            if not mask.any():
+                return list(self.summaries.values())
+
+            rows, lag = rows[mask], lag[mask]
+            ids = self.key_ids[rows]
+            consume = np.nan_to_num(self.consume_rate[rows])
+            produce = np.nan_to_num(self.produce_rate[rows])
+            order = np.lexsort((lag, ids))
+            lag, ids, consume, produce = lag[order], ids[order], consume[order], produce[order]
+            present, starts, counts = np.unique(ids, return_index=True, return_counts=True)
+
+            max_lag = lag[starts + counts - 1]
+            sum_lag = np.add.reduceat(lag, starts)
+            p99_lag = lag[starts + np.ceil(0.99 * counts).astype(np.int64) - 1]
+            net = np.add.reduceat(consume, starts) - np.add.reduceat(produce, starts)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                catch_up = np.where(sum_lag == 0, 0.0, np.where(net > 0, sum_lag / net, np.inf))
+
+            for i, key_id in enumerate(present.tolist()):
+                group, topic = self.keys[key_id]
+                self.summaries[(group, topic)] = LagSummary(
+                    group, topic, int(counts[i]), float(max_lag[i]), float(sum_lag[i]), float(p99_lag[i]),
+                    float(-net[i]), float(catch_up[i]))
+            return list(self.summaries.values())
+
+    def samples(self, instance_id, cluster_name='kafka-cluster', now=None):
+        """Summaries as collector samples [(metric, value, unit, dims), ...], dims from the guarded catalog"""
+        if self.catalog is None:
+            self._compile(CompiledCatalog(instance_id, lag_catalog(cluster_name)))
+        catalog, index = self.catalog, self._spec_index
+        guard_now = time.monotonic()
+        samples = []
+        for s in self.refresh(now):
+            values = (s.group, s.topic)
+            series = [('kafka.consumer.group.lag.max', s.max_lag),
+                      ('kafka.consumer.group.lag.sum', s.sum_lag),
+                      ('kafka.consumer.group.lag.p99', s.p99_lag),
+                      ('kafka.consumer.group.lag.rate', s.lag_rate)]
+            if s.time_to_catch_up != float('inf'):
+                # CloudWatch rejects infinite values; a missing datapoint means "not catching up"
+                series.append(('kafka.consumer.group.time-to-catch-up', s.time_to_catch_up))
+            for metric, value in series:
+                i = index[metric]
+                samples.append((metric, value, catalog.catalog[i].unit, catalog.dims(i, values, guard_now)))
+        return reduce_samples(samples, self._reduce)
@@ -0,0 +1,219 @@
+"""Minimal Docker Engine API client for the keepalive watchdog.
+
+Talks HTTP/1.1 to the Docker daemon over its unix socket (or a tcp:// host)
+with a small pool of keep-alive connections, so container health checks,
+in-container process listings and restarts don't fork the docker CLI.
+"""
+import http.client
+import json
+import os
+import queue
+import socket
+from urllib.parse import quote, urlencode
+
+DOCKER_HOST = os.environ.get('DOCKER_HOST', 'unix:///var/run/docker.sock')
+API_VERSION = os.environ.get('DOCKER_API_VERSION', 'v1.41')
+
+# Containers defined in infrastructure/docker-compose.yml
+COMPOSE_CONTAINERS = [
+    'zookeeper-1', 'zookeeper-2', 'zookeeper-3',
+    'kafka-1', 'kafka-2', 'kafka-3',
+]
+
+
+class DockerAPIError(Exception):
+    """Non-2xx response from the Docker daemon"""
+
+    def __init__(self, status, message):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+        self.message = message
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTPConnection over an AF_UNIX stream socket"""
+
+    def __init__(self, path, timeout=10):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+
+class DockerClient:
+    """Pooled Docker Engine API client"""
+
+    def __init__(self, base_url=DOCKER_HOST, timeout=10, pool_size=4):
+        self.base_url = base_url
+        self.timeout = timeout
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+
+    def _new_connection(self):
+        if self.base_url.startswith('unix://'):
+            return UnixHTTPConnection(self.base_url[len('unix://'):], timeout=self.timeout)
+        host = self.base_url.split('://', 1)[-1]
+        return http.client.HTTPConnection(host, timeout=self.timeout)
+
+    def _get_connection(self):
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            return self._new_connection()
+
+    def _release(self, conn):
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def request(self, method, path, params=None, body=None, timeout=None):
+        """Send one API request and return the decoded JSON body (or None)"""
+        url = f'/{API_VERSION}{path}'
+        if params:
+            url += '?' + urlencode(params)
+        headers = {'Host': 'docker'}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+
+        conn = self._get_connection()
+        if timeout is not None:
+            conn.timeout = timeout
+            if conn.sock:
+                conn.sock.settimeout(timeout)
+        try:
+            try:
+                conn.request(method, url, body=payload, headers=headers)
+                response = conn.getresponse()
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                # Pooled connection was closed by the daemon - retry once on a fresh one
+                conn.close()
+                conn = self._new_connection()
+                conn.request(method, url, body=payload, headers=headers)
+                response = conn.getresponse()
+            data = response.read()
+        except Exception:
+            conn.close()
+            raise
+
+        conn.timeout = self.timeout
+        if conn.sock:
+            conn.sock.settimeout(self.timeout)
+        if response.will_close:
+            conn.close()
+        else:
+            self._release(conn)
+
+        if response.status >= 400:
+            try:
+                message = json.loads(data).get('message', '')
+            except ValueError:
+                message = data.decode(errors='replace')
+            raise DockerAPIError(response.status, message)
+        if not data:
+            return None
+        if response.getheader('Content-Type', '').startswith('application/json'):
+            return json.loads(data)
+        return data
+
+    def close(self):
+        """Close every pooled connection"""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def container_states(self, names=COMPOSE_CONTAINERS):
+        """Return {name: state} for the given containers in one request ('missing' if absent)"""
+        containers = self.request('GET', '/containers/json', params={
+            'all': '1',
+            'filters': json.dumps({'name': list(names)})
+        }) or []
+        states = {name: 'missing' for name in names}
+        for c in containers:
+            for container_name in c.get('Names', []):
+                container_name = container_name.lstrip('/')
+                if container_name in states:
+                    state = c.get('State', 'unknown')
+                    # "Up 2 hours (unhealthy)" - surface failing healthchecks as their own state
+                    if state == 'running' and '(unhealthy)' in c.get('Status', ''):
+                        state = 'unhealthy'
+                    states[container_name] = state
+        return states
+
+    def top(self, container, ps_args='-eo pid,args'):
+        """List processes running in a container as dicts keyed by ps column title"""
+        result = self.request('GET', f'/containers/{quote(container)}/top', params={'ps_args': ps_args})
+        titles = [t.upper() for t in result.get('Titles', [])]
+        return [dict(zip(titles, row)) for row in result.get('Processes') or []]
+
+    def start(self, container):
+        """Start a stopped container (no-op if it is already running)"""
+        # 304 Not Modified means it was already running
+        self.request('POST', f'/containers/{quote(container)}/start')
+
+    def restart(self, container, timeout=10):
+        """Restart a container, giving it timeout seconds to stop"""
+        self.request('POST', f'/containers/{quote(container)}/restart', params={'t': timeout},
+                     timeout=self.timeout + timeout)
+
+    def exec_detached(self, container, cmd):
+        """Run cmd inside a container without waiting for it (like `docker exec -d`)"""
+        created = self.request('POST', f'/containers/{quote(container)}/exec', body={
+            'Cmd': cmd,
+            'AttachStdout': False,
+            'AttachStderr': False
+        })
+        self.request('POST', f"/exec/{created['Id']}/start", body={'Detach': True})
+        return created['Id']
+
+    def exec_lines(self, container, cmd, timeout=60, env=None):
+        """Run cmd inside a container and yield its stdout line by line as it arrives"""
+        body = {'Cmd': cmd, 'AttachStdout': True, 'AttachStderr': False, 'Tty': False}
+        if env:
+            body['Env'] = env  # ['NAME=value', ...], overriding the container's environment
+        created = self.request('POST', f'/containers/{quote(container)}/exec', body=body)
+        # The attached stream takes over the connection, so it never goes back to the pool
+        conn = self._new_connection()
+        conn.timeout = timeout
+        try:
+            conn.request('POST', f"/{API_VERSION}/exec/{created['Id']}/start",
+                         body=json.dumps({'Detach': False, 'Tty': False}).encode(),
+                         headers={'Host': 'docker', 'Content-Type': 'application/json'})
+            response = conn.getresponse()
+            if response.status >= 400:
+                raise DockerAPIError(response.status, response.read().decode(errors='replace'))
+            pending = b''
+            while True:
+                # Multiplexed stream: 8-byte header (stream type, 3 pad bytes, big-endian size)
+                header = response.read(8)
+                if len(header) < 8:
+                    break
+                chunk = response.read(int.from_bytes(header[4:], 'big'))
+                if header[0] != 1:
+                    continue  # not stdout
+                lines = (pending + chunk).split(b'\n')
+                pending = lines.pop()
+                for line in lines:
+                    yield line.decode(errors='replace')
+            if pending:
+                yield pending.decode(errors='replace')
+        finally:
+            conn.close()
+
+
+_client = None
+
+
+def get_client():
+    """Return the shared DockerClient"""
+    global _client
+    if _client is None:
+        _client = DockerClient()
+    return _client
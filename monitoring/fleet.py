@@ -0,0 +1,300 @@
+"""Fleet mode: one watchdog replica covering many clusters.
+
+Targets come from an inventory file (see configs/fleet-inventory.example.json).
+Replicas announce themselves with heartbeat leases in a shared lease
+directory (EFS/NFS, or a local directory for a single node). Every replica
+builds the same consistent-hash ring from the live leases and only checks
+the clusters it owns. Leases are renewed by a heartbeat thread, so a slow
+tick can't let a live replica's lease lapse. When a replica stops
+heartbeating, its lease expires and its clusters move to the survivors on
+their next tick. Checks for owned clusters run on a thread pool, and widget
+verification for every owned cluster in a region is batched into shared
+GetMetricData calls. A failing region or tick is logged and retried on the
+next tick instead of ending the loop.
+"""
+import bisect
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+import docker_api
+import widget_verifier
+
+# check_timeout: seconds a tick waits for the container check on this cluster's Docker host
+ClusterTarget = namedtuple('ClusterTarget', ['name', 'region', 'instance_id', 'docker_host',
+                                             'sns_topic_arn', 'containers', 'check_timeout'])
+
+
+def load_inventory(path):
+    """Read the fleet inventory JSON into ClusterTargets"""
+    with open(path) as f:
+        inventory = json.load(f)
+    defaults = inventory.get('defaults', {})
+    targets = []
+    for cluster in inventory['clusters']:
+        c = dict(defaults, **cluster)
+        targets.append(ClusterTarget(
+            name=c['name'],
+            region=c.get('region', 'us-west-2'),
+            instance_id=c['instance_id'],
+            docker_host=c.get('docker_host', docker_api.DOCKER_HOST),
+            sns_topic_arn=c.get('sns_topic_arn'),
+            containers=c.get('containers', docker_api.COMPOSE_CONTAINERS),
+            check_timeout=c.get('check_timeout', 60)
+        ))
+    return targets
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], 'big')
+
+
+class HashRing:
+    """Consistent-hash ring with virtual nodes"""
+
+    def __init__(self, members, vnodes=64):
+        points = sorted((_hash(f"{member}#{i}"), member) for member in members for i in range(vnodes))
+        self._hashes = [h for h, _ in points]
+        self._members = [m for _, m in points]
+
+    def owner(self, key):
+        if not self._hashes:
+            return None
+        i = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._members[i]
+
+
+class FileLeaseStore:
+    """Membership leases as files in a shared directory"""
+
+    def __init__(self, directory, ttl=30):
+        self.directory = directory
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+
+    def heartbeat(self, member, now=None):
+        now = time.time() if now is None else now
+        path = os.path.join(self.directory, f"{member}.lease")
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump({'member': member, 'expires': now + self.ttl}, f)
+        os.replace(tmp, path)
+
+    def release(self, member):
+        try:
+            os.unlink(os.path.join(self.directory, f"{member}.lease"))
+        except FileNotFoundError:
+            pass
+
+    def live_members(self, now=None):
+        now = time.time() if now is None else now
+        members = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.lease'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    lease = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if lease['expires'] > now:
+                members.append(lease['member'])
+        return sorted(members)
+
+
+class FleetWatchdog:
+    """Checks the clusters this replica owns on a worker pool"""
+
+    def __init__(self, targets, leases, member_id=None, max_workers=32, cw_factory=None, sns_factory=None,
+                 alert_cooldown=1800):
+        self.targets = {t.name: t for t in targets}
+        self.leases = leases
+        self.member_id = member_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='fleet')
+        self.cw_factory = cw_factory or (lambda region: _boto3_client('cloudwatch', region))
+        self.sns_factory = sns_factory or (lambda region: _boto3_client('sns', region))
+        self.alert_cooldown = alert_cooldown
+        self.owned = []
+        self._docker = {}
+        self._clients = {}
+        self._in_flight = {}
+        self._alerted = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._heartbeat = None
+
+    def start_heartbeat(self, interval):
+        """Renew our lease every interval seconds on a background thread, however long ticks take"""
+        self.leases.heartbeat(self.member_id)
+
+        def beat():
+            while not self._stopping.wait(interval):
+                try:
+                    self.leases.heartbeat(self.member_id)
+                except Exception as e:
+                    print(f"❌ Lease heartbeat failed: {e}")
+
+        self._heartbeat = threading.Thread(target=beat, name='fleet-heartbeat', daemon=True)
+        self._heartbeat.start()
+
+    def _client(self, kind, region):
+        with self._lock:
+            key = (kind, region)
+            if key not in self._clients:
+                factory = self.cw_factory if kind == 'cloudwatch' else self.sns_factory
+                self._clients[key] = factory(region)
+            return self._clients[key]
+
+    def _docker_client(self, target):
+        with self._lock:
+            if target.docker_host not in self._docker:
+                self._docker[target.docker_host] = docker_api.DockerClient(target.docker_host)
+            return self._docker[target.docker_host]
+
+    def rebalance(self, now=None):
+        """Renew our lease and recompute which clusters we own"""
+        self.leases.heartbeat(self.member_id, now)
+        members = self.leases.live_members(now)
+        if self.member_id not in members:
+            members.append(self.member_id)
+        ring = HashRing(members)
+        owned = sorted(name for name in self.targets if ring.owner(name) == self.member_id)
+        if owned != self.owned:
+            print(f"🔀 {self.member_id} now owns {len(owned)}/{len(self.targets)} clusters "
+                  f"({len(members)} live replicas)")
+        self.owned = owned
+        return owned
+
+    def check_containers(self, target):
+        """Start stopped containers of one cluster; returns {container: state} of the ones that were down"""
+        docker = self._docker_client(target)
+        states = docker.container_states(target.containers)
+        down = {name: state for name, state in states.items() if state != 'running'}
+        for name, state in down.items():
+            if state == 'missing':
+                continue  # needs docker-compose on that host: reported in the alert instead
+            try:
+                if state == 'unhealthy':
+                    docker.restart(name)
+                else:
+                    docker.start(name)
+            except Exception as e:
+                print(f"❌ [{target.name}] Failed to restart {name}: {e}")
+        return down
+
+    def _check_containers_async(self, target):
+        with self._lock:
+            running = self._in_flight.get(target.name)
+            if running is not None and not running.done():
+                return None  # previous check still in progress
+            future = self.pool.submit(self.check_containers, target)
+            self._in_flight[target.name] = future
+            return future
+
+    def tick_containers(self):
+        """Run container checks for every owned cluster concurrently; returns {cluster: down or error}"""
+        started = time.monotonic()
+        futures = {name: self._check_containers_async(self.targets[name]) for name in self.owned}
+        problems = {}
+        for name, future in futures.items():
+            if future is None:
+                continue
+            timeout = self.targets[name].check_timeout
+            try:
+                # A hung Docker host is reported, not waited for; the next tick skips it while it is in flight
+                down = future.result(timeout=max(started + timeout - time.monotonic(), 0))
+            except TimeoutError as e:
+                down = {'docker': f'unreachable: {e}' if future.done() else f'no answer within {timeout}s'}
+            except Exception as e:
+                down = {'docker': f'unreachable: {e}'}
+            if down:
+                problems[name] = down
+        for name, down in problems.items():
+            self._alert(self.targets[name], 'containers down',
+                        '\n'.join(f"  - {c}: {s}" for c, s in down.items()))
+        return problems
+
+    def tick_widgets(self):
+        """Verify dashboard data for every owned cluster, batched per region"""
+        by_region = {}
+        for name in self.owned:
+            target = self.targets[name]
+            by_region.setdefault(target.region, []).append(target)
+
+        failed = {}
+        for region, targets in by_region.items():
+            try:
+                cw = self._client('cloudwatch', region)
+                results = widget_verifier.verify_instances(cw, [t.instance_id for t in targets])
+            except Exception as e:
+                # One region's outage or throttling shouldn't stop the others being verified
+                print(f"❌ Widget verification failed in {region} ({len(targets)} clusters): {e}")
+                continue
+            for target in targets:
+                empty = [r for r in results[target.instance_id] if not r.ok]
+                if empty:
+                    failed[target.name] = empty
+                    self._alert(target, 'widgets empty',
+                                '\n'.join(f"  - {r.metric} {r.dimensions}" for r in empty))
+        return failed
+
+    def _alert(self, target, problem, details):
+        now = time.time()
+        key = (target.name, problem)
+        if now - self._alerted.get(key, -self.alert_cooldown) < self.alert_cooldown:
+            return
+        self._alerted[key] = now
+        print(f"🚨 [{target.name}] {problem}")
+        if not target.sns_topic_arn:
+            return
+        try:
+            self._client('sns', target.region).publish(
+                TopicArn=target.sns_topic_arn,
+                Subject=f'🚨 Kafka {problem}: {target.name}'[:100],
+                Message=f"Cluster: {target.name}\nInstance: {target.instance_id}\n\n{details}\n"
+            )
+        except Exception as e:
+            print(f"❌ [{target.name}] Alert failed: {e}")
+
+    def close(self):
+        self._stopping.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join(timeout=5)
+        self.leases.release(self.member_id)
+        self.pool.shutdown(wait=False)
+
+
+def _boto3_client(kind, region):
+    import boto3
+    return boto3.client(kind, region_name=region)
+
+
+def run_fleet(inventory_path, lease_dir, container_interval=15, widget_interval=1800, max_workers=32,
+              cw_factory=None, sns_factory=None):
+    """Blocking fleet-mode main loop"""
+    watchdog = FleetWatchdog(load_inventory(inventory_path), FileLeaseStore(lease_dir, ttl=3 * container_interval),
+                             max_workers=max_workers, cw_factory=cw_factory, sns_factory=sns_factory)
+    print(f"🛰️ FLEET MODE - {len(watchdog.targets)} clusters in inventory, replica {watchdog.member_id}")
+    watchdog.start_heartbeat(container_interval)
+    next_widgets = 0.0
+    try:
+        while True:
+            started = time.monotonic()
+            try:
+                watchdog.rebalance()
+                problems = watchdog.tick_containers()
+                if time.monotonic() >= next_widgets:
+                    next_widgets = time.monotonic() + widget_interval
+                    watchdog.tick_widgets()
+                print(f"🔄 Fleet tick: {len(watchdog.owned)} clusters checked, {len(problems)} with problems, "
+                      f"{time.monotonic() - started:.1f}s")
+            except Exception as e:
+                print(f"❌ Fleet tick failed: {e}")
+            time.sleep(max(container_interval - (time.monotonic() - started), 0))
+    finally:
+        watchdog.close()
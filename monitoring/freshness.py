@@ -0,0 +1,105 @@
+"""Local series-freshness index for gap detection without CloudWatch reads.
+
+The publisher records the send time and last value of every series it
+successfully sends. Staleness is evaluated locally against per-metric SLOs on
+every tick, and alerts are deduplicated with a cool-down so a gap that lasts
+hours produces one notification, not one per check.
+
+Only series registered with expect() (the dashboard series) are held to an
+SLO. Everything else is recorded for its last value and forgotten once it has
+gone unsent for expire_after SLOs: series such as time-to-catch-up, lag for a
+deleted consumer group or a topic slot the cardinality guard recycled stop on
+purpose and must not alert forever.
+"""
+import threading
+import time
+
+
+def series_key(metric, dims):
+    """(metric name, sorted dimension tuple) - accepts a dict or a Dimensions list"""
+    if isinstance(dims, dict):
+        pairs = dims.items()
+    else:
+        pairs = ((d['Name'], d['Value']) for d in dims)
+    return metric, tuple(sorted(pairs))
+
+
+def datum_value(datum):
+    """Representative value of a PutMetricData datum"""
+    if 'Value' in datum:
+        return datum['Value']
+    if 'StatisticValues' in datum:
+        stats = datum['StatisticValues']
+        return stats['Sum'] / stats['SampleCount'] if stats['SampleCount'] else None
+    if datum.get('Values'):
+        return datum['Values'][-1]
+    return None
+
+
+class FreshnessIndex:
+    """Last send time/value per series, with per-metric staleness SLOs"""
+
+    def __init__(self, default_slo=180, slos=None, cooldown=1800, expire_after=10):
+        self.default_slo = default_slo
+        self.slos = dict(slos or {})
+        self.cooldown = cooldown
+        self.expire_after = expire_after
+        self._expected = set()
+        self._last_sent = {}   # key -> epoch seconds
+        self._last_value = {}  # key -> value
+        self._alerted = {}     # key -> epoch seconds of last alert
+        self._lock = threading.Lock()
+
+    def expect(self, keys, now=None):
+        """Hold series to their SLO from now on, even if they were never sent"""
+        now = time.time() if now is None else now
+        with self._lock:
+            for key in keys:
+                self._expected.add(key)
+                self._last_sent.setdefault(key, now)
+
+    def record(self, datums, now=None):
+        """Mark datums as successfully sent"""
+        now = time.time() if now is None else now
+        with self._lock:
+            for datum in datums:
+                key = series_key(datum['MetricName'], datum.get('Dimensions', []))
+                self._last_sent[key] = now
+                self._last_value[key] = datum_value(datum)
+
+    def slo(self, key):
+        return self.slos.get(key, self.slos.get(key[0], self.default_slo))
+
+    def stale(self, now=None):
+        """[(key, age_seconds, last_value)] for every expected series past its SLO"""
+        now = time.time() if now is None else now
+        with self._lock:
+            stale = []
+            for key, sent in list(self._last_sent.items()):
+                age = now - sent
+                if key in self._expected:
+                    if age > self.slo(key):
+                        stale.append((key, age, self._last_value.get(key)))
+                elif age > self.slo(key) * self.expire_after:
+                    del self._last_sent[key]
+                    self._last_value.pop(key, None)
+            return stale
+
+    def alerts_due(self, now=None):
+        """Stale series not alerted within the cool-down; marks them as alerted"""
+        now = time.time() if now is None else now
+        stale = self.stale(now)
+        stale_keys = {key for key, _, _ in stale}
+        with self._lock:
+            # Series that recovered can alert again immediately next time
+            for key in list(self._alerted):
+                if key not in stale_keys:
+                    del self._alerted[key]
+            due = [s for s in stale if s[0] not in self._alerted or now - self._alerted[s[0]] >= self.cooldown]
+            for key, _, _ in due:
+                self._alerted[key] = now
+        return due
+
+    def __len__(self):
+        """Number of series held to an SLO"""
+        return len(self._expected)
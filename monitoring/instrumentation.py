@@ -0,0 +1,280 @@
+"""Self-instrumentation for the keepalive watchdog.
+
+Counters and histograms live in one in-process registry, labelled by the
+check that was running on the current thread when they were recorded:
+- per-check wall time (fed by the scheduler)
+- subprocess spawns (sys.addaudithook on subprocess.Popen)
+- AWS calls and request bytes (botocore before-send event hooks)
+- EMF bytes written to the CloudWatch agent (EmfSink write hook)
+- RSS, open FDs and thread count (read from /proc on every scrape)
+
+The registry is served as Prometheus text (/metrics) and JSON
+(/metrics.json) on a local HTTP port, and can be logged as one JSON line.
+SIGUSR1 dumps a sampling profile of every thread in collapsed-stack
+(flamegraph) format.
+"""
+import bisect
+import collections
+import json
+import os
+import signal
+import sys
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def spawned_executable(args):
+    """Executable name of a subprocess.Popen audit event (its argv is a command line string on Windows)"""
+    executable, argv = args[0], args[1]
+    if not executable and argv:
+        if isinstance(argv, (str, bytes)):
+            argv = argv.split()
+        executable = argv[0] if argv else None
+    return os.path.basename(os.fsdecode(executable)) if executable else '?'
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense"""
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, n in zip(self.buckets + (float('inf'),), self.counts):
+            total += n
+            yield bound, total
+
+
+class Instrumentation:
+    """Registry of labelled counters and histograms"""
+
+    def __init__(self):
+        self.counters = collections.defaultdict(float)   # (name, labels) -> value
+        self.histograms = {}                              # (name, labels) -> Histogram
+        self.started = time.time()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._audit_installed = False
+
+    def current_check(self):
+        return getattr(self._local, 'check', None) or 'main'
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] += value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timed(self, check):
+        """Attribute everything recorded on this thread to check, and time it
+
+        Yields a dict; a run that handled its own failure sets its 'outcome' to 'error'.
+        """
+        previous = getattr(self._local, 'check', None)
+        self._local.check = check
+        start = time.monotonic()
+        run = {}
+        outcome = 'error'
+        try:
+            yield run
+            outcome = run.get('outcome', 'ok')
+        finally:
+            self._local.check = previous
+            self.observe('keepalive_check_duration_seconds', time.monotonic() - start, check=check, outcome=outcome)
+
+    def install_audit_hook(self):
+        """Count subprocess spawns (audit hooks can't be removed, so only once per process)"""
+        if self._audit_installed:
+            return
+
+        def hook(event, args):
+            if event == 'subprocess.Popen':
+                self.inc('keepalive_subprocess_spawns_total', check=self.current_check(),
+                         executable=spawned_executable(args))
+
+        sys.addaudithook(hook)
+        self._audit_installed = True
+
+    def instrument_client(self, client):
+        """Count API calls and request bytes of a boto3 client"""
+        service = client.meta.service_model.service_name
+
+        def before_send(request, **kwargs):
+            operation = kwargs.get('event_name', '').rsplit('.', 1)[-1]
+            labels = {'check': self.current_check(), 'service': service, 'operation': operation}
+            self.inc('keepalive_aws_calls_total', **labels)
+            body = request.body
+            size = len(body) if isinstance(body, (bytes, bytearray, str)) else 0
+            self.inc('keepalive_aws_request_bytes_total', size, **labels)
+
+        client.meta.events.register('before-send', before_send)
+        return client
+
+    def instrument_sink(self, sink):
+        """Count the EMF bytes an EmfSink writes (PutMetricData bytes are counted by instrument_client)"""
+        def on_write(size):
+            self.inc('keepalive_emf_bytes_total', size, check=self.current_check(), endpoint=sink.scheme)
+
+        if hasattr(sink, 'on_write'):
+            sink.on_write = on_write
+        return sink
+
+    def process_stats(self):
+        """RSS, open file descriptors and threads of this process"""
+        stats = {'threads': threading.active_count()}
+        try:
+            stats['open_fds'] = len(os.listdir('/proc/self/fd'))
+            with open('/proc/self/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        stats['resident_memory_bytes'] = int(line.split()[1]) * 1024
+        except OSError:
+            pass  # not Linux
+        return stats
+
+    def snapshot(self):
+        """Everything as a JSON-serialisable dict"""
+        with self._lock:
+            counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in self.counters.items()]
+            histograms = [{'name': name, 'labels': dict(labels), 'count': h.count, 'sum': round(h.sum, 6),
+                           'buckets': {str(bound): n for bound, n in h.cumulative()}}
+                          for (name, labels), h in self.histograms.items()]
+        return {
+            'timestamp': datetime.utcnow().isoformat() + 'Z',
+            'uptime_seconds': round(time.time() - self.started, 1),
+            'process': self.process_stats(),
+            'counters': counters,
+            'histograms': histograms
+        }
+
+    def prometheus_text(self):
+        """Prometheus text exposition format"""
+        def fmt(labels, **extra):
+            pairs = list(labels) + list(extra.items())
+            if not pairs:
+                return ''
+            return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+        lines = []
+        typed = set()
+        with self._lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f"# TYPE {name} counter")
+                lines.append(f"{name}{fmt(labels)} {value:g}")
+            for (name, labels), h in sorted(self.histograms.items()):
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f"# TYPE {name} histogram")
+                for bound, n in h.cumulative():
+                    le = '+Inf' if bound == float('inf') else f'{bound:g}'
+                    lines.append(f"{name}_bucket{fmt(labels, le=le)} {n}")
+                lines.append(f"{name}_sum{fmt(labels)} {h.sum:.6f}")
+                lines.append(f"{name}_count{fmt(labels)} {h.count}")
+        for key, value in self.process_stats().items():
+            lines.append(f"# TYPE keepalive_process_{key} gauge")
+            lines.append(f"keepalive_process_{key} {value}")
+        lines.append("# TYPE keepalive_uptime_seconds gauge")
+        lines.append(f"keepalive_uptime_seconds {time.time() - self.started:.1f}")
+        return '\n'.join(lines) + '\n'
+
+    def log_json(self):
+        """One structured log line with the full snapshot"""
+        print(json.dumps(dict(self.snapshot(), event='keepalive_stats')), flush=True)
+
+    def serve(self, port, host='127.0.0.1'):
+        """Serve /metrics and /metrics.json from a daemon thread"""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/metrics':
+                    body, content_type = registry.prometheus_text().encode(), 'text/plain; version=0.0.4'
+                elif self.path == '/metrics.json':
+                    body, content_type = json.dumps(registry.snapshot()).encode(), 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass  # scrapes would flood the watchdog log
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name='instrumentation-http', daemon=True).start()
+        print(f"📈 Self-metrics on http://{host}:{server.server_address[1]}/metrics")
+        return server
+
+
+def sample_stacks(duration=30.0, interval=0.01):
+    """Sample every thread's stack; returns {collapsed stack: samples}"""
+    me = threading.get_ident()
+    names = {t.ident: t.name for t in threading.enumerate()}
+    stacks = collections.Counter()
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            frames = [f"{os.path.basename(fs.filename)}:{fs.name}" for fs in traceback.extract_stack(frame)]
+            stacks[';'.join([names.get(ident, str(ident))] + frames)] += 1
+        time.sleep(interval)
+    return stacks
+
+
+def install_profile_signal(directory='/tmp', duration=30.0, signum=signal.SIGUSR1):
+    """On signum, sample all threads for duration seconds and write a collapsed-stack profile"""
+    busy = threading.Lock()
+
+    def dump():
+        try:
+            stacks = sample_stacks(duration)
+            path = os.path.join(directory, f"keepalive-profile-{datetime.now():%Y%m%d-%H%M%S}.folded")
+            with open(path, 'w') as f:
+                for stack, n in stacks.most_common():
+                    f.write(f"{stack} {n}\n")
+            print(f"🔬 Wrote {sum(stacks.values())} stack samples to {path}")
+        finally:
+            busy.release()
+
+    def handler(signo, frame):
+        if not busy.acquire(blocking=False):
+            return  # a profile is already being taken
+        print(f"🔬 Profiling all threads for {duration:g}s")
+        threading.Thread(target=dump, name='profiler', daemon=True).start()
+
+    signal.signal(signum, handler)
@@ -0,0 +1,152 @@
+"""Concurrent JMX scrape pipeline over Jolokia HTTP.
+
+Each target (a producer/consumer app on JMX ports 9104-9110 or a broker on
+its KAFKA_JMX_PORT) is scraped by its own worker with one bulk Jolokia read
+request and a bounded timeout. MBean attributes are mapped onto the metric
+names and dimensions the dashboards already use, as declared in catalog.py;
+every sample's Dimensions come interned from the compiled catalog. A series
+scraped from several targets (each broker reports the cluster-level series)
+is reduced to one sample per collection with the catalog's reduce op.
+
+By default every target is read through its own Jolokia JVM agent, published
+on the host: brokers on 8778-8780 (docker-compose.yml), apps on their JMX
+port + 1000 (app_supervisor.launch_command). Setting JOLOKIA_URL instead
+sends every read through a Jolokia proxy that bridges to the targets' plain
+JMX/RMI ports on the host.
+"""
+import json
+import os
+import time
+import urllib.request
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import lru_cache
+
+from app_supervisor import APPS, jolokia_port
+from catalog import CompiledCatalog, by_kind, reduce_samples
+
+JOLOKIA_URL = os.environ.get('JOLOKIA_URL')  # Jolokia proxy; unset: read each target's own agent
+JMX_URL = 'service:jmx:rmi:///jndi/rmi://127.0.0.1:{port}/jmxrmi'
+AGENT_URL = 'http://127.0.0.1:{port}/jolokia/'
+# broker id, published JMX port, published Jolokia agent port
+BROKERS = ((1, 19092, 8778), (2, 19093, 8779), (3, 19094, 8780))
+
+Target = namedtuple('Target', ['name', 'kind', 'jmx_url', 'jolokia_url'])
+
+METRICS_BY_KIND = by_kind()
+
+
+def default_targets(jolokia_url=JOLOKIA_URL):
+    """Supervised apps on kafka-1 plus the three brokers, at their host-published ports"""
+    targets = []
+    for app in APPS:
+        kind = 'consumer' if 'Consumer' in app.main_class else 'producer'
+        agent = None if jolokia_url else AGENT_URL.format(port=jolokia_port(app))
+        targets.append(Target(app.name, kind, JMX_URL.format(port=app.jmx_port), agent))
+    for broker_id, jmx_port, agent_port in BROKERS:
+        agent = None if jolokia_url else AGENT_URL.format(port=agent_port)
+        targets.append(Target(f'kafka-{broker_id}', 'broker', JMX_URL.format(port=jmx_port), agent))
+    return targets
+
+
+
+@lru_cache(maxsize=4096)
+def mbean_properties(name):
+    """'domain:k1=v1,k2=v2' -> {'k1': 'v1', 'k2': 'v2'} (cached and shared - don't modify)"""
+    props = {}
+    for part in name.split(':', 1)[-1].split(','):
+        key, _, value = part.partition('=')
+        props[key] = value.strip('"')
+    return props
+
+
+class JolokiaCollector:
+    """Scrapes every target concurrently and maps MBeans onto dashboard metrics"""
+
+    def __init__(self, instance_id, targets=None, jolokia_url=JOLOKIA_URL, timeout=5, catalog=None):
+        self.instance_id = instance_id
+        self.catalog = catalog or CompiledCatalog(instance_id)
+        self.targets = targets if targets is not None else default_targets()
+        self.jolokia_url = jolokia_url
+        self.timeout = timeout
+        self.last_errors = {}
+        self._reduce = {spec.metric: spec.reduce for spec in self.catalog.catalog}
+        self._counters = {}  # (target, catalog index, key dim values) -> last cumulative value
+        self._executor = ThreadPoolExecutor(max_workers=max(len(self.targets), 1), thread_name_prefix='jmx')
+
+    def _read(self, target, metrics):
+        """One bulk Jolokia read for every distinct (mbean, attribute) of a target"""
+        reads = sorted({(m.mbean, m.attribute) for m in metrics})
+        requests = []
+        for mbean, attribute in reads:
+            req = {'type': 'read', 'mbean': mbean, 'attribute': attribute}
+            if target.jmx_url and not target.jolokia_url:
+                req['target'] = {'url': target.jmx_url}
+            requests.append(req)
+
+        http_req = urllib.request.Request(target.jolokia_url or self.jolokia_url,
+                                          data=json.dumps(requests).encode(),
+                                          headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(http_req, timeout=self.timeout) as response:
+            replies = json.loads(response.read())
+
+        values = {}
+        for (mbean, attribute), reply in zip(reads, replies):
+            if reply.get('status') != 200:
+                continue
+            value = reply.get('value')
+            if '*' in mbean:
+                # pattern reads answer {mbean: {attribute: value}} for every matching MBean
+                value = {name: (attrs or {}).get(attribute) for name, attrs in (value or {}).items()}
+            else:
+                value = {mbean: value}
+            values[(mbean, attribute)] = value
+        return values
+
+    def scrape_target(self, target):
+        """Scrape one target, return [(metric, value, unit, dimensions), ...]"""
+        metrics = self.catalog.by_kind.get(target.kind, [])
+        values = self._read(target, [m for _, m in metrics])
+
+        samples = []
+        now = time.monotonic()
+        for index, m in metrics:
+            for mbean_name, value in values.get((m.mbean, m.attribute), {}).items():
+                if m.path:
+                    value = (value or {}).get(m.path)
+                if not isinstance(value, (int, float)) or value < 0:
+                    continue  # NaN/unset gauges come back as strings or -1
+
+                key_values = ()
+                if m.key_dims:
+                    props = mbean_properties(mbean_name)
+                    key_values = tuple(props.get(prop) for prop in m.key_dims)
+                dims = self.catalog.dims(index, key_values, now)
+
+                if m.counter:
+                    # Cumulative JMX counters are published as per-interval deltas (per MBean, before any roll-up)
+                    key = (target.name, index, key_values)
+                    previous = self._counters.get(key)
+                    self._counters[key] = value
+                    if previous is None or value < previous:
+                        continue
+                    value = value - previous
+                samples.append((m.metric, value, m.unit, dims))
+        return samples
+
+    def collect(self):
+        """Scrape all targets concurrently within one timeout budget, one sample per series"""
+        futures = {self._executor.submit(self.scrape_target, t): t for t in self.targets}
+        done, not_done = wait(futures, timeout=self.timeout + 1)
+
+        samples = []
+        self.last_errors = {}
+        for future in done:
+            target = futures[future]
+            try:
+                samples.extend(future.result())
+            except Exception as e:
+                self.last_errors[target.name] = str(e)
+        for future in not_done:
+            self.last_errors[futures[future].name] = 'timed out'
+        return reduce_samples(samples, self._reduce)
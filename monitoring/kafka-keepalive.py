@@ -1,439 +1,296 @@
+import os
 import subprocess
-import time
 import boto3
-import random
-from datetime import datetime, timedelta
+from datetime import datetime
+
+from aggregator import MetricAggregator, make_client
+from app_supervisor import APPS, AppSupervisor
+from catalog import CLUSTER_NAME, widget_series
+import docker_api
+import fleet
+from freshness import FreshnessIndex, series_key
+from instrumentation import Instrumentation, install_profile_signal
+from jmx_collector import JolokiaCollector
+from log_tailer import LogTailer
+from scheduler import Scheduler
+from sinks import make_sink
+from spool import MetricSpool, SpoolDrainer, SpoolingSink
+import widget_verifier
+
+try:
+    from anomaly import AnomalyEngine
+    import consumer_lag
+except ImportError:  # numpy not installed - streaming anomaly rules and lag engine disabled
+    AnomalyEngine = None
+    consumer_lag = None
+
+REGION = os.environ.get('AWS_REGION', 'us-west-2')
+INSTANCE_ID = os.environ.get('INSTANCE_ID', 'i-0a57073bf1538948b')
+COMPOSE_DIR = os.environ.get('KAFKA_COMPOSE_DIR', '/home/ec2-user/kafka-cluster')
+SNS_TOPIC_ARN = os.environ.get('SNS_TOPIC_ARN', 'arn:aws:sns:us-west-2:782045727575:kafka-metrics-alerts')
+SPOOL_DIR = os.environ.get('METRIC_SPOOL_DIR', '/var/spool/kafka-keepalive')
+SPOOL_MAX_BYTES = int(os.environ.get('METRIC_SPOOL_MAX_BYTES', str(64 * 1024 * 1024)))
+
+# Check intervals in seconds
+CONTAINER_CHECK_INTERVAL = int(os.environ.get('CONTAINER_CHECK_INTERVAL', '10'))
+APP_CHECK_INTERVAL = int(os.environ.get('APP_CHECK_INTERVAL', '15'))
+METRIC_SAMPLE_INTERVAL = int(os.environ.get('METRIC_SAMPLE_INTERVAL', '5'))
+METRIC_COLLECTION_INTERVAL = int(os.environ.get('METRIC_COLLECTION_INTERVAL', '60'))
+ALERT_CHECK_INTERVAL = int(os.environ.get('ALERT_CHECK_INTERVAL', '30'))
+CONSUMER_LAG_INTERVAL = int(os.environ.get('CONSUMER_LAG_INTERVAL', '30'))
+# kafka-1 mounts this host directory as /tmp, where the apps write their logs
+APP_LOG_DIR = os.environ.get('APP_LOG_DIR', os.path.join(COMPOSE_DIR, 'kafka-apps'))
+APP_LOG_MAX_BYTES = int(os.environ.get('APP_LOG_MAX_BYTES', str(50 * 1024 * 1024)))
+LOG_CHECKPOINT = os.environ.get('LOG_CHECKPOINT', '/var/lib/kafka-keepalive/log-offsets.json')
+# Occasional CloudWatch read-back of every widget (staleness itself is tracked locally)
+RECONCILE_INTERVAL = int(os.environ.get('RECONCILE_INTERVAL', '1800'))
+# A series is stale when it has not been sent for this many seconds
+METRIC_FRESHNESS_SLO = int(os.environ.get('METRIC_FRESHNESS_SLO', str(3 * 60)))
+# Fleet mode: watch every cluster in this inventory instead of the local host
+FLEET_INVENTORY = os.environ.get('FLEET_INVENTORY')
+# Shared directory (e.g. EFS) where fleet replicas hold their membership leases
+FLEET_LEASE_DIR = os.environ.get('FLEET_LEASE_DIR', '/var/lib/kafka-keepalive/leases')
+FLEET_MAX_WORKERS = int(os.environ.get('FLEET_MAX_WORKERS', '32'))
+# Self-metrics on http://127.0.0.1:STATS_PORT/metrics (0 disables), JSON stats line every STATS_LOG_INTERVAL
+STATS_PORT = int(os.environ.get('STATS_PORT', '9464'))
+STATS_LOG_INTERVAL = int(os.environ.get('STATS_LOG_INTERVAL', '300'))
+# `kill -USR1 <pid>` samples every thread for PROFILE_SECONDS into PROFILE_DIR
+PROFILE_DIR = os.environ.get('PROFILE_DIR', '/tmp')
+PROFILE_SECONDS = int(os.environ.get('PROFILE_SECONDS', '30'))
+
+instrumentation = Instrumentation()
+
+app_supervisor = AppSupervisor(docker_api.get_client())
+jmx = JolokiaCollector(INSTANCE_ID)
+# 'statistics' (min/max/sum/count) or 'values' (Values/Counts arrays)
+aggregator = MetricAggregator(os.environ.get('METRIC_AGGREGATION', 'statistics'))
+cloudwatch = instrumentation.instrument_client(make_client(REGION))
+# 'putmetricdata' or 'emf' (CloudWatch agent EMF listener at EMF_ENDPOINT)
+sink = instrumentation.instrument_sink(make_sink(os.environ.get('METRIC_SINK', 'putmetricdata'), cloudwatch))
+# Batches that fail to send are spooled to disk and replayed in the background
+spool = MetricSpool(SPOOL_DIR, max_bytes=SPOOL_MAX_BYTES)
+freshness = FreshnessIndex(default_slo=METRIC_FRESHNESS_SLO, cooldown=1800)
+freshness.expect(series_key(name, dict(dims, InstanceId=INSTANCE_ID)) for name, dims in widget_series())
+# Replayed batches count as sent for the freshness alerts too
+spool_drainer = SpoolDrainer(spool, sink, on_sent=freshness.record)
+publisher = SpoolingSink(sink, spool)
+sns = instrumentation.instrument_client(boto3.client('sns', region_name=REGION))
+instrumentation.instrument_client(widget_verifier.get_client())
+anomalies = AnomalyEngine() if AnomalyEngine else None
+log_tailer = LogTailer({app.name: os.path.join(APP_LOG_DIR, os.path.basename(app.log_path)) for app in APPS},
+                       LOG_CHECKPOINT, max_bytes=APP_LOG_MAX_BYTES)
+# 'docker:<broker container>' or 'file:<recorded kafka-consumer-groups --describe output>'
+lag_source = consumer_lag.make_source(os.environ.get('CONSUMER_LAG_SOURCE', 'docker:kafka-1')) if consumer_lag else None
+lag_engine = consumer_lag.LagEngine() if consumer_lag else None
 
 def check_and_restart_kafka():
-    """Check and restart Kafka cluster if down"""
+    """Check every compose container in one Docker API call, start/restart the ones that are down"""
+    docker = docker_api.get_client()
     try:
-        result = subprocess.run(['docker', 'exec', 'kafka-1', 'echo', 'test'], 
-                              capture_output=True, timeout=5)
-        if result.returncode != 0:
-            print("🔄 Restarting Kafka cluster...")
-            subprocess.run(['docker-compose', '-f', '/home/ec2-user/kafka-cluster/docker-compose.yml', 'up', '-d'], 
-                         cwd='/home/ec2-user/kafka-cluster')
-            time.sleep(30)
-    except:
-        print("🔄 Restarting Kafka cluster...")
-        subprocess.run(['docker-compose', '-f', '/home/ec2-user/kafka-cluster/docker-compose.yml', 'up', '-d'], 
-                     cwd='/home/ec2-user/kafka-cluster')
-        time.sleep(30)
+        states = docker.container_states(docker_api.COMPOSE_CONTAINERS)
+    except Exception as e:
+        print(f"❌ Docker API unavailable: {e}")
+        return False
+
+    down = {name: state for name, state in states.items() if state != 'running'}
+    if not down:
+        return
+
+    ok = True
+    missing = [name for name, state in down.items() if state == 'missing']
+    for name, state in down.items():
+        if state == 'missing':
+            continue
+        print(f"🔄 Restarting {name} ({state})...")
+        try:
+            if state == 'unhealthy':
+                docker.restart(name)
+            else:
+                docker.start(name)
+        except Exception as e:
+            print(f"❌ Failed to restart {name}: {e}")
+            ok = False
+
+    if missing:
+        # Containers that were removed have to be re-created from the compose file
+        print(f"🔄 Re-creating missing containers: {', '.join(missing)}")
+        result = subprocess.run(['docker-compose', '-f', f'{COMPOSE_DIR}/docker-compose.yml', 'up', '-d'] + missing,
+                                cwd=COMPOSE_DIR)
+        ok = ok and result.returncode == 0
+    return ok
 
 def check_and_restart_apps():
     """Check and restart Kafka apps if down"""
     try:
-        result = subprocess.run(['docker', 'exec', 'kafka-1', 'ps', 'aux'], 
-                              capture_output=True, text=True, timeout=10)
-        
-        if 'KafkaProducer1' not in result.stdout:
-            print("🔄 Restarting KafkaProducer1...")
-            subprocess.run(['docker', 'exec', '-d', 'kafka-1', 'bash', '-c', 
-                          'KAFKA_JMX_OPTS="-Dcom.sun.management.jmxremote -Dcom.sun.management.jmxremote.port=9104 -Dcom.sun.management.jmxremote.authenticate=false -Dcom.sun.management.jmxremote.ssl=false" java -cp /tmp:/usr/share/java/kafka/*:/usr/share/java/cp-base-new/* KafkaProducer1 > /tmp/producer1.log 2>&1'])
-        
-        if 'KafkaProducer2' not in result.stdout:
-            print("🔄 Restarting KafkaProducer2...")
-            subprocess.run(['docker', 'exec', '-d', 'kafka-1', 'bash', '-c', 
-                          'KAFKA_JMX_OPTS="-Dcom.sun.management.jmxremote -Dcom.sun.management.jmxremote.port=9105 -Dcom.sun.management.jmxremote.authenticate=false -Dcom.sun.management.jmxremote.ssl=false" java -cp /tmp:/usr/share/java/kafka/*:/usr/share/java/cp-base-new/* KafkaProducer2 > /tmp/producer2.log 2>&1'])
-        
-        if 'KafkaConsumer1' not in result.stdout:
-            print("🔄 Restarting KafkaConsumer1...")
-            subprocess.run(['docker', 'exec', '-d', 'kafka-1', 'bash', '-c', 
-                          'KAFKA_JMX_OPTS="-Dcom.sun.management.jmxremote -Dcom.sun.management.jmxremote.port=9106 -Dcom.sun.management.jmxremote.authenticate=false -Dcom.sun.management.jmxremote.ssl=false" java -cp /tmp:/usr/share/java/kafka/*:/usr/share/java/cp-base-new/* KafkaConsumer1 > /tmp/consumer1.log 2>&1'])
-        
-        if 'KafkaConsumer2' not in result.stdout:
-            print("🔄 Restarting KafkaConsumer2...")
-            subprocess.run(['docker', 'exec', '-d', 'kafka-1', 'bash', '-c', 
-                          'KAFKA_JMX_OPTS="-Dcom.sun.management.jmxremote -Dcom.sun.management.jmxremote.port=9107 -Dcom.sun.management.jmxremote.authenticate=false -Dcom.sun.management.jmxremote.ssl=false" java -cp /tmp:/usr/share/java/kafka/*:/usr/share/java/cp-base-new/* KafkaConsumer2 > /tmp/consumer2.log 2>&1'])
-        
-        # Check high-throughput producer
-        if 'HighThroughputProducer' not in result.stdout:
-            print("🔄 Restarting HighThroughputProducer...")
-            subprocess.run(['docker', 'exec', '-d', 'kafka-1', 'bash', '-c', 
-                          'KAFKA_JMX_OPTS="-Dcom.sun.management.jmxremote -Dcom.sun.management.jmxremote.port=9108 -Dcom.sun.management.jmxremote.authenticate=false -Dcom.sun.management.jmxremote.ssl=false" java -cp /tmp:/usr/share/java/kafka/*:/usr/share/java/cp-base-new/* HighThroughputProducer > /tmp/high-throughput.log 2>&1'])
-        
-        # Check 72-hour continuous producer
-        if 'ContinuousProducer' not in result.stdout:
-            print("🔄 Restarting ContinuousProducer...")
-            subprocess.run(['docker', 'exec', '-d', 'kafka-1', 'bash', '-c', 
-                          'KAFKA_JMX_OPTS="-Dcom.sun.management.jmxremote -Dcom.sun.management.jmxremote.port=9109 -Dcom.sun.management.jmxremote.authenticate=false -Dcom.sun.management.jmxremote.ssl=false" java -cp /tmp:/usr/share/java/kafka/*:/usr/share/java/cp-base-new/* ContinuousProducer > /tmp/continuous-producer.log 2>&1'])
-        
-        # Check 72-hour continuous consumer
-        if 'ContinuousConsumer' not in result.stdout:
-            print("🔄 Restarting ContinuousConsumer...")
-            subprocess.run(['docker', 'exec', '-d', 'kafka-1', 'bash', '-c', 
-                          'KAFKA_JMX_OPTS="-Dcom.sun.management.jmxremote -Dcom.sun.management.jmxremote.port=9110 -Dcom.sun.management.jmxremote.authenticate=false -Dcom.sun.management.jmxremote.ssl=false" java -cp /tmp:/usr/share/java/kafka/*:/usr/share/java/cp-base-new/* ContinuousConsumer > /tmp/continuous-consumer.log 2>&1'])
-    except:
-        print("❌ Failed to check apps")
+        app_supervisor.check()
+    except Exception as e:
+        print(f"❌ Failed to check apps: {e}")
+        return False
+
+def sample_metrics():
+    """Scrape ALL dashboard metrics from JMX, plus app log error counters, into the aggregation buffer"""
+    samples = jmx.collect() + log_tailer.samples(INSTANCE_ID)
+    aggregator.add_samples(samples)
+    if anomalies:
+        anomalies.observe(samples)
+
+def collect_consumer_lag():
+    """Fetch committed/log-end offsets for every group and partition, aggregate lag per group and topic"""
+    try:
+        partitions = lag_engine.update(lag_source.fetch())
+    except Exception as e:
+        print(f"❌ Consumer lag fetch failed: {e}")
+        return False
+    samples = lag_engine.samples(INSTANCE_ID, CLUSTER_NAME)
+    aggregator.add_samples(samples)
+    if anomalies:
+        anomalies.observe(samples)
+    if not partitions:
+        print("⚠️ No consumer group offsets returned")
 
 def ensure_metrics():
-    """Ensure ALL dashboard metrics are being sent"""
+    """Flush the aggregated dashboard metrics to CloudWatch"""
     try:
-        cw = boto3.client('cloudwatch', region_name='us-west-2')
-        instance_id = 'i-0a57073bf1538948b'
-        now = datetime.utcnow()
-        
-        # ALL 30 metrics for COMPLETE dashboard coverage
-        all_metrics = [
-            # Producer metrics (6)
-            ('kafka.producer.request-rate', random.uniform(10, 100), 'Count/Second', [
-                {'Name': 'InstanceId', 'Value': instance_id},
-                {'Name': 'ProducerGroupName', 'Value': 'KafkaProducer'},
-                {'Name': 'client-id', 'Value': 'dashboard-java-producer'}
-            ]),
-            ('kafka.producer.response-rate', random.uniform(10, 100), 'Count/Second', [
-                {'Name': 'InstanceId', 'Value': instance_id},
-                {'Name': 'ProducerGroupName', 'Value': 'KafkaProducer'},
-                {'Name': 'client-id', 'Value': 'dashboard-java-producer'}
-            ]),
-            ('kafka.producer.request-latency-avg', random.uniform(5, 50), 'Milliseconds', [
-                {'Name': 'InstanceId', 'Value': instance_id},
-                {'Name': 'ProducerGroupName', 'Value': 'KafkaProducer'},
-                {'Name': 'client-id', 'Value': 'dashboard-java-producer'}
-            ]),
-            ('kafka.producer.record-send-rate', random.uniform(20, 200), 'Count/Second', [
-                {'Name': 'InstanceId', 'Value': instance_id},
-                {'Name': 'ProducerGroupName', 'Value': 'KafkaProducer'},
-                {'Name': 'client-id', 'Value': 'dashboard-java-producer'},
-                {'Name': 'topic', 'Value': 'dashboard-metrics-test'}
-            ]),
-            ('kafka.producer.record-error-rate', random.uniform(0, 2), 'Count/Second', [
-                {'Name': 'InstanceId', 'Value': instance_id},
-                {'Name': 'ProducerGroupName', 'Value': 'KafkaProducer'},
-                {'Name': 'client-id', 'Value': 'dashboard-java-producer'},
-                {'Name': 'topic', 'Value': 'dashboard-metrics-test'}
-            ]),
-            ('kafka.producer.byte-rate', random.uniform(1000, 10000), 'Bytes/Second', [
-                {'Name': 'InstanceId', 'Value': instance_id},
-                {'Name': 'ProducerGroupName', 'Value': 'KafkaProducer'},
-                {'Name': 'client-id', 'Value': 'dashboard-java-producer'},
-                {'Name': 'topic', 'Value': 'dashboard-metrics-test'}
-            ]),
-            # Consumer metrics (5)
-            ('kafka.consumer.fetch-rate', random.uniform(5, 50), 'Count/Second', [
-                {'Name': 'InstanceId', 'Value': instance_id},
-                {'Name': 'ConsumerGroupName', 'Value': 'KafkaConsumer'},
-                {'Name': 'client-id', 'Value': 'dashboard-java-consumer'}
-            ]),
-            ('kafka.consumer.total.bytes-consumed-rate', random.uniform(1000, 8000), 'Bytes/Second', [
-                {'Name': 'InstanceId', 'Value': instance_id},
-                {'Name': 'ConsumerGroupName', 'Value': 'KafkaConsumer'},
-                {'Name': 'client-id', 'Value': 'dashboard-java-consumer'}
-            ]),
-            ('kafka.consumer.records-consumed-rate', random.uniform(10, 100), 'Count/Second', [
-                {'Name': 'InstanceId', 'Value': instance_id},
-                {'Name': 'ConsumerGroupName', 'Value': 'KafkaConsumer'},
-                {'Name': 'client-id', 'Value': 'dashboard-java-consumer'},
-                {'Name': 'topic', 'Value': 'dashboard-metrics-test'}
-            ]),
-            ('kafka.consumer.bytes-consumed-rate', random.uniform(500, 5000), 'Bytes/Second', [
-                {'Name': 'InstanceId', 'Value': instance_id},
-                {'Name': 'ConsumerGroupName', 'Value': 'KafkaConsumer'},
-                {'Name': 'client-id', 'Value': 'dashboard-java-consumer'},
-                {'Name': 'topic', 'Value': 'dashboard-metrics-test'}
-            ]),
-            ('kafka.consumer.records-lag-max', random.randint(0, 100), 'Count', [
-                {'Name': 'InstanceId', 'Value': instance_id},
-                {'Name': 'ConsumerGroupName', 'Value': 'KafkaConsumer'},
-                {'Name': 'client-id', 'Value': 'dashboard-java-consumer'}
-            ]),
-            # JVM metrics (10) - INCLUDING THE MISSING GC METRICS
-            ('jvm.classes.loaded', random.randint(8000, 12000), 'Count', [
-                {'Name': 'InstanceId', 'Value': instance_id},
-                {'Name': 'ProcessGroupName', 'Value': 'kafka-cluster'}
-            ]),
-            # GC metrics with BOTH ProcessGroupName values (kafka-cluster and KafkaClusterName)
-            ('jvm.gc.collections.count', random.randint(5, 25), 'Count', [
-                {'Name': 'InstanceId', 'Value': instance_id},
-                {'Name': 'ProcessGroupName', 'Value': 'kafka-cluster'},
-                {'Name': 'name', 'Value': 'G1 Young Generation'}
-            ]),
-            ('jvm.gc.collections.elapsed', random.randint(10, 100), 'Milliseconds', [
-                {'Name': 'InstanceId', 'Value': instance_id},
-                {'Name': 'ProcessGroupName', 'Value': 'kafka-cluster'},
-                {'Name': 'name', 'Value': 'G1 Young Generation'}
-            ]),
-            ('jvm.gc.collections.count', random.randint(5, 25), 'Count', [
-                {'Name': 'InstanceId', 'Value': instance_id},
-                {'Name': 'ProcessGroupName', 'Value': 'KafkaClusterName'},
-                {'Name': 'name', 'Value': 'G1 Young Generation'}
-            ]),
-            ('jvm.gc.collections.elapsed', random.randint(10, 100), 'Milliseconds', [
-                {'Name': 'InstanceId', 'Value': instance_id},
-                {'Name': 'ProcessGroupName', 'Value': 'KafkaClusterName'},
-                {'Name': 'name', 'Value': 'G1 Young Generation'}
-            ]),
-            ('jvm.memory.heap.committed', random.randint(500000000, 1000000000), 'Bytes', [
-                {'Name': 'InstanceId', 'Value': instance_id},
-                {'Name': 'ProcessGroupName', 'Value': 'kafka-cluster'}
-            ]),
-            ('jvm.memory.heap.max', 1073741824, 'Bytes', [
-                {'Name': 'InstanceId', 'Value': instance_id},
-                {'Name': 'ProcessGroupName', 'Value': 'kafka-cluster'}
-            ]),
-            ('jvm.memory.heap.used', random.randint(200000000, 800000000), 'Bytes', [
-                {'Name': 'InstanceId', 'Value': instance_id},
-                {'Name': 'ProcessGroupName', 'Value': 'kafka-cluster'}
-            ]),
-            ('jvm.memory.nonheap.committed', random.randint(100000000, 250000000), 'Bytes', [
-                {'Name': 'InstanceId', 'Value': instance_id},
-                {'Name': 'ProcessGroupName', 'Value': 'kafka-cluster'}
-            ]),
-            ('jvm.memory.nonheap.max', 268435456, 'Bytes', [
-                {'Name': 'InstanceId', 'Value': instance_id},
-                {'Name': 'ProcessGroupName', 'Value': 'kafka-cluster'}
-            ]),
-            ('jvm.memory.nonheap.used', random.randint(50000000, 200000000), 'Bytes', [
-                {'Name': 'InstanceId', 'Value': instance_id},
-                {'Name': 'ProcessGroupName', 'Value': 'kafka-cluster'}
-            ]),
-            ('jvm.threads.count', random.randint(50, 150), 'Count', [
-                {'Name': 'InstanceId', 'Value': instance_id},
-                {'Name': 'ProcessGroupName', 'Value': 'kafka-cluster'}
-            ]),
-            # Kafka broker/cluster metrics (9)
-            ('kafka.isr.operation.count', random.uniform(0.1, 5.0), 'Count', [
-                {'Name': 'InstanceId', 'Value': instance_id},
-                {'Name': 'ClusterName', 'Value': 'kafka-cluster'},
-                {'Name': 'operation', 'Value': 'expand'}
-            ]),
-            ('kafka.leader.election.rate', random.uniform(0.1, 2.0), 'Count/Second', [
-                {'Name': 'InstanceId', 'Value': instance_id},
-                {'Name': 'ClusterName', 'Value': 'kafka-cluster'}
-            ]),
-            ('kafka.network.io', random.uniform(1000, 50000), 'Bytes/Second', [
-                {'Name': 'InstanceId', 'Value': instance_id},
-                {'Name': 'ClusterName', 'Value': 'kafka-cluster'},
-                {'Name': 'state', 'Value': 'in'}
-            ]),
-            ('kafka.partition.offline', random.randint(0, 1), 'Count', [
-                {'Name': 'InstanceId', 'Value': instance_id},
-                {'Name': 'ClusterName', 'Value': 'kafka-cluster'}
-            ]),
-            ('kafka.partition.under_replicated', random.randint(0, 2), 'Count', [
-                {'Name': 'InstanceId', 'Value': instance_id},
-                {'Name': 'ClusterName', 'Value': 'kafka-cluster'}
-            ]),
-            ('kafka.purgatory.size', random.uniform(0, 20), 'Count', [
-                {'Name': 'InstanceId', 'Value': instance_id},
-                {'Name': 'ClusterName', 'Value': 'kafka-cluster'},
-                {'Name': 'type', 'Value': 'produce'}
-            ]),
-            ('kafka.request.count', random.uniform(10, 100), 'Count', [
-                {'Name': 'InstanceId', 'Value': instance_id},
-                {'Name': 'ClusterName', 'Value': 'kafka-cluster'},
-                {'Name': 'type', 'Value': 'produce'}
-            ]),
-            ('kafka.request.failed', random.uniform(0, 5), 'Count', [
-                {'Name': 'InstanceId', 'Value': instance_id},
-                {'Name': 'ClusterName', 'Value': 'kafka-cluster'},
-                {'Name': 'type', 'Value': 'produce'}
-            ]),
-            ('kafka.request.time.avg', random.uniform(5, 50), 'Milliseconds', [
-                {'Name': 'InstanceId', 'Value': instance_id},
-                {'Name': 'ClusterName', 'Value': 'kafka-cluster'},
-                {'Name': 'type', 'Value': 'produce'}
-            ])
-        ]
-        
-        metric_data = []
-        for name, value, unit, dims in all_metrics:
-            metric_data.append({
-                'MetricName': name,
-                'Value': value,
-                'Unit': unit,
-                'Timestamp': now,
-                'Dimensions': dims
-            })
-        
-        cw.put_metric_data(Namespace='CWAgent', MetricData=metric_data[:20])
-        if len(metric_data) > 20:
-            cw.put_metric_data(Namespace='CWAgent', MetricData=metric_data[20:])
-        
-        print(f"✅ Sent ALL {len(metric_data)} dashboard metrics (30 total)")
-        
-        # Check if metric sender process is running
-        result = subprocess.run(['pgrep', '-f', 'metric_sender'], capture_output=True, text=True)
-        if not result.stdout.strip():
-            print("🔄 Restarting metric sender process...")
-            subprocess.run(['nohup', 'python3', '-c', '''
-import boto3
-import random
-import time
-from datetime import datetime
+        for target, error in jmx.last_errors.items():
+            print(f"⚠️ JMX scrape failed for {target}: {error}")
 
-cw = boto3.client("cloudwatch", region_name="us-west-2")
-instance_id = "i-0a57073bf1538948b"
+        datums = aggregator.flush()
+        if not datums:
+            print("❌ No metrics scraped - are the Jolokia agents up?")
+            return False
+
+        writes = publisher.send(datums)
+        if writes:
+            freshness.record(datums)
+            print(f"✅ Sent {len(datums)} aggregated dashboard series in {writes} {type(sink).__name__} write(s)")
 
-while True:
-    try:
-        now = datetime.utcnow()
-        metrics = [
-            ("kafka.producer.request-rate", random.uniform(10, 100), "Count/Second", [
-                {"Name": "InstanceId", "Value": instance_id},
-                {"Name": "ProducerGroupName", "Value": "KafkaProducer"},
-                {"Name": "client-id", "Value": "dashboard-java-producer"}
-            ]),
-            ("kafka.consumer.fetch-rate", random.uniform(5, 50), "Count/Second", [
-                {"Name": "InstanceId", "Value": instance_id},
-                {"Name": "ConsumerGroupName", "Value": "KafkaConsumer"},
-                {"Name": "client-id", "Value": "dashboard-java-consumer"}
-            ])
-        ]
-        
-        metric_data = []
-        for name, value, unit, dims in metrics:
-            metric_data.append({
-                "MetricName": name,
-                "Value": value,
-                "Unit": unit,
-                "Timestamp": now,
-                "Dimensions": dims
-            })
-        
-        cw.put_metric_data(Namespace="CWAgent", MetricData=metric_data)
-        time.sleep(60)
-    except Exception as e:
-        time.sleep(60)
-'''], stdout=open('/tmp/metric_sender.log', 'w'), stderr=subprocess.STDOUT)
-        
     except Exception as e:
         print(f"❌ Metric error: {e}")
+        return False
 
 def check_metrics_and_alert():
-    """Check if metrics are missing and send alert"""
+    """Alert on series that have not been sent within their SLO (local index, no CloudWatch reads)"""
     try:
-        cw = boto3.client('cloudwatch', region_name='us-west-2')
-        sns = boto3.client('sns', region_name='us-west-2')
-        
-        # Check if producer metrics exist in last 30 minutes
-        end_time = datetime.utcnow()
-        start_time = end_time - timedelta(minutes=30)
-        
-        response = cw.get_metric_statistics(
-            Namespace='CWAgent',
-            MetricName='kafka.producer.request-rate',
-            Dimensions=[
-                {'Name': 'InstanceId', 'Value': 'i-0a57073bf1538948b'},
-                {'Name': 'ProducerGroupName', 'Value': 'KafkaProducer'}
-            ],
-            StartTime=start_time,
-            EndTime=end_time,
-            Period=300,
-            Statistics=['Average']
-        )
-        
-        if not response['Datapoints']:
-            # No metrics in last 30 minutes - send alert
-            message = f"""
+        due = freshness.alerts_due()
+        if not due:
+            return
+
+        lines = []
+        for (metric, dims), age, value in sorted(due, key=lambda s: -s[1]):
+            dim_text = ', '.join(f"{k}={v}" for k, v in dims if k != 'InstanceId')
+            lines.append(f"  - {metric} [{dim_text}] last sent {age / 60:.0f} min ago (last value: {value})")
+
+        message = f"""
 ALERT: Kafka Metrics Missing
 
-No kafka.producer.request-rate metrics found in the last 30 minutes.
+{len(due)} of {len(freshness)} dashboard series have not been sent within their freshness SLO:
+
+{chr(10).join(lines)}
 
 Time: {datetime.utcnow()}
-Instance: i-0a57073bf1538948b
-Dashboard: https://us-west-2.console.aws.amazon.com/cloudwatch/home?region=us-west-2#dashboards:name=ApacheKafkaOnEc2-Real
+Instance: {INSTANCE_ID}
+Dashboard: https://{REGION}.console.aws.amazon.com/cloudwatch/home?region={REGION}#dashboards:name=ApacheKafkaOnEc2-Real
 
 Watchdog is attempting to restart metric collection.
 """
-            
-            sns.publish(
-                TopicArn='arn:aws:sns:us-west-2:782045727575:kafka-metrics-alerts',
-                Subject='🚨 Kafka Metrics Alert',
-                Message=message
-            )
-            print("🚨 Alert sent - metrics missing for 30+ minutes")
-        else:
-            print("✅ Metrics present - no alert needed")
-            
+
+        sns.publish(
+            TopicArn=SNS_TOPIC_ARN,
+            Subject='🚨 Kafka Metrics Alert',
+            Message=message
+        )
+        print(f"🚨 Alert sent - {len(due)} series stale")
+
     except Exception as e:
         print(f"❌ Alert check failed: {e}")
+        return False
 
-def main():
-    print("🛡️ KEEPALIVE SYSTEM STARTED")
-    cycle = 0
-    
-    while True:
-        cycle += 1
-        print(f"🔄 Keepalive cycle {cycle} - {datetime.now()}")
-        
-        # Check and restart components
-        check_and_restart_kafka()
-        time.sleep(5)
-        check_and_restart_apps()
-        time.sleep(5)
-        ensure_metrics()
-        time.sleep(5)
-        check_metrics_and_alert()
-        
-        # VERIFICATION HOOK - Test all widgets every cycle
-        print("🔍 Running widget verification hook...")
-        try:
-            result = subprocess.run(['/home/ec2-user/verify-all-widgets.sh'], 
-                                  capture_output=True, text=True, timeout=120)
-            if result.returncode == 0:
-                print("✅ Widget verification PASSED - all widgets have data")
-            else:
-                print("❌ Widget verification FAILED - some widgets empty")
-                print("🔧 Forcing metric injection to fix empty widgets...")
-                ensure_metrics()  # Send metrics again if verification fails
-        except Exception as e:
-            print(f"❌ Verification hook error: {e}")
-        
-        # Wait 5 minutes between cycles (300 seconds)
-        time.sleep(300)
+def check_anomalies():
+    """Evaluate threshold/z-score/trend rules over the rolling windows, alert via SNS"""
+    try:
+        alerts = anomalies.evaluate()
+        if not alerts:
+            return
 
-if __name__ == '__main__':
-    main()
+        lines = []
+        for a in alerts:
+            dim_text = ', '.join(f"{k}={v}" for k, v in a.dimensions if k != 'InstanceId')
+            lines.append(f"  - {a.rule}: {a.metric} [{dim_text}] {a.detail}")
 
-def check_metrics_and_alert():
-    """Check if metrics are missing and send alert"""
-    try:
-        import boto3
-        from datetime import datetime, timedelta
-        
-        cw = boto3.client('cloudwatch', region_name='us-west-2')
-        sns = boto3.client('sns', region_name='us-west-2')
-        
-        # Check if producer metrics exist in last 30 minutes
-        end_time = datetime.utcnow()
-        start_time = end_time - timedelta(minutes=30)
-        
-        response = cw.get_metric_statistics(
-            Namespace='CWAgent',
-            MetricName='kafka.producer.request-rate',
-            Dimensions=[
-                {'Name': 'InstanceId', 'Value': 'i-0a57073bf1538948b'},
-                {'Name': 'ProducerGroupName', 'Value': 'KafkaProducer'}
-            ],
-            StartTime=start_time,
-            EndTime=end_time,
-            Period=300,
-            Statistics=['Average']
-        )
-        
-        if not response['Datapoints']:
-            # No metrics in last 30 minutes - send alert
-            message = f"""
-ALERT: Kafka Metrics Missing
+        message = f"""
+ALERT: Kafka Metric Anomaly
 
-No kafka.producer.request-rate metrics found in the last 30 minutes.
+{chr(10).join(lines)}
 
 Time: {datetime.utcnow()}
-Instance: i-0a57073bf1538948b
-Dashboard: https://us-west-2.console.aws.amazon.com/cloudwatch/home?region=us-west-2#dashboards:name=ApacheKafkaOnEc2-Real
-
-Watchdog is attempting to restart metric collection.
+Instance: {INSTANCE_ID}
+Dashboard: https://{REGION}.console.aws.amazon.com/cloudwatch/home?region={REGION}#dashboards:name=ApacheKafkaOnEc2-Real
 """
-            
-            sns.publish(
-                TopicArn='TOPIC_ARN_PLACEHOLDER',
-                Subject='🚨 Kafka Metrics Alert',
-                Message=message
-            )
-            print("🚨 Alert sent - metrics missing for 30+ minutes")
+
+        sns.publish(
+            TopicArn=SNS_TOPIC_ARN,
+            Subject='🚨 Kafka Metric Anomaly',
+            Message=message
+        )
+        print(f"🚨 Anomaly alert sent - {len(alerts)} rule(s) fired")
+
+    except Exception as e:
+        print(f"❌ Anomaly check failed: {e}")
+        return False
+
+def verify_widgets():
+    """Verify every dashboard widget has data, re-inject metrics if not"""
+    # VERIFICATION HOOK - one batched GetMetricData call for all widgets
+    print("🔍 Running widget verification hook...")
+    try:
+        results = widget_verifier.verify_widgets()
+        failed = [r for r in results if not r.ok]
+        if not failed:
+            print(f"✅ Widget verification PASSED - all {len(results)} widgets have data")
         else:
-            print("✅ Metrics present - no alert needed")
-            
+            print(f"❌ Widget verification FAILED - {len(failed)}/{len(results)} widgets empty")
+            for r in failed:
+                print(f"   - {r.metric} {r.dimensions}")
+            print("🔧 Forcing metric injection to fix empty widgets...")
+            ensure_metrics()  # Send metrics again if verification fails
     except Exception as e:
-        print(f"❌ Alert check failed: {e}")
+        print(f"❌ Verification hook error: {e}")
+        return False
+
+def main():
+    print(f"🛡️ KEEPALIVE SYSTEM STARTED - {datetime.now()}")
+
+    instrumentation.install_audit_hook()
+    install_profile_signal(PROFILE_DIR, PROFILE_SECONDS)
+    if STATS_PORT:
+        instrumentation.serve(STATS_PORT)
+
+    if FLEET_INVENTORY:
+        fleet.run_fleet(FLEET_INVENTORY, FLEET_LEASE_DIR, container_interval=CONTAINER_CHECK_INTERVAL,
+                        widget_interval=RECONCILE_INTERVAL, max_workers=FLEET_MAX_WORKERS,
+                        cw_factory=lambda region: instrumentation.instrument_client(
+                            boto3.client('cloudwatch', region_name=region)),
+                        sns_factory=lambda region: instrumentation.instrument_client(
+                            boto3.client('sns', region_name=region)))
+        return
+
+    spool_drainer.start()
+    log_tailer.start()
+
+    # Each check runs concurrently on its own interval (seconds)
+    scheduler = Scheduler(instrumentation=instrumentation)
+    scheduler.register('kafka', check_and_restart_kafka, interval=CONTAINER_CHECK_INTERVAL, timeout=60, jitter=1)
+    scheduler.register('apps', check_and_restart_apps, interval=APP_CHECK_INTERVAL, timeout=30, jitter=1, initial_delay=5)
+    scheduler.register('sample', sample_metrics, interval=METRIC_SAMPLE_INTERVAL, timeout=jmx.timeout + 2)
+    scheduler.register('metrics', ensure_metrics, interval=METRIC_COLLECTION_INTERVAL, timeout=30, jitter=2)
+    if anomalies:
+        scheduler.register('anomaly', check_anomalies, interval=METRIC_SAMPLE_INTERVAL, timeout=10, initial_delay=METRIC_SAMPLE_INTERVAL)
+    if lag_engine:
+        scheduler.register('lag', collect_consumer_lag, interval=CONSUMER_LAG_INTERVAL, timeout=90, jitter=2, initial_delay=20)
+    scheduler.register('alert', check_metrics_and_alert, interval=ALERT_CHECK_INTERVAL, timeout=30, jitter=1, initial_delay=15)
+    scheduler.register('verify', verify_widgets, interval=RECONCILE_INTERVAL, timeout=120, jitter=5, initial_delay=30)
+    scheduler.register('stats', instrumentation.log_json, interval=STATS_LOG_INTERVAL, timeout=10, initial_delay=STATS_LOG_INTERVAL)
+    scheduler.run()
+
+if __name__ == '__main__':
+    main()
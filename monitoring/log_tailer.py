@@ -0,0 +1,310 @@
+"""Incremental app log tailer that turns log lines into error counters.
+
+Keeps a checkpointed (inode, byte offset) per log file and reads only the
+bytes appended since the last pass, so nothing is re-read after a restart.
+A new inode means the file was replaced and is read from the start; a file
+shorter than its offset was truncated. New bytes are matched in whole
+chunks, behind a bytes.find keyword prefilter so ordinary lines never reach
+the regex engine; a line counts once, for the first category in priority
+(dict) order that matches it. Files are watched with inotify (via ctypes) where
+available and polled otherwise. Logs over max_bytes are rotated copytruncate-style, which
+works because the apps are launched with `>>` (O_APPEND). A writer without O_APPEND
+keeps writing at its old offset after the truncate, so the file comes back as a
+hole followed by new data; that is detected after the first rotation, the hole
+is skipped, and the file is no longer rotated (each copy would be larger).
+"""
+import ctypes
+import ctypes.util
+import json
+import os
+import re
+import select
+import shutil
+import struct
+import threading
+
+DEFAULT_PATTERNS = {
+    'errors': [rb'Error sending message', rb'[Pp]roducer error', rb'[Cc]onsumer error', rb'\bERROR\b'],
+    'exceptions': [rb'Exception in thread', rb'\b[\w$]+(?:\.[\w$]+)+(?:Exception|Error)\b'],
+    'warnings': [rb'\bWARN\b'],
+}
+# Every pattern above contains one of these literals; lines without any are never regex-matched
+DEFAULT_KEYWORDS = (b'rror', b'RROR', b'xception', b'WARN')
+METRIC_NAMES = {
+    'errors': 'kafka.app.log.errors',
+    'exceptions': 'kafka.app.log.exceptions',
+    'warnings': 'kafka.app.log.warnings',
+}
+
+IN_MODIFY = 0x00000002
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+_EVENT = struct.Struct('iIII')
+
+
+class PatternSet:
+    """One regex per category; each line counts for the highest-priority (earliest) category it matches"""
+
+    def __init__(self, patterns=DEFAULT_PATTERNS, keywords=DEFAULT_KEYWORDS):
+        self.categories = list(patterns)
+        self.keywords = keywords
+        self._regexes = [(name, re.compile(b'|'.join(patterns[name]))) for name in self.categories]
+        # Rejects lines matching no category in one pass before the per-category checks
+        self._any = re.compile(b'|'.join(b'|'.join(patterns[name]) for name in self.categories))
+
+    def _candidate_lines(self, data):
+        """(start, end) of every line containing a keyword, found with bytes.find"""
+        lines = set()
+        for keyword in self.keywords:
+            pos = data.find(keyword)
+            while pos != -1:
+                end = data.find(b'\n', pos)
+                if end == -1:
+                    end = len(data)
+                lines.add((data.rfind(b'\n', 0, pos) + 1, end))
+                pos = data.find(keyword, end)
+        return lines
+
+    def count(self, data):
+        """{category: matching line count} for a chunk of complete lines"""
+        counts = dict.fromkeys(self.categories, 0)
+        search = self._any.search
+        if self.keywords is None:
+            lines = []
+            start = 0
+            while start < len(data):
+                end = data.find(b'\n', start)
+                end = len(data) if end == -1 else end
+                lines.append((start, end))
+                start = end + 1
+        else:
+            lines = self._candidate_lines(data)
+        for start, end in lines:
+            if search(data, start, end) is None:
+                continue
+            for category, regex in self._regexes:
+                if regex.search(data, start, end) is not None:
+                    counts[category] += 1
+                    break
+        return counts
+
+
+class InotifyWatcher:
+    """Directory watches through the inotify syscalls"""
+
+    def __init__(self, directories):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self._dirs = {}
+        for directory in directories:
+            wd = libc.inotify_add_watch(self.fd, os.fsencode(directory), IN_MODIFY | IN_MOVED_TO | IN_CREATE)
+            if wd < 0:
+                os.close(self.fd)
+                raise OSError(ctypes.get_errno(), f'inotify_add_watch failed for {directory}')
+            self._dirs[wd] = directory
+
+    def wait(self, timeout):
+        """Paths changed within timeout seconds; None means 'check everything'"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return None
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT.unpack_from(data, offset)
+                offset += _EVENT.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    return None
+                if wd in self._dirs and name:
+                    changed.add(os.path.join(self._dirs[wd], os.fsdecode(name)))
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Fallback when inotify is unavailable: every wait is a full sweep"""
+
+    def __init__(self, directories=()):
+        self._stop_event = threading.Event()
+
+    def wait(self, timeout):
+        self._stop_event.wait(timeout)
+        return None
+
+    def close(self):
+        self._stop_event.set()
+
+
+def make_watcher(directories):
+    try:
+        return InotifyWatcher(directories)
+    except (OSError, AttributeError) as e:
+        print(f"⚠️ inotify unavailable ({e}) - polling app logs")
+        return PollingWatcher(directories)
+
+
+class LogTailer(threading.Thread):
+    """Tails app logs in the background and accumulates per-app category counters"""
+
+    def __init__(self, files, checkpoint_path, patterns=DEFAULT_PATTERNS, poll_interval=5.0, min_interval=1.0,
+                 max_bytes=50 * 1024 * 1024, keep=3, read_size=4 * 1024 * 1024):
+        super().__init__(name='log-tailer', daemon=True)
+        self.files = dict(files)  # app name -> path
+        self.apps = {path: app for app, path in self.files.items()}
+        self.checkpoint_path = checkpoint_path
+        self.patterns = PatternSet(patterns)
+        self.poll_interval = poll_interval
+        self.min_interval = min_interval
+        self.max_bytes = max_bytes
+        self.keep = keep
+        self.read_size = read_size
+        self.rotations = 0
+        self.no_rotate = set()  # paths whose writer isn't appending
+        self._rotated = set()  # paths truncated by us and not read since
+        self.offsets = self._load_checkpoint()  # path -> [inode, offset]
+        self._counts = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def _load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_checkpoint(self):
+        os.makedirs(os.path.dirname(self.checkpoint_path) or '.', exist_ok=True)
+        tmp = self.checkpoint_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.offsets, f)
+        os.replace(tmp, self.checkpoint_path)
+
+    def _consume(self, path, offset, app):
+        """Count complete lines from offset onward; returns the offset after the last full line"""
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            while True:
+                chunk = f.read(self.read_size)
+                if not chunk:
+                    break
+                end = chunk.rfind(b'\n') + 1
+                if end == 0:
+                    if len(chunk) < self.read_size:
+                        break  # partial line still being written
+                    end = len(chunk)  # a single huge line
+                counts = self.patterns.count(chunk[:end])
+                with self._lock:
+                    for category, n in counts.items():
+                        self._counts[(app, category)] = self._counts.get((app, category), 0) + n
+                offset += end
+                if end < len(chunk):
+                    f.seek(offset)
+        return offset
+
+    def _rotate(self, path, offset, app):
+        """copytruncate: shift path.N, copy path to path.1, truncate path"""
+        for i in range(self.keep - 1, 0, -1):
+            if os.path.exists(f"{path}.{i}"):
+                os.replace(f"{path}.{i}", f"{path}.{i + 1}")
+        shutil.copyfile(path, f"{path}.1")
+        os.truncate(path, 0)
+        self._rotated.add(path)
+        # Lines appended between the last read and the copy only exist in the copy now
+        self._consume(f"{path}.1", offset, app)
+        self.rotations += 1
+        print(f"🔄 Rotated {path} at {offset} bytes")
+
+    def _data_start(self, path):
+        """Offset of the first non-NUL byte, i.e. past the hole a non-appending writer leaves"""
+        with open(path, 'rb') as f:
+            try:
+                start = os.lseek(f.fileno(), 0, os.SEEK_DATA)
+            except (AttributeError, OSError):
+                start = 0  # no SEEK_DATA: scan from the start
+            f.seek(start)
+            while True:
+                chunk = f.read(64 * 1024)
+                if not chunk:
+                    return start
+                stripped = chunk.lstrip(b'\0')
+                if stripped:
+                    return start + len(chunk) - len(stripped)
+                start += len(chunk)
+
+    def tail(self, path):
+        """Read whatever was appended to one file since its checkpoint; returns True if the offset moved"""
+        app = self.apps[path]
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return False
+        inode, offset = self.offsets.get(path, (None, None))
+        if offset is None:
+            offset = st.st_size  # first sight of this log: don't count its history
+        elif inode != st.st_ino or st.st_size < offset:
+            offset = 0  # replaced or truncated
+        if path in self._rotated and st.st_size > 0:
+            self._rotated.discard(path)
+            start = self._data_start(path) if offset == 0 else 0
+            if start > 0:
+                print(f"⚠️ {path} came back with a {start}-byte hole after rotation - its writer isn't "
+                      f"appending (launched with '>' instead of '>>'?); no longer rotating it")
+                self.no_rotate.add(path)
+                offset = start
+        new_offset = self._consume(path, offset, app) if st.st_size > offset else offset
+        if new_offset >= self.max_bytes and self.keep > 0 and path not in self.no_rotate:
+            self._rotate(path, new_offset, app)
+            new_offset = 0
+        moved = [st.st_ino, new_offset] != self.offsets.get(path)
+        self.offsets[path] = [st.st_ino, new_offset]
+        return moved
+
+    def tail_all(self, paths=None):
+        moved = False
+        for path in paths if paths is not None else self.apps:
+            try:
+                moved = self.tail(path) or moved
+            except OSError as e:
+                print(f"⚠️ Could not tail {path}: {e}")
+        if moved:
+            self._save_checkpoint()
+
+    def drain_counts(self):
+        """Counters since the last drain, {(app, category): n}, with zeros for quiet apps"""
+        with self._lock:
+            counts, self._counts = self._counts, {}
+        return {(app, category): counts.get((app, category), 0)
+                for app in self.files for category in self.patterns.categories}
+
+    def samples(self, instance_id):
+        """Drained counters as collector samples [(metric, value, unit, dims), ...]"""
+        return [(METRIC_NAMES.get(category, f'kafka.app.log.{category}'), float(n), 'Count',
+                 [{'Name': 'InstanceId', 'Value': instance_id}, {'Name': 'App', 'Value': app}])
+                for (app, category), n in self.drain_counts().items()]
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        watcher = make_watcher(sorted({os.path.dirname(path) for path in self.apps}))
+        try:
+            self.tail_all()
+            while not self._stop_event.is_set():
+                changed = watcher.wait(self.poll_interval)
+                self.tail_all(None if changed is None else [p for p in changed if p in self.apps])
+                # Coalesce bursts of modify events from busy writers
+                self._stop_event.wait(self.min_interval)
+        finally:
+            watcher.close()
@@ -0,0 +1,124 @@
+"""Concurrent check scheduler for the keepalive watchdog.
+
+Every check is registered with its own interval, timeout and jitter and runs
+on its own asyncio loop. The checks themselves are plain blocking functions,
+so they are executed in a shared thread pool with one worker per check
+(each check has at most one run in flight): a slow CloudWatch call never
+delays the container check. With an Instrumentation registry attached, every
+run is timed and whatever it records is labelled with the check's name.
+Checks that handle their own errors return False to report a failed run.
+"""
+import asyncio
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+
+class ScheduledCheck:
+    """A registered check and its run bookkeeping"""
+
+    def __init__(self, name, func, interval, timeout, jitter, initial_delay):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.timeout = timeout
+        self.jitter = jitter
+        self.initial_delay = initial_delay
+        self.runs = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.last_duration = None
+        self.last_started = None
+        self.pending = None  # future of a run that outlived its timeout
+
+
+class Scheduler:
+    """Runs registered checks concurrently, each on its own interval"""
+
+    def __init__(self, max_workers=None, instrumentation=None):
+        self.checks = {}
+        self.max_workers = max_workers
+        self.instrumentation = instrumentation
+        self._executor = None
+
+    def register(self, name, func, interval, timeout=None, jitter=0.0, initial_delay=0.0):
+        """Register func to run every interval seconds (plus up to jitter seconds)"""
+        if name in self.checks:
+            raise ValueError(f"check {name!r} already registered")
+        self.checks[name] = ScheduledCheck(name, func, interval, timeout or interval, jitter, initial_delay)
+        return self.checks[name]
+
+    def _invoke(self, check):
+        if self.instrumentation is None:
+            return check.func()
+        with self.instrumentation.timed(check.name) as run:
+            result = check.func()
+            if result is False:
+                run['outcome'] = 'error'
+            return result
+
+    async def _run_once(self, check):
+        """Run one invocation of a check in the thread pool, bounded by its timeout"""
+        if check.pending is not None and not check.pending.done():
+            print(f"⏳ {check.name} still running from a previous tick - skipping")
+            return
+
+        loop = asyncio.get_running_loop()
+        check.last_started = datetime.now()
+        start = time.monotonic()
+        future = loop.run_in_executor(self._executor, self._invoke, check)
+        try:
+            # shield() so a timed-out run keeps its thread; we only stop waiting for it
+            if await asyncio.wait_for(asyncio.shield(future), check.timeout) is False:
+                check.failures += 1
+        except asyncio.TimeoutError:
+            check.timeouts += 1
+            check.pending = future
+            if self.instrumentation:
+                self.instrumentation.inc('keepalive_check_timeouts_total', check=check.name)
+            print(f"⏱️ {check.name} exceeded its {check.timeout}s timeout")
+        except Exception as e:
+            check.failures += 1
+            print(f"❌ {check.name} failed: {e}")
+        finally:
+            check.runs += 1
+            check.last_duration = time.monotonic() - start
+
+    async def _loop(self, check):
+        """Run a check forever on its own interval"""
+        if check.initial_delay:
+            await asyncio.sleep(check.initial_delay)
+        while True:
+            started = time.monotonic()
+            await self._run_once(check)
+            elapsed = time.monotonic() - started
+            delay = max(check.interval - elapsed, 0) + random.uniform(0, check.jitter)
+            await asyncio.sleep(delay)
+
+    async def run_async(self):
+        """Run every registered check concurrently until cancelled"""
+        # One worker per check unless told otherwise, so no check ever queues behind another
+        workers = self.max_workers or max(len(self.checks), 1)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='check')
+        try:
+            await asyncio.gather(*(self._loop(check) for check in self.checks.values()))
+        finally:
+            self._executor.shutdown(wait=False)
+
+    def run(self):
+        """Blocking entry point"""
+        asyncio.run(self.run_async())
+
+    def stats(self):
+        """Per-check run counts and last durations"""
+        return {
+            name: {
+                'runs': c.runs,
+                'failures': c.failures,
+                'timeouts': c.timeouts,
+                'last_duration': c.last_duration,
+                'last_started': c.last_started.isoformat() if c.last_started else None
+            }
+            for name, c in self.checks.items()
+        }
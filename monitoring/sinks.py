@@ -0,0 +1,178 @@
+"""Pluggable metric sinks.
+
+Every sink takes the PutMetricData-shaped datums produced by the aggregator.
+PutMetricDataSink calls the CloudWatch API directly; EmfSink writes CloudWatch
+Embedded Metric Format documents to a local file or to the CloudWatch agent's
+EMF listener (TCP/UDP 25888), which ingests them asynchronously so the
+watchdog never blocks on the CloudWatch API.
+"""
+import calendar
+import json
+import os
+import socket
+import threading
+from datetime import datetime
+
+from aggregator import publish
+
+EMF_MAX_METRICS = 100
+EMF_MAX_VALUES = 100
+EMF_ENDPOINT = os.environ.get('EMF_ENDPOINT', 'tcp://127.0.0.1:25888')
+
+
+class PutMetricDataSink:
+    """Synchronous PutMetricData calls"""
+
+    def __init__(self, cw, namespace='CWAgent'):
+        self.cw = cw
+        self.namespace = namespace
+
+    def send(self, datums):
+        return publish(self.cw, datums, self.namespace)
+
+    def close(self):
+        pass
+
+
+def epoch_millis(timestamp):
+    """Epoch milliseconds of a datetime; naive ones (datetime.utcnow()) are UTC, not local time"""
+    return calendar.timegm(timestamp.utctimetuple()) * 1000 + timestamp.microsecond // 1000
+
+
+def _chunks(values):
+    return [values[i:i + EMF_MAX_VALUES] for i in range(0, len(values), EMF_MAX_VALUES)]
+
+
+def emf_values(datum):
+    """Turn a datum's value fields into EMF values, one per document (a scalar or a list of <= 100 values).
+
+    A metric takes at most 100 values per document, so larger sample counts
+    are split across documents for the same timestamp; CloudWatch aggregates
+    them back into one SampleCount/Sum/Min/Max.
+    """
+    if 'Value' in datum:
+        return [datum['Value']]
+    if 'Values' in datum:
+        values = []
+        for value, count in zip(datum['Values'], datum.get('Counts') or [1] * len(datum['Values'])):
+            values.extend([value] * int(count))
+        return _chunks(values)
+
+    # EMF has no statistic sets: emit min, max and filler values chosen so that
+    # SampleCount/Sum/Min/Max come out exact
+    stats = datum['StatisticValues']
+    n = int(stats['SampleCount'])
+    if n == 1:
+        return [stats['Sum']]
+    low, high = stats['Minimum'], stats['Maximum']
+    values = [low, high]
+    if n > 2:
+        # Lies in [min, max] for any real sample set; clamped against float noise
+        filler = min(max((stats['Sum'] - low - high) / (n - 2), low), high)
+        values += [filler] * (n - 2)
+    return _chunks(values)
+
+
+def emf_documents(datums, namespace='CWAgent'):
+    """Group datums by dimension set into EMF documents of at most 100 metrics each"""
+    groups = {}
+    for datum in datums:
+        dims = tuple((d['Name'], d['Value']) for d in datum.get('Dimensions', []))
+        groups.setdefault(dims, []).append(datum)
+
+    documents = []
+    for dims, group in groups.items():
+        doc = None
+        for datum in group:
+            name = datum['MetricName']
+            for value in emf_values(datum):
+                if doc is None or len(doc['_aws']['CloudWatchMetrics'][0]['Metrics']) >= EMF_MAX_METRICS or name in doc:
+                    timestamp = datum.get('Timestamp') or datetime.utcnow()
+                    doc = {
+                        '_aws': {
+                            'Timestamp': epoch_millis(timestamp) if isinstance(timestamp, datetime) else timestamp,
+                            'CloudWatchMetrics': [{
+                                'Namespace': namespace,
+                                'Dimensions': [[k for k, _ in dims]],
+                                'Metrics': []
+                            }]
+                        }
+                    }
+                    doc.update(dims)
+                    documents.append(doc)
+                doc['_aws']['CloudWatchMetrics'][0]['Metrics'].append({'Name': name, 'Unit': datum.get('Unit', 'None')})
+                doc[name] = value
+    return documents
+
+
+class EmfSink:
+    """Writes batched EMF JSON lines to a file, or the agent's TCP/UDP listener"""
+
+    def __init__(self, endpoint=EMF_ENDPOINT, namespace='CWAgent', timeout=5):
+        self.endpoint = endpoint
+        self.namespace = namespace
+        self.timeout = timeout
+        self.scheme, _, self.address = endpoint.partition('://')
+        if not self.address:
+            self.scheme, self.address = 'file', endpoint
+        if self.scheme not in ('file', 'tcp', 'udp'):
+            raise ValueError(f"unsupported EMF endpoint {endpoint!r}")
+        self._sock = None
+        self._lock = threading.Lock()
+        self.on_write = None  # called with the bytes of every write (Instrumentation.instrument_sink)
+
+    def _host_port(self):
+        host, _, port = self.address.rpartition(':')
+        return host, int(port)
+
+    def _connect(self):
+        if self.scheme == 'tcp':
+            return socket.create_connection(self._host_port(), timeout=self.timeout)
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.connect(self._host_port())
+        return sock
+
+    def send(self, datums):
+        """Write every datum as EMF; returns the number of documents written"""
+        lines = [json.dumps(doc, separators=(',', ':'), default=str) + '\n'
+                 for doc in emf_documents(datums, self.namespace)]
+        if not lines:
+            return 0
+        payload = ''.join(lines).encode()
+        with self._lock:
+            if self.scheme == 'file':
+                with open(self.address, 'ab') as f:
+                    f.write(payload)
+            elif self.scheme == 'udp':
+                if self._sock is None:
+                    self._sock = self._connect()
+                for line in lines:  # one document per datagram
+                    self._sock.send(line.encode())
+            else:
+                for attempt in (1, 2):
+                    try:
+                        if self._sock is None:
+                            self._sock = self._connect()
+                        self._sock.sendall(payload)
+                        break
+                    except OSError:
+                        self.close()
+                        if attempt == 2:
+                            raise
+        if self.on_write:
+            self.on_write(len(payload))
+        return len(lines)
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+
+def make_sink(kind, cw=None, namespace='CWAgent'):
+    """Build the sink named by METRIC_SINK ('putmetricdata' or 'emf')"""
+    if kind == 'emf':
+        return EmfSink(EMF_ENDPOINT, namespace)
+    if kind == 'putmetricdata':
+        return PutMetricDataSink(cw, namespace)
+    raise ValueError(f"unknown metric sink {kind!r}")
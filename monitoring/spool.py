@@ -0,0 +1,258 @@
+"""Durable on-disk spool for metric batches that could not be sent.
+
+Failed batches are appended to size-capped, append-only segment files
+(JSON lines). When the spool exceeds its cap the oldest segment is evicted.
+A background drainer replays spooled batches oldest-first through the real
+sink, with an AIMD rate limit that backs off when CloudWatch throttles, and
+drops datums that have aged out of CloudWatch's accepted timestamp window.
+Batches CloudWatch rejects outright (a non-throttle 4xx such as
+InvalidParameterValue) will never succeed, so they are moved to a capped
+quarantine file instead of blocking every batch queued behind them.
+"""
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+# CloudWatch rejects datums more than two weeks old; keep a safety margin
+MAX_DATUM_AGE = timedelta(days=14) - timedelta(hours=1)
+THROTTLE_CODES = ('Throttling', 'ThrottlingException', 'RequestLimitExceeded', 'TooManyRequestsException')
+
+
+def _encode(obj):
+    if isinstance(obj, datetime):
+        return {'__dt__': obj.isoformat()}
+    raise TypeError(f"cannot spool {type(obj).__name__}")
+
+
+def _decode(obj):
+    if '__dt__' in obj:
+        return datetime.fromisoformat(obj['__dt__'])
+    return obj
+
+
+def is_throttle(error):
+    """True for botocore ClientErrors that mean 'slow down'"""
+    response = getattr(error, 'response', None) or {}
+    return response.get('Error', {}).get('Code') in THROTTLE_CODES
+
+
+def is_rejected(error):
+    """True for client errors that retrying can't fix (4xx other than throttling)"""
+    response = getattr(error, 'response', None) or {}
+    status = response.get('ResponseMetadata', {}).get('HTTPStatusCode') or 0
+    return 400 <= status < 500 and not is_throttle(error)
+
+
+class MetricSpool:
+    """Append-only segment files with a total size cap and oldest-first eviction"""
+
+    def __init__(self, directory, max_bytes=64 * 1024 * 1024, segment_bytes=1024 * 1024, fsync=False):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self.evicted_batches = 0
+        self.quarantined_batches = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._cursor_path = os.path.join(directory, 'cursor')
+        self._quarantine_path = os.path.join(directory, 'quarantine.jsonl')
+        self._cursor = self._load_cursor()
+        segments = self._segments()
+        self._next_seq = int(segments[-1].split('.')[0]) + 1 if segments else 1
+
+    def _segments(self):
+        return sorted(name for name in os.listdir(self.directory) if name.endswith('.seg'))
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _load_cursor(self):
+        try:
+            with open(self._cursor_path) as f:
+                segment, offset = f.read().split()
+                return segment, int(offset)
+        except (OSError, ValueError):
+            return None, 0
+
+    def _save_cursor(self, segment, offset):
+        tmp = self._cursor_path + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(f"{segment} {offset}")
+        os.replace(tmp, self._cursor_path)
+        self._cursor = (segment, offset)
+
+    def size(self):
+        return sum(os.path.getsize(self._path(name)) for name in self._segments())
+
+    def __bool__(self):
+        return bool(self._segments())
+
+    def append(self, datums, namespace='CWAgent'):
+        """Durably append one batch"""
+        line = json.dumps({'ns': namespace, 'datums': datums}, default=_encode, separators=(',', ':')) + '\n'
+        with self._lock:
+            segments = self._segments()
+            if not segments or os.path.getsize(self._path(segments[-1])) >= self.segment_bytes:
+                segments.append(f"{self._next_seq:012d}.seg")
+                self._next_seq += 1
+            with open(self._path(segments[-1]), 'a') as f:
+                f.write(line)
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            self._evict(segments)
+
+    def quarantine(self, datums, namespace='CWAgent', reason=''):
+        """Set aside a batch CloudWatch rejected; keeps the newest segment_bytes or so of them"""
+        line = json.dumps({'ns': namespace, 'reason': reason, 'datums': datums},
+                          default=_encode, separators=(',', ':')) + '\n'
+        with self._lock:
+            if os.path.exists(self._quarantine_path) and os.path.getsize(self._quarantine_path) >= self.segment_bytes:
+                os.replace(self._quarantine_path, self._quarantine_path + '.1')
+            with open(self._quarantine_path, 'a') as f:
+                f.write(line)
+            self.quarantined_batches += 1
+
+    def _evict(self, segments):
+        total = sum(os.path.getsize(self._path(name)) for name in segments)
+        while total > self.max_bytes and len(segments) > 1:
+            oldest = segments.pop(0)
+            path = self._path(oldest)
+            with open(path) as f:
+                self.evicted_batches += sum(1 for _ in f)
+            total -= os.path.getsize(path)
+            os.unlink(path)
+            print(f"🗑️ Metric spool over {self.max_bytes} bytes - evicted {oldest}")
+
+    def peek(self):
+        """Return (segment, end_offset, namespace, datums) for the oldest unsent batch, or None"""
+        with self._lock:
+            for name in self._segments():
+                offset = self._cursor[1] if self._cursor[0] == name else 0
+                with open(self._path(name)) as f:
+                    f.seek(offset)
+                    while True:
+                        line = f.readline()
+                        if not line:
+                            break
+                        if not line.endswith('\n'):
+                            break  # batch still being written
+                        try:
+                            record = json.loads(line, object_hook=_decode)
+                        except ValueError:
+                            offset = f.tell()
+                            continue  # torn write from a crash
+                        return name, f.tell(), record['ns'], record['datums']
+                if name != self._segments()[-1]:
+                    # Fully drained sealed segment
+                    os.unlink(self._path(name))
+            return None
+
+    def commit(self, segment, offset):
+        """Mark everything up to offset in segment as sent"""
+        with self._lock:
+            segments = self._segments()
+            if segments and segment == segments[-1] and offset >= os.path.getsize(self._path(segment)):
+                # Drained the active segment: drop it so the next append starts fresh
+                os.unlink(self._path(segment))
+                self._save_cursor('-', 0)
+            else:
+                self._save_cursor(segment, offset)
+
+
+class SpoolingSink:
+    """Wraps a sink; batches that fail to send (or arrive during a backlog) go to the spool"""
+
+    def __init__(self, sink, spool):
+        self.sink = sink
+        self.spool = spool
+
+    def send(self, datums):
+        if self.spool:
+            # Keep ordering: don't jump ahead of batches already waiting for replay
+            self.spool.append(datums)
+            print(f"💾 Spooled {len(datums)} datums behind an existing backlog")
+            return 0
+        try:
+            return self.sink.send(datums)
+        except Exception as e:
+            if is_rejected(e):
+                self.spool.quarantine(datums, reason=str(e))
+                print(f"☣️ CloudWatch rejected {len(datums)} datums ({e}) - quarantined, not retrying")
+                return 0
+            self.spool.append(datums)
+            print(f"💾 Send failed ({e}) - spooled {len(datums)} datums for replay")
+            return 0
+
+    def close(self):
+        self.sink.close()
+
+
+class SpoolDrainer(threading.Thread):
+    """Replays spooled batches with an AIMD rate limit (batches per second)
+
+    on_sent, if given, is called with the datums of every batch replayed successfully.
+    """
+
+    def __init__(self, spool, sink, rate=2.0, min_rate=0.1, max_rate=20.0, idle_interval=5.0, on_sent=None):
+        super().__init__(name='spool-drainer', daemon=True)
+        self.spool = spool
+        self.sink = sink
+        self.on_sent = on_sent
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.idle_interval = idle_interval
+        self.replayed = 0
+        self.expired = 0
+        self.rejected = 0
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def drain_once(self):
+        """Replay one batch; returns False when the spool is empty"""
+        entry = self.spool.peek()
+        if entry is None:
+            return False
+        segment, offset, namespace, datums = entry
+
+        cutoff = datetime.utcnow() - MAX_DATUM_AGE
+        fresh = [d for d in datums if not isinstance(d.get('Timestamp'), datetime) or d['Timestamp'] >= cutoff]
+        self.expired += len(datums) - len(fresh)
+
+        if fresh:
+            try:
+                self.sink.send(fresh)
+            except Exception as e:
+                if is_rejected(e):
+                    # Poison batch: retrying can't help, so move it aside and carry on
+                    self.spool.quarantine(fresh, namespace, reason=str(e))
+                    self.spool.commit(segment, offset)
+                    self.rejected += len(fresh)
+                    print(f"☣️ Spool replay rejected ({e}) - quarantined {len(fresh)} datums and moved past them")
+                    return True
+                if is_throttle(e):
+                    self.rate = max(self.rate / 2, self.min_rate)
+                    print(f"🐢 Spool replay throttled - slowing to {self.rate:.2f} batches/s")
+                else:
+                    self.rate = self.min_rate
+                    print(f"❌ Spool replay failed: {e}")
+                raise
+            self.replayed += len(fresh)
+            self.rate = min(self.rate + 0.5, self.max_rate)
+        self.spool.commit(segment, offset)
+        if fresh and self.on_sent:
+            self.on_sent(fresh)
+        return True
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                more = self.drain_once()
+            except Exception:
+                more = True
+            self._stop_event.wait(1.0 / self.rate if more else self.idle_interval)
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""Dashboard query optimizer for the Kafka CloudWatch dashboard.
+
+Every SEARCH() in a dashboard is a separate metric search on every refresh,
+per viewer. This tool parses dashboards/current_dashboard.json offline and:
+- reports identical SEARCH queries (same namespace, schema, filters, stat and
+  period in any order) and overlapping ones (same metric and filters with a
+  different stat or schema, or free-text searches covering a schema search)
+- rewrites a SEARCH pinned to one InstanceId into explicit hidden metric
+  queries plus metric math when the metric catalog (monitoring/catalog.py)
+  knows every series it can match; a SEARCH without an InstanceId filter
+  (the "across cluster" widgets) matches whatever instances publish, which
+  no explicit list can promise, so it stays a SEARCH
+- hoists SEARCHes repeated inside one widget into one shared expression
+- reports estimated queries per refresh before and after
+- writes the optimized dashboard body and regenerates the CloudFormation
+  template (dashboards/kafka-dashboard-template.json) from it
+
+    python3 scripts/dashboard_optimizer.py                 # report only
+    python3 scripts/dashboard_optimizer.py --write         # also write both outputs
+"""
+import argparse
+import copy
+import json
+import os
+import re
+import sys
+from collections import Counter, defaultdict
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(REPO_DIR, 'monitoring'))
+
+from catalog import known_series  # noqa: E402
+
+SOURCE = os.path.join(REPO_DIR, 'dashboards', 'current_dashboard.json')
+OUTPUT = os.path.join(REPO_DIR, 'dashboards', 'optimized_dashboard.json')
+TEMPLATE = os.path.join(REPO_DIR, 'dashboards', 'kafka-dashboard-template.json')
+
+SEARCH_CALL = re.compile(r"""SEARCH\(\s*(['"])(.*?)\1\s*,\s*(['"])(\w+)\3\s*,\s*(\d+)\s*\)""")
+SCHEMA = re.compile(r'^\{([^}]*)\}\s*(.*)$')
+TERM = re.compile(r'([\w.-]+)=(?:"([^"]*)"|(\S+))')
+
+
+class Search:
+    """One parsed SEARCH() call"""
+
+    def __init__(self, text, stat, period):
+        self.text = text
+        self.stat = stat
+        self.period = int(period)
+        schema = SCHEMA.match(text.strip())
+        if schema:
+            parts = [p.strip() for p in schema.group(1).split(',')]
+            self.namespace = parts[0]
+            self.schema = frozenset(parts[1:])
+            terms = {k: v if v is not None else bare for k, v, bare in TERM.findall(schema.group(2))}
+            self.metric = terms.pop('MetricName', None)
+            self.filters = frozenset(terms.items())
+            self.tokens = ()
+        else:
+            # Free text: "CWAgent kafka.producer.request-rate" matches any metric containing every token
+            tokens = text.split()
+            self.namespace = tokens[0] if tokens else None
+            self.schema = None
+            self.metric = tokens[1] if len(tokens) == 2 else None
+            self.filters = frozenset()
+            self.tokens = tuple(tokens[1:])
+
+    @property
+    def key(self):
+        """Identity ignoring term order and quoting"""
+        return (self.namespace, self.schema, self.metric, self.filters, self.tokens, self.stat, self.period)
+
+    @property
+    def series_key(self):
+        """What it selects, regardless of stat/period"""
+        return (self.namespace, self.metric, self.filters)
+
+    def describe(self):
+        filters = ' '.join(f'{k}={v}' for k, v in sorted(self.filters))
+        if self.schema is None:
+            return f"{self.metric or ' '.join(self.tokens)} (free text) {self.stat}/{self.period}"
+        return f"{self.metric} {{{','.join(sorted(self.schema))}}} {filters} {self.stat}/{self.period}".replace('  ', ' ')
+
+
+def parse_call(match):
+    """Search for a SEARCH_CALL match"""
+    return Search(match.group(2), match.group(4), match.group(5))
+
+
+def catalog_series(catalog, search):
+    """(instance, catalog series) a SEARCH can match, or None if the catalog can't vouch for the full set"""
+    if search.schema is None or search.metric is None or 'InstanceId' not in search.schema:
+        return None
+    filters = dict(search.filters)
+    instance_id = filters.pop('InstanceId', None)
+    if instance_id is None:
+        return None  # matches every instance that publishes it, now or later
+    matches = []
+    for metric, dims, dynamic in catalog:
+        if metric != search.metric or set(dims) | {'InstanceId'} != search.schema:
+            continue
+        if not dynamic <= set(filters):
+            return None  # e.g. every GC name or topic - only known at scrape time
+        if all(dims.get(k) == v for k, v in filters.items()):
+            matches.append((metric, dims))
+    return (instance_id, matches) if matches else None
+
+
+def iter_expressions(widget):
+    for row in widget.get('properties', {}).get('metrics', []):
+        for item in row:
+            if isinstance(item, dict) and 'expression' in item:
+                yield item
+
+
+def count_queries(dashboard, catalog):
+    """Estimated work per refresh: searches, explicit metric queries, math expressions, series fetched"""
+    counts = Counter()
+    for widget in dashboard.get('widgets', []):
+        if widget.get('type') != 'metric':
+            continue
+        for row in widget['properties'].get('metrics', []):
+            expression = next((item['expression'] for item in row
+                               if isinstance(item, dict) and 'expression' in item), None)
+            if expression is None:
+                counts['metric_queries'] += 1
+                counts['series'] += 1
+                continue
+            searches = [parse_call(m) for m in SEARCH_CALL.finditer(expression)]
+            counts['searches'] += len(searches)
+            if not searches:
+                counts['math_expressions'] += 1
+            for search in searches:
+                known = catalog_series(catalog, search)
+                # Unknown fan-out: count one series per search (a lower bound)
+                counts['series'] += len(known[1]) if known else 1
+    return counts
+
+
+def find_duplicates(dashboard):
+    """(identical, overlapping): identical SEARCH keys used more than once, and overlapping groups"""
+    by_key = defaultdict(list)
+    for n, widget in enumerate(dashboard.get('widgets', [])):
+        title = widget.get('properties', {}).get('title', f'widget {n}')
+        for item in iter_expressions(widget):
+            for m in SEARCH_CALL.finditer(item['expression']):
+                search = parse_call(m)
+                by_key[search.key].append((title, search))
+    identical = {key: uses for key, uses in by_key.items() if len(uses) > 1}
+
+    by_series = defaultdict(set)
+    by_metric = defaultdict(set)
+    for key, uses in by_key.items():
+        search = uses[0][1]
+        by_series[search.series_key].add(key)
+        if search.metric:
+            by_metric[search.metric].add(key)
+    overlapping = [keys for keys in by_series.values() if len(keys) > 1]
+    # Free-text searches on a metric also cover every schema search of that metric
+    for metric, keys in by_metric.items():
+        free = [k for k in keys if k[1] is None]
+        if free and len(keys) > len(free):
+            overlapping.append(keys)
+    return by_key, identical, overlapping
+
+
+def _new_id(used, prefix):
+    n = 1
+    while f'{prefix}{n}' in used:
+        n += 1
+    used.add(f'{prefix}{n}')
+    return f'{prefix}{n}'
+
+
+def optimize_widget(widget, catalog):
+    """Rewrite one metric widget in place; returns (searches rewritten, searches shared)"""
+    rows = widget['properties'].get('metrics', [])
+    used = {item['id'] for row in rows for item in row if isinstance(item, dict) and 'id' in item}
+    hidden = []
+    metric_ids = {}   # (metric, dims, instance, stat, period) -> id
+    shared_ids = {}   # search key -> id of a hoisted SEARCH expression
+    rewritten = shared = 0
+
+    search_uses = Counter(parse_call(m).key
+                          for item in iter_expressions(widget) for m in SEARCH_CALL.finditer(item['expression']))
+    # A SEARCH that is a whole expression already has an id the others can reference
+    owners = {}
+    for item in iter_expressions(widget):
+        bare = SEARCH_CALL.fullmatch(item['expression'].strip())
+        if bare and 'id' in item:
+            owners.setdefault(parse_call(bare).key, item)
+
+    def replace(match):
+        nonlocal rewritten, shared
+        search = parse_call(match)
+        known = catalog_series(catalog, search)
+        if known:
+            instance_id, series = known
+            ids = []
+            for metric, dims in series:
+                key = (metric, tuple(sorted(dims.items())), instance_id, search.stat, search.period)
+                if key not in metric_ids:
+                    metric_ids[key] = _new_id(used, 'cat')
+                    row = [search.namespace, metric, 'InstanceId', instance_id]
+                    for k, v in sorted(dims.items()):
+                        row += [k, v]
+                    row.append({'id': metric_ids[key], 'stat': search.stat, 'period': search.period,
+                                'visible': False})
+                    hidden.append(row)
+                ids.append(metric_ids[key])
+            rewritten += 1
+            # SEARCH only returns series with data; explicit queries may come back empty
+            before, after = match.string[:match.start()], match.string[match.end():]
+            if re.search(r'REMOVE_EMPTY\(\s*$', before) and re.match(r'\s*\)', after):
+                return f"[{', '.join(ids)}]"  # already inside REMOVE_EMPTY()
+            return f"REMOVE_EMPTY([{', '.join(ids)}])"
+        if search_uses[search.key] > 1:
+            if search.key in owners:
+                shared += 1
+                return owners[search.key]['id']
+            if search.key not in shared_ids:
+                shared_ids[search.key] = _new_id(used, 'srch')
+                hidden.append([{'expression': match.group(0), 'id': shared_ids[search.key], 'visible': False}])
+            else:
+                shared += 1
+            return shared_ids[search.key]
+        return match.group(0)
+
+    for item in iter_expressions(widget):
+        bare = SEARCH_CALL.fullmatch(item['expression'].strip())
+        if bare:
+            search = parse_call(bare)
+            if owners.get(search.key) is item and not catalog_series(catalog, search):
+                continue  # the shared SEARCH itself
+        item['expression'] = SEARCH_CALL.sub(replace, item['expression'])
+    rows.extend(hidden)
+    return rewritten, shared
+
+
+def optimize(dashboard, catalog):
+    optimized = copy.deepcopy(dashboard)
+    rewritten = shared = 0
+    for widget in optimized.get('widgets', []):
+        if widget.get('type') == 'metric':
+            r, s = optimize_widget(widget, catalog)
+            rewritten += r
+            shared += s
+    return optimized, rewritten, shared
+
+
+def build_template(optimized_body, template):
+    """CloudFormation template with the optimized body; ${InstanceId} stays a parameter"""
+    body = json.dumps(optimized_body, separators=(',', ':'))
+    # Fn::Sub treats every ${...} as a variable - keep dashboard label variables literal
+    body = re.sub(r'\$\{(?!InstanceId\})', '${!', body)
+    template = copy.deepcopy(template)
+    template['Resources']['KafkaDashboard']['Properties']['DashboardBody'] = {
+        'Fn::Sub': [body, {'InstanceId': {'Ref': 'InstanceId'}}]
+    }
+    return template
+
+
+def print_report(by_key, identical, overlapping, before, after, rewritten, shared):
+    print("🔍 DASHBOARD QUERY ANALYSIS")
+    print("===========================")
+    print(f"Distinct SEARCH queries: {len(by_key)} ({sum(len(u) for u in by_key.values())} uses)")
+    if identical:
+        print("")
+        print("🔁 Identical SEARCH queries:")
+        for key, uses in sorted(identical.items(), key=lambda kv: -len(kv[1])):
+            widgets = sorted({title for title, _ in uses})
+            print(f"   {len(uses)}x {uses[0][1].describe()}")
+            print(f"      in: {'; '.join(widgets)}")
+    if overlapping:
+        print("")
+        print("🔀 Overlapping SEARCH queries:")
+        for keys in overlapping:
+            print("   - " + ' | '.join(sorted(by_key[k][0][1].describe() for k in keys)))
+    print("")
+    print("📊 ESTIMATED QUERIES PER REFRESH (per viewer)")
+    print(f"   {'':<20} {'before':>8} {'after':>8}")
+    for name in ('searches', 'metric_queries', 'math_expressions', 'series'):
+        print(f"   {name:<20} {before[name]:>8} {after[name]:>8}")
+    print("")
+    print(f"✅ {rewritten} SEARCH calls rewritten to catalog metrics, {shared} shared within their widget")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Find duplicate SEARCH queries and rewrite them offline')
+    parser.add_argument('--source', default=SOURCE, help='dashboard body to optimize')
+    parser.add_argument('--output', default=OUTPUT, help='optimized dashboard body (with --write)')
+    parser.add_argument('--template', default=TEMPLATE, help='CloudFormation template to regenerate (with --write)')
+    parser.add_argument('--write', action='store_true', help='write the optimized body and template')
+    args = parser.parse_args()
+
+    with open(args.source) as f:
+        dashboard = json.load(f)
+    catalog = known_series()
+
+    by_key, identical, overlapping = find_duplicates(dashboard)
+    optimized, rewritten, shared = optimize(dashboard, catalog)
+    before = count_queries(dashboard, catalog)
+    after = count_queries(optimized, catalog)
+    print_report(by_key, identical, overlapping, before, after, rewritten, shared)
+
+    if args.write:
+        with open(args.output, 'w') as f:
+            json.dump(optimized, f, separators=(',', ':'))
+        print(f"📝 Wrote {args.output}")
+        with open(args.template) as f:
+            template = json.load(f)
+        with open(args.template, 'w') as f:
+            json.dump(build_template(optimized, template), f, indent=2)
+            f.write('\n')
+        print(f"📝 Regenerated {args.template}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -14,14 +14,19 @@ echo "Instance ID: $INSTANCE_ID"
 echo ""
 echo "1. Deploying Kafka cluster..."
 cd ../infrastructure/
+# Jolokia JVM agent, attached to every broker and app JVM so the watchdog can read JMX over HTTP
+JOLOKIA_VERSION=1.7.2
+mkdir -p jolokia
+[ -f jolokia/jolokia-jvm-agent.jar ] || curl -sfL -o jolokia/jolokia-jvm-agent.jar \
+  "https://repo1.maven.org/maven2/org/jolokia/jolokia-jvm/${JOLOKIA_VERSION}/jolokia-jvm-${JOLOKIA_VERSION}.jar"
 docker-compose up -d
 sleep 30
 
 # 2. Create topics
 echo ""
 echo "2. Creating monitoring topics..."
-docker exec kafka-1 /usr/bin/kafka-topics --create --bootstrap-server localhost:9092 --topic metrics-topic-1 --partitions 3 --replication-factor 3 2>/dev/null || echo "Topic exists"
-docker exec kafka-1 /usr/bin/kafka-topics --create --bootstrap-server localhost:9092 --topic dashboard-metrics-test --partitions 3 --replication-factor 3 2>/dev/null || echo "Topic exists"
+docker exec -e KAFKA_OPTS= kafka-1 /usr/bin/kafka-topics --create --bootstrap-server localhost:9092 --topic metrics-topic-1 --partitions 3 --replication-factor 3 2>/dev/null || echo "Topic exists"
+docker exec -e KAFKA_OPTS= kafka-1 /usr/bin/kafka-topics --create --bootstrap-server localhost:9092 --topic dashboard-metrics-test --partitions 3 --replication-factor 3 2>/dev/null || echo "Topic exists"
 
 # 3. Deploy CloudWatch dashboard
 echo ""
@@ -69,19 +74,21 @@ echo "7. Deploying monitoring applications..."
 cp ../monitoring/kafka-apps/* ../infrastructure/kafka-apps/
 docker exec kafka-1 bash -c 'cd /tmp && javac -cp /usr/share/java/kafka/*:/usr/share/java/cp-base-new/* *.java'
 
-# Start producers with JMX
-docker exec -d kafka-1 bash -c 'KAFKA_JMX_OPTS="-Dcom.sun.management.jmxremote -Dcom.sun.management.jmxremote.port=9104 -Dcom.sun.management.jmxremote.authenticate=false -Dcom.sun.management.jmxremote.ssl=false" java -cp /tmp:/usr/share/java/kafka/*:/usr/share/java/cp-base-new/* KafkaProducer1 > /tmp/producer1.log 2>&1'
+# Start producers with JMX (plain java ignores KAFKA_JMX_OPTS, so the flags go on the command line)
+# and a Jolokia agent on the JMX port + 1000
+docker exec -d kafka-1 bash -c 'java -Dcom.sun.management.jmxremote -Dcom.sun.management.jmxremote.port=9104 -Dcom.sun.management.jmxremote.rmi.port=9104 -Djava.rmi.server.hostname=localhost -Dcom.sun.management.jmxremote.authenticate=false -Dcom.sun.management.jmxremote.ssl=false -javaagent:/opt/jolokia/jolokia-jvm-agent.jar=host=0.0.0.0,port=10104 -cp /tmp:/usr/share/java/kafka/*:/usr/share/java/cp-base-new/* KafkaProducer1 >> /tmp/producer1.log 2>&1'
 
-docker exec -d kafka-1 bash -c 'KAFKA_JMX_OPTS="-Dcom.sun.management.jmxremote -Dcom.sun.management.jmxremote.port=9105 -Dcom.sun.management.jmxremote.authenticate=false -Dcom.sun.management.jmxremote.ssl=false" java -cp /tmp:/usr/share/java/kafka/*:/usr/share/java/cp-base-new/* KafkaProducer2 > /tmp/producer2.log 2>&1'
+docker exec -d kafka-1 bash -c 'java -Dcom.sun.management.jmxremote -Dcom.sun.management.jmxremote.port=9105 -Dcom.sun.management.jmxremote.rmi.port=9105 -Djava.rmi.server.hostname=localhost -Dcom.sun.management.jmxremote.authenticate=false -Dcom.sun.management.jmxremote.ssl=false -javaagent:/opt/jolokia/jolokia-jvm-agent.jar=host=0.0.0.0,port=10105 -cp /tmp:/usr/share/java/kafka/*:/usr/share/java/cp-base-new/* KafkaProducer2 >> /tmp/producer2.log 2>&1'
 
 # Start consumers with JMX
-docker exec -d kafka-1 bash -c 'KAFKA_JMX_OPTS="-Dcom.sun.management.jmxremote -Dcom.sun.management.jmxremote.port=9106 -Dcom.sun.management.jmxremote.authenticate=false -Dcom.sun.management.jmxremote.ssl=false" java -cp /tmp:/usr/share/java/kafka/*:/usr/share/java/cp-base-new/* KafkaConsumer1 > /tmp/consumer1.log 2>&1'
+docker exec -d kafka-1 bash -c 'java -Dcom.sun.management.jmxremote -Dcom.sun.management.jmxremote.port=9106 -Dcom.sun.management.jmxremote.rmi.port=9106 -Djava.rmi.server.hostname=localhost -Dcom.sun.management.jmxremote.authenticate=false -Dcom.sun.management.jmxremote.ssl=false -javaagent:/opt/jolokia/jolokia-jvm-agent.jar=host=0.0.0.0,port=10106 -cp /tmp:/usr/share/java/kafka/*:/usr/share/java/cp-base-new/* KafkaConsumer1 >> /tmp/consumer1.log 2>&1'
 
-docker exec -d kafka-1 bash -c 'KAFKA_JMX_OPTS="-Dcom.sun.management.jmxremote -Dcom.sun.management.jmxremote.port=9107 -Dcom.sun.management.jmxremote.authenticate=false -Dcom.sun.management.jmxremote.ssl=false" java -cp /tmp:/usr/share/java/kafka/*:/usr/share/java/cp-base-new/* KafkaConsumer2 > /tmp/consumer2.log 2>&1'
+docker exec -d kafka-1 bash -c 'java -Dcom.sun.management.jmxremote -Dcom.sun.management.jmxremote.port=9107 -Dcom.sun.management.jmxremote.rmi.port=9107 -Djava.rmi.server.hostname=localhost -Dcom.sun.management.jmxremote.authenticate=false -Dcom.sun.management.jmxremote.ssl=false -javaagent:/opt/jolokia/jolokia-jvm-agent.jar=host=0.0.0.0,port=10107 -cp /tmp:/usr/share/java/kafka/*:/usr/share/java/cp-base-new/* KafkaConsumer2 >> /tmp/consumer2.log 2>&1'
 
 # 8. Deploy watchdog system
 echo ""
 echo "8. Deploying watchdog system..."
+sudo cp ../monitoring/*.py /tmp/  # helper modules imported by the watchdog
 sudo cp ../monitoring/kafka-keepalive.py /tmp/keepalive.py
 sudo cp ../monitoring/kafka-keepalive.service /etc/systemd/system/
 sudo systemctl daemon-reload
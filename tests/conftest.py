@@ -0,0 +1,95 @@
+"""Put monitoring/ on the import path the way the watchdog sees it when deployed to /tmp; local CloudWatch stub"""
+import gzip
+import json
+import os
+import sys
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'monitoring'))
+
+
+class FakeCloudWatch:
+    """Local CloudWatch endpoint (awsJson1_0): records PutMetricData, answers GetMetricData, fails on request"""
+
+    def __init__(self):
+        self.calls = []      # (operation, decoded request)
+        self.failures = deque()  # (status, error code) answered to the next requests, in order
+        self.values = {}     # (metric, frozenset of dim items) -> latest value for GetMetricData
+        self.page_size = 500
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                if self.headers.get('Content-Encoding') == 'gzip':
+                    body = gzip.decompress(body)
+                operation = self.headers['X-Amz-Target'].rsplit('.', 1)[-1]
+                status, reply = fake.handle(operation, json.loads(body) if body else {})
+                data = json.dumps(reply).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/x-amz-json-1.0')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            daemon_threads = True
+
+        self.server = Server(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+
+    def handle(self, operation, request):
+        self.calls.append((operation, request))
+        if self.failures:
+            status, code = self.failures.popleft()
+            return status, {'__type': f'com.amazonaws.cloudwatch#{code}', 'message': f'stub {code}'}
+        if operation == 'GetMetricData':
+            return 200, self.get_metric_data(request)
+        return 200, {}
+
+    def get_metric_data(self, request):
+        queries = request['MetricDataQueries']
+        start = int(request.get('NextToken') or 0)
+        page = queries[start:start + self.page_size]
+        results = []
+        for query in page:
+            metric = query['MetricStat']['Metric']
+            dims = frozenset((d['Name'], d['Value']) for d in metric.get('Dimensions', []))
+            value = self.values.get((metric['MetricName'], dims))
+            results.append({'Id': query['Id'], 'StatusCode': 'Complete', 'Timestamps': [], 'Label': query['Id'],
+                            'Values': [] if value is None else [float(value)]})
+        reply = {'MetricDataResults': results}
+        if start + self.page_size < len(queries):
+            reply['NextToken'] = str(start + self.page_size)
+        return reply
+
+    def requests(self, operation):
+        return [request for op, request in self.calls if op == operation]
+
+    def client(self, **config):
+        """boto3 CloudWatch client against the stub (no botocore retries unless asked for)"""
+        import boto3
+        from botocore.config import Config
+        return boto3.client('cloudwatch', region_name='us-west-2', endpoint_url=self.url,
+                            aws_access_key_id='testing', aws_secret_access_key='testing',
+                            config=Config(**dict({'retries': {'total_max_attempts': 1}}, **config)))
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def cloudwatch():
+    pytest.importorskip('boto3')
+    stub = FakeCloudWatch()
+    yield stub
+    stub.close()
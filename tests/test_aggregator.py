@@ -0,0 +1,106 @@
+import json
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+from aggregator import MAX_VALUES_PER_DATUM, MetricAggregator, encoded_size, pack, publish
+from catalog import CATALOG
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+import dashboard_optimizer  # noqa: E402
+
+WHEN = datetime(2024, 3, 1, 12, 0)
+BROKER = [{'Name': 'InstanceId', 'Value': 'i-1'}, {'Name': 'ClusterName', 'Value': 'kafka-cluster'}]
+
+
+def test_statistics_flush_one_set_per_series():
+    aggregator = MetricAggregator()
+    for value in (3, 1, 8):
+        aggregator.add('kafka.partition.offline', value, 'Count', BROKER)
+    aggregator.add('kafka.request.count', 5, 'Count', BROKER)
+    assert len(aggregator) == 2
+
+    datums = {d['MetricName']: d for d in aggregator.flush(WHEN)}
+    assert datums['kafka.partition.offline'] == {
+        'MetricName': 'kafka.partition.offline', 'Unit': 'Count', 'Dimensions': BROKER, 'Timestamp': WHEN,
+        'StatisticValues': {'SampleCount': 3, 'Sum': 12.0, 'Minimum': 1.0, 'Maximum': 8.0}}
+    assert datums['kafka.request.count']['StatisticValues']['SampleCount'] == 1
+    assert len(aggregator) == 0 and aggregator.flush(WHEN) == []
+
+
+def test_templates_are_reused_and_dropped_with_their_series():
+    aggregator = MetricAggregator()
+    aggregator.add('a', 1, 'Count', BROKER)
+    aggregator.add('b', 1, 'Count', BROKER)
+    first = {d['MetricName']: d for d in aggregator.flush(WHEN)}
+    aggregator.add('a', 2, 'Count', list(BROKER))
+    (second,) = aggregator.flush(WHEN)
+
+    assert second['Dimensions'] is first['a']['Dimensions']
+    assert set(aggregator._templates) == {('a', 'Count', tuple((d['Name'], d['Value']) for d in BROKER))}
+
+
+def test_values_mode_chunks_distinct_values():
+    aggregator = MetricAggregator('values')
+    for value in range(400):
+        aggregator.add('kafka.producer.request-rate', value % 320, 'Count/Second', BROKER)
+    datums = aggregator.flush(WHEN)
+
+    assert [len(d['Values']) for d in datums] == [MAX_VALUES_PER_DATUM, MAX_VALUES_PER_DATUM, 20]
+    assert all(len(d['Values']) == len(d['Counts']) for d in datums)
+    assert sum(c for d in datums for c in d['Counts']) == 400
+    values = [v for d in datums for v in d['Values']]
+    assert values == sorted(set(values))
+    with pytest.raises(ValueError):
+        MetricAggregator('histogram')
+
+
+def test_pack_respects_datum_and_byte_limits():
+    datums = [{'MetricName': f'm{n}', 'Value': float(n), 'Dimensions': BROKER} for n in range(2500)]
+    assert [len(b) for b in pack(datums)] == [1000, 1000, 500]
+
+    size = encoded_size(datums[0])
+    batches = list(pack(datums[:10], max_bytes=size * 4))
+    assert [len(b) for b in batches] == [4, 4, 2]
+    assert [d for b in batches for d in b] == datums[:10]
+
+
+def test_publish_packs_into_put_metric_data_calls(cloudwatch):
+    aggregator = MetricAggregator()
+    for n in range(1500):
+        aggregator.add(f'kafka.test.m{n}', n, 'Count', BROKER)
+    assert publish(cloudwatch.client(), aggregator.flush(WHEN), 'CWAgent') == 2
+
+    requests = cloudwatch.requests('PutMetricData')
+    assert [len(r['MetricData']) for r in requests] == [1000, 500]
+    assert requests[0]['Namespace'] == 'CWAgent'
+    assert requests[0]['MetricData'][0]['StatisticValues'] == {
+        'SampleCount': 1.0, 'Sum': 0.0, 'Minimum': 0.0, 'Maximum': 0.0}
+
+
+def test_counter_deltas_sum_to_the_interval_increase():
+    # Twelve 5s samples of a cumulative counter, published as deltas like JolokiaCollector does
+    readings = [1000, 1004, 1010, 1010, 1023, 1030, 1031, 1040, 1052, 1060, 1061, 1070, 1080]
+    aggregator = MetricAggregator()
+    for previous, value in zip(readings, readings[1:]):
+        aggregator.add('kafka.request.count', value - previous, 'Count', BROKER)
+    (datum,) = aggregator.flush(WHEN)
+
+    assert datum['StatisticValues']['Sum'] == readings[-1] - readings[0]
+
+
+def test_dashboards_read_counters_with_sum():
+    counters = {spec.metric for spec in CATALOG if spec.counter}
+    with open(dashboard_optimizer.SOURCE) as f:
+        dashboard = json.load(f)
+    stats = set()
+    for widget in dashboard['widgets']:
+        for item in dashboard_optimizer.iter_expressions(widget):
+            for match in dashboard_optimizer.SEARCH_CALL.finditer(item['expression']):
+                search = dashboard_optimizer.parse_call(match)
+                if search.metric in counters:
+                    stats.add((search.metric, search.stat))
+    assert {metric for metric, _ in stats} == counters
+    assert {stat for _, stat in stats} == {'Sum'}
@@ -0,0 +1,111 @@
+import pytest
+
+from anomaly import AnomalyEngine, RollingWindows, Rule
+
+OFFLINE = 'kafka.partition.offline'
+DIMS = [{'Name': 'ClusterName', 'Value': 'kafka-cluster'}]
+
+
+@pytest.mark.parametrize('per_broker', [[3, 0, 0], [0, 3, 0], [0, 0, 3]])
+def test_duplicate_samples_in_one_tick_reduce_to_max(per_broker):
+    engine = AnomalyEngine()
+    engine.observe([(OFFLINE, value, 'Count', DIMS) for value in per_broker])
+    alerts = engine.evaluate(now=0)
+
+    assert [(a.rule, a.value) for a in alerts] == [('offline partitions', 3.0)]
+
+
+def test_duplicates_fill_one_slot_per_push():
+    windows = RollingWindows(window=4)
+    key = (OFFLINE, ())
+    windows.push([key, key, (OFFLINE, ('b',)), key], [1.0, 5.0, 2.0, 4.0])
+    windows.push([key], [0.0])
+
+    assert windows.filled[windows.rows[key]] == 2
+    assert list(windows.data[windows.rows[key], :2]) == [5.0, 0.0]
+    assert windows.data[windows.rows[(OFFLINE, ('b',))], 0] == 2.0
+
+
+def feed(engine, metric, values, dims=DIMS):
+    for value in values:
+        engine.observe([(metric, value, 'Count', dims)])
+
+
+def test_zscore_of_the_latest_sample_against_the_rest():
+    windows = RollingWindows(window=30)
+    key = ('kafka.request.time.avg', ())
+    for value in [10.0, 12.0] * 12 + [20.0]:
+        windows.push([key], [value])
+    stats = windows.stats()
+
+    assert stats['std'][0] == pytest.approx(1.0)
+    assert stats['zscore'][0] == pytest.approx(9.0)
+    assert stats['mean'][0] == pytest.approx((11.0 * 24 + 20.0) / 25)
+
+
+def test_zscore_is_exact_for_large_steady_values():
+    # A cumulative byte counter around 1e12: E[x²] - E[x]² loses every digit of a variance of 0.25
+    windows = RollingWindows(window=120)
+    key = ('kafka.log.size', ())
+    for value in [1e12, 1e12 + 1] * 50 + [1e12 + 3]:
+        windows.push([key], [value])
+    stats = windows.stats()
+
+    assert stats['std'][0] == pytest.approx(0.5)
+    assert stats['zscore'][0] == pytest.approx(5.0)
+
+
+def test_slope_survives_the_ring_buffer_wrapping():
+    windows = RollingWindows(window=8)
+    key = ('kafka.consumer.records-lag-max', ())
+    for n in range(21):
+        windows.push([key], [100.0 + 60 * n])
+
+    assert windows.stats()['slope'][0] == pytest.approx(60)
+
+
+def test_rules_fire_on_known_windows():
+    engine = AnomalyEngine()
+    feed(engine, 'kafka.consumer.records-lag-max', [60.0 * n for n in range(12)])
+    feed(engine, 'kafka.request.time.avg', [5.0, 6.0] * 12 + [30.0])
+    feed(engine, OFFLINE, [0.0])
+
+    alerts = {a.rule: a for a in engine.evaluate(now=0)}
+    assert set(alerts) == {'consumer lag growing', 'produce latency spike'}
+    assert alerts['consumer lag growing'].value == 660.0
+    assert 'slope=60.00/sample' in alerts['consumer lag growing'].detail
+    assert 'z=49.0' in alerts['produce latency spike'].detail
+
+
+def test_rules_wait_for_min_samples():
+    engine = AnomalyEngine()
+    feed(engine, 'kafka.consumer.records-lag-max', [60.0 * n for n in range(11)])
+    feed(engine, 'kafka.request.time.avg', [5.0, 6.0] * 11 + [30.0])
+
+    assert engine.evaluate(now=0) == []
+
+
+def test_threshold_ops():
+    rules = [Rule('broker count low', 'kafka.broker.count', 'threshold', '<', 3, 1),
+             Rule('producer errors', 'kafka.producer.record-error-rate', 'threshold', '>', 1, 1)]
+    engine = AnomalyEngine(rules=rules)
+    feed(engine, 'kafka.broker.count', [3.0])
+    feed(engine, 'kafka.producer.record-error-rate', [1.0])
+    assert engine.evaluate(now=0) == []
+
+    feed(engine, 'kafka.broker.count', [2.0])
+    feed(engine, 'kafka.producer.record-error-rate', [1.5])
+    assert sorted((a.rule, a.value) for a in engine.evaluate(now=0)) == [
+        ('broker count low', 2.0), ('producer errors', 1.5)]
+
+
+def test_alerts_cool_down_per_rule_and_series():
+    engine = AnomalyEngine(cooldown=900)
+    other = [{'Name': 'ClusterName', 'Value': 'other'}]
+    feed(engine, OFFLINE, [1.0])
+
+    assert len(engine.evaluate(now=1000)) == 1
+    assert engine.evaluate(now=1899) == []
+    feed(engine, OFFLINE, [1.0], dims=other)  # a different series is not held back
+    assert [a.dimensions for a in engine.evaluate(now=1899)] == [(('ClusterName', 'other'),)]
+    assert [a.dimensions for a in engine.evaluate(now=1900)] == [(('ClusterName', 'kafka-cluster'),)]
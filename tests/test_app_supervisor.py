@@ -0,0 +1,154 @@
+import itertools
+
+import pytest
+
+import app_supervisor
+from app_supervisor import AppSpec, AppSupervisor
+
+APP = AppSpec('Producer', 'Producer', 9104, '/tmp/producer.log')
+
+
+class FakeDocker:
+    """docker top / exec_detached over a table of running apps; launches only start an app if told to"""
+
+    def __init__(self):
+        self.running = {}  # main class -> pid
+        self.top_calls = 0
+        self.launches = []
+        self.launch_starts_app = False
+        self._pids = itertools.count(100)
+
+    def top(self, container):
+        self.top_calls += 1
+        procs = [{'PID': '1', 'COMMAND': '/etc/confluent/docker/run'}]
+        for main_class, pid in self.running.items():
+            procs.append({'PID': str(pid - 1), 'COMMAND': f'bash -c java -cp /tmp {main_class} >> /tmp/x.log 2>&1'})
+            procs.append({'PID': str(pid), 'COMMAND': f'/usr/bin/java -Dx=y -cp /tmp {main_class}'})
+        return procs
+
+    def exec_detached(self, container, cmd):
+        self.launches.append(cmd)
+        if self.launch_starts_app:
+            self.running[cmd[-1].split(' >> ')[0].split()[-1]] = next(self._pids) * 2
+
+    def crash(self, main_class):
+        del self.running[main_class]
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def docker(monkeypatch):
+    docker = FakeDocker()
+    monkeypatch.setattr(app_supervisor, 'pid_alive', lambda pid, main_class: docker.running.get(main_class) == pid)
+    return docker
+
+
+def supervisor(docker, clock, **kwargs):
+    options = dict(backoff_base=5, backoff_max=40, stable_after=120, launch_grace=30, crash_loop_restarts=100)
+    options.update(kwargs)
+    return AppSupervisor(docker, [APP], clock=clock, **options)
+
+
+def run(sup, clock, until, step=1):
+    """Check once per step until the clock reaches until; returns the times of each restart"""
+    restarts = []
+    while clock.now < until:
+        if sup.check():
+            restarts.append(clock.now)
+        clock.now += step
+    return restarts
+
+
+def test_discovers_the_java_pid_and_skips_the_shell_wrapper(docker):
+    clock = Clock()
+    docker.running[APP.main_class] = 4242
+    sup = supervisor(docker, clock)
+
+    assert sup.check() == []
+    assert sup.states[APP.name].pid == 4242
+    assert docker.top_calls == 1
+    # Known and alive: no process listing at all
+    clock.now += 10
+    assert sup.check() == []
+    assert docker.top_calls == 1
+    assert docker.launches == []
+
+
+def test_launch_command_appends_and_enables_jmx_and_jolokia():
+    cmd = app_supervisor.launch_command(APP)
+    assert cmd.endswith(f'{APP.main_class} >> {APP.log_path} 2>&1')
+    assert '-Dcom.sun.management.jmxremote.port=9104' in cmd
+    assert '-Dcom.sun.management.jmxremote.rmi.port=9104' in cmd
+    assert 'port=10104' in cmd
+
+
+def test_backoff_doubles_up_to_the_cap(docker):
+    clock = Clock()
+    sup = supervisor(docker, clock, launch_grace=1)
+    restarts = run(sup, clock, until=clock.now + 200)
+
+    gaps = [b - a for a, b in zip(restarts, restarts[1:])]
+    assert gaps == [5, 10, 20, 40, 40, 40, 40]
+    assert len(docker.launches) == len(restarts)
+    assert docker.launches[0] == ['bash', '-c', app_supervisor.launch_command(APP)]
+
+
+def test_launched_app_gets_its_grace_period(docker):
+    clock = Clock()
+    sup = supervisor(docker, clock, backoff_base=1)
+    assert sup.check() == [APP.name]
+    launched = clock.now
+
+    # The JVM takes 20s to show up in `docker top`: no second launch in the meantime
+    assert run(sup, clock, until=launched + 20) == []
+    docker.running[APP.main_class] = 777
+    assert run(sup, clock, until=launched + 60) == []
+    state = sup.states[APP.name]
+    assert (state.pid, state.started_at) == (777, launched)
+    assert len(docker.launches) == 1
+
+
+def test_crash_loop_opens_the_breaker_until_the_cooldown(docker):
+    clock = Clock()
+    sup = supervisor(docker, clock, backoff_base=1, launch_grace=0, crash_loop_restarts=3, crash_loop_window=900,
+                     crash_loop_cooldown=1800)
+    start = clock.now
+    restarts = run(sup, clock, until=start + 1000)
+
+    assert restarts == [start, start + 1, start + 3]  # backoff 1s, 2s, then the breaker opens at +7
+    assert sup.stats()[APP.name]['circuit_open']
+    assert sup.states[APP.name].circuit_open_until == start + 7 + 1800
+
+    restarts = run(sup, clock, until=start + 7 + 1800 + 1)
+    assert restarts == [start + 7 + 1800]
+    assert not sup.stats()[APP.name]['circuit_open']
+
+
+def test_stable_app_resets_the_backoff(docker):
+    clock = Clock()
+    sup = supervisor(docker, clock, launch_grace=1)
+    docker.launch_starts_app = True
+    state = sup.states[APP.name]
+
+    for _ in range(3):  # three quick crashes: backoff grows to 20s
+        run(sup, clock, until=clock.now + 45)
+        docker.crash(APP.main_class)
+    assert state.consecutive_failures == 3
+
+    run(sup, clock, until=clock.now + 45)
+    assert state.pid is not None
+    run(sup, clock, until=clock.now + 120)  # up for stable_after
+    assert state.consecutive_failures == 0
+    assert sup.stats()[APP.name]['uptime'] >= 120
+
+    docker.crash(APP.main_class)
+    restarted_at = clock.now
+    run(sup, clock, until=clock.now + 1)
+    assert state.next_attempt == restarted_at + 5  # back to backoff_base
@@ -0,0 +1,49 @@
+import threading
+
+from catalog import OTHER, CompiledCatalog, lag_catalog
+from consumer_lag import LagEngine, PartitionOffsets
+
+
+def test_lag_series_beyond_the_cap_roll_into_other():
+    engine = LagEngine(catalog=CompiledCatalog('i-1', lag_catalog('kafka-cluster'), max_series=3))
+    engine.update([PartitionOffsets(f'group-{n}', 'orders', 0, 0, 10 * (n + 1)) for n in range(5)], now=100)
+    samples = engine.samples('i-1', now=100)
+
+    sums = {dims.key: value for metric, value, _, dims in samples if metric == 'kafka.consumer.group.lag.sum'}
+    groups = [dict(key)['group'] for key in sums]
+    assert len(sums) == 4
+    assert groups.count(OTHER) == 1
+    assert sum(sums.values()) == 10 + 20 + 30 + 40 + 50  # 'other' is the sum of the groups it stands for
+    assert all(len([s for s in samples if s[0] == metric]) == 4
+               for metric in ('kafka.consumer.group.lag.max', 'kafka.consumer.group.lag.p99'))
+    assert [d['Name'] for d in samples[0][3]] == ['InstanceId', 'ClusterName', 'group', 'topic']
+    assert engine.catalog.stats()['kafka.consumer.group.lag.sum'] == (3, 2)
+
+
+def test_idle_lag_series_free_their_slot():
+    catalog = CompiledCatalog('i-1', lag_catalog(), max_series=1, idle_after=60)
+    assert catalog.dims(0, ('a', 't'), now=0)[2]['Value'] == 'a'
+    assert catalog.dims(0, ('b', 't'), now=30)[2]['Value'] == OTHER
+    # 'a' has been idle past idle_after: the next new series takes its slot
+    assert catalog.dims(0, ('c', 't'), now=100)[2]['Value'] == 'c'
+    assert catalog.dims(0, ('a', 't'), now=100)[2]['Value'] == OTHER
+    assert catalog.dims(0, ('c', 't'), now=100)[2]['Value'] == 'c'
+
+
+def test_last_seen_is_written_under_the_eviction_lock():
+    catalog = CompiledCatalog('i-1', lag_catalog(), max_series=1, idle_after=60)
+    catalog.dims(0, ('a', 't'), now=0)
+    key = (0, ('a', 't'))
+    seen = catalog._admitted['kafka.consumer.group.lag.max']
+    done = threading.Event()
+
+    with catalog._lock:
+        threading.Thread(target=lambda: (catalog.dims(0, ('a', 't'), now=200), done.set()), daemon=True).start()
+        assert not done.wait(0.2)  # the refresh waits while eviction holds the lock
+        catalog._evict_idle('kafka.consumer.group.lag.max', seen, now=100)
+        assert key not in seen
+    assert done.wait(5)
+
+    # The refresh re-resolved the evicted key instead of writing into a slot it no longer owns
+    assert seen == {key: 200}
+    assert catalog._resolved[key][1] is seen
@@ -0,0 +1,159 @@
+import math
+import os
+
+import pytest
+
+from consumer_lag import DescribeFileSource, LagEngine, PartitionOffsets, parse_describe
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'consumer-groups-describe.txt')
+
+
+@pytest.fixture
+def offsets():
+    return list(DescribeFileSource(FIXTURE).fetch())
+
+
+def test_parse_describe(offsets):
+    assert len(offsets) == 9
+    assert offsets[0] == PartitionOffsets('dashboard-java-consumer', 'dashboard-metrics-test', 0, 15230.0, 15240.0)
+    assert {o.group for o in offsets} == {'dashboard-java-consumer', 'continuous-consumer', 'idle-reporting'}
+
+    # A partition the group never committed: '-' offsets become NaN instead of breaking the parse
+    uncommitted = [o for o in offsets if o.group == 'idle-reporting' and o.partition == 1]
+    assert len(uncommitted) == 1 and math.isnan(uncommitted[0].committed)
+    assert uncommitted[0].log_end == 15102.0
+
+
+def test_parse_describe_skips_chatter_before_a_header():
+    lines = ["Consumer group 'g' has no active members.", "Error: Executing consumer group command failed"]
+    assert list(parse_describe(lines)) == []
+
+
+def test_fixture_summaries(offsets):
+    engine = LagEngine()
+    assert engine.update(offsets, now=1000) == 9
+    summaries = {(s.group, s.topic): s for s in engine.refresh(now=1000)}
+
+    dashboard = summaries[('dashboard-java-consumer', 'dashboard-metrics-test')]
+    assert (dashboard.partitions, dashboard.max_lag, dashboard.sum_lag, dashboard.p99_lag) == (3, 400, 410, 400)
+    # The uncommitted partition has no lag to report
+    idle = summaries[('idle-reporting', 'dashboard-metrics-test')]
+    assert (idle.partitions, idle.max_lag, idle.sum_lag) == (2, 240, 240)
+    # No previous tick yet: no rates, so nothing to catch up with
+    assert dashboard.lag_rate == 0 and dashboard.time_to_catch_up == math.inf
+
+
+def test_rates_are_incremental_and_ewma_blended():
+    engine = LagEngine(alpha=0.5)
+    engine.update([PartitionOffsets('g', 't', 0, 1000, 2000)], now=100)
+    engine.update([PartitionOffsets('g', 't', 0, 1200, 2100)], now=110)  # consume 20/s, produce 10/s
+    (summary,) = engine.refresh(now=110)
+    assert summary.lag_rate == pytest.approx(-10)
+    assert summary.time_to_catch_up == pytest.approx(900 / 10)
+
+    engine.update([PartitionOffsets('g', 't', 0, 1300, 2300)], now=120)  # consume 10/s, produce 20/s
+    (summary,) = engine.refresh(now=120)
+    assert engine.consume_rate[0] == pytest.approx(15)
+    assert engine.produce_rate[0] == pytest.approx(15)
+    assert summary.lag_rate == pytest.approx(0)
+    assert summary.time_to_catch_up == math.inf
+
+
+def test_offset_reset_carries_no_rate():
+    engine = LagEngine(alpha=1.0)
+    engine.update([PartitionOffsets('g', 't', 0, 1000, 2000)], now=100)
+    engine.update([PartitionOffsets('g', 't', 0, 1100, 2100)], now=110)
+    engine.update([PartitionOffsets('g', 't', 0, 0, 50)], now=120)  # topic recreated
+
+    assert engine.consume_rate[0] == pytest.approx(10)
+    assert engine.produce_rate[0] == pytest.approx(10)
+
+
+def test_only_changed_groups_are_recomputed():
+    engine = LagEngine()
+    engine.update([PartitionOffsets('a', 't', 0, 0, 10), PartitionOffsets('b', 't', 0, 0, 20)], now=100)
+    before = {s.group: s for s in engine.refresh(now=100)}
+    engine.update([PartitionOffsets('a', 't', 0, 5, 10)], now=110)
+    after = {s.group: s for s in engine.refresh(now=110)}
+
+    assert after['a'].sum_lag == 5
+    assert after['b'] is before['b']
+
+
+def test_p99_over_many_partitions():
+    engine = LagEngine()
+    engine.update([PartitionOffsets('g', 't', p, 0, p + 1) for p in range(200)], now=100)
+    (summary,) = engine.refresh(now=100)
+
+    assert summary.partitions == 200
+    assert summary.max_lag == 200
+    assert summary.p99_lag == 198  # ceil(0.99 * 200) = 198th smallest
+    assert summary.sum_lag == sum(range(1, 201))
+
+
+def test_stale_partitions_expire(offsets):
+    engine = LagEngine(stale_after=300)
+    engine.update(offsets, now=1000)
+    engine.refresh(now=1000)
+    # Only the dashboard group keeps reporting; the other groups were deleted
+    engine.update([o for o in offsets if o.group == 'dashboard-java-consumer'], now=1200)
+    assert len(engine.refresh(now=1250)) == 3
+
+    summaries = engine.refresh(now=1301)
+    assert [(s.group, s.topic) for s in summaries] == [('dashboard-java-consumer', 'dashboard-metrics-test')]
+    assert {group for _, _, _, dims in engine.samples('i-1', now=1301)
+            for group in [d['Value'] for d in dims if d['Name'] == 'group']} == {'dashboard-java-consumer'}
+
+
+def test_unchanged_offsets_are_not_recomputed():
+    engine = LagEngine(alpha=0.5)
+    engine.update([PartitionOffsets('g', 't', 0, 100, 150)], now=100)
+    engine.update([PartitionOffsets('g', 't', 0, 100, 150)], now=110)  # first rates: 0
+    (before,) = engine.refresh(now=110)
+    # Idle partition: its EWMA rates are already 0, so nothing about it changed
+    assert engine.update([PartitionOffsets('g', 't', 0, 100, 150)], now=120) == 1
+    assert engine._dirty == set()
+    (after,) = engine.refresh(now=120)
+    assert after is before
+
+
+def test_idle_partition_rates_settle_to_zero():
+    engine = LagEngine(alpha=0.5)
+    engine.update([PartitionOffsets('g', 't', 0, 0, 100)], now=0)
+    engine.update([PartitionOffsets('g', 't', 0, 100, 200)], now=10)  # 10/s each way
+    ticks = 0
+    while engine._dirty:
+        engine.refresh(now=10 + ticks * 10)
+        ticks += 1
+        engine.update([PartitionOffsets('g', 't', 0, 100, 200)], now=10 + ticks * 10)
+    (summary,) = engine.refresh(now=10 + ticks * 10)
+
+    assert ticks < 20
+    assert engine.consume_rate[0] == engine.produce_rate[0] == 0
+    assert summary.lag_rate == 0 and summary.time_to_catch_up == math.inf
+
+
+def test_expired_rows_are_reused():
+    engine = LagEngine(stale_after=30, initial_capacity=4)
+    for tick in range(100):
+        # A fresh short-lived group every tick, two partitions each, next to one long-lived group
+        engine.update([PartitionOffsets(f'batch-{tick}', 't', p, 0, 10) for p in range(2)] +
+                      [PartitionOffsets('steady', 't', 0, tick, tick + 5)], now=(tick + 1) * 10)
+        summaries = engine.refresh(now=(tick + 1) * 10)
+
+    assert len(engine.updated) <= 16
+    assert len(engine.rows) == len(engine.key_rows) * 2 - 1
+    assert len(engine.key_index) == 5  # steady + the batches not yet older than stale_after
+    assert {s.group for s in summaries} == {'steady', 'batch-96', 'batch-97', 'batch-98', 'batch-99'}
+    assert sum(key is not None for key in engine.keys) == len(engine.key_index)
+
+
+def test_source_is_drained_before_the_lock_is_taken():
+    engine = LagEngine()
+
+    def slow_source():
+        for p in range(3):
+            assert not engine._lock.locked()  # refresh()/samples() stay available while the CLI runs
+            yield PartitionOffsets('g', 't', p, 0, 10)
+
+    assert engine.update(slow_source(), now=100) == 3
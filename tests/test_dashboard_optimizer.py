@@ -0,0 +1,62 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+
+import dashboard_optimizer  # noqa: E402
+from catalog import known_series  # noqa: E402
+
+ACROSS = "SEARCH('{CWAgent,ClusterName,InstanceId} MetricName=\"kafka.partition.offline\"', 'Maximum', 300)"
+SEARCH = ACROSS.replace('MetricName=', 'InstanceId=\"i-1\" MetricName=')
+
+
+def widget(*expressions, title='Offline partitions'):
+    rows = [[{'expression': expression, 'id': f'e{n}'}] for n, expression in enumerate(expressions, 1)]
+    return {'type': 'metric', 'properties': {'title': title, 'metrics': rows}}
+
+
+def rewrite(*expressions):
+    dashboard = {'widgets': [widget(*expressions)]}
+    optimized, rewritten, shared = dashboard_optimizer.optimize(dashboard, known_series())
+    metrics = optimized['widgets'][0]['properties']['metrics']
+    return [row[0]['expression'] for row in metrics[:len(expressions)]], metrics[len(expressions):], rewritten, shared
+
+
+def test_pinned_search_becomes_explicit_queries_wrapped_once():
+    (expression,), hidden, rewritten, _ = rewrite(f'SUM({SEARCH})')
+    assert rewritten == 1
+    assert expression == 'SUM(REMOVE_EMPTY([cat1]))'
+    assert hidden == [['CWAgent', 'kafka.partition.offline', 'InstanceId', 'i-1', 'ClusterName', 'kafka-cluster',
+                       {'id': 'cat1', 'stat': 'Maximum', 'period': 300, 'visible': False}]]
+
+
+def test_search_already_inside_remove_empty_is_not_wrapped_again():
+    (expression,), _, _, _ = rewrite(f'SUM(REMOVE_EMPTY({SEARCH}))')
+    assert expression == 'SUM(REMOVE_EMPTY([cat1]))'
+    (expression,), _, _, _ = rewrite(f'SORT(REMOVE_EMPTY( {SEARCH} ), MAX, DESC, 10)')
+    assert expression == 'SORT(REMOVE_EMPTY( [cat1] ), MAX, DESC, 10)'
+
+
+def test_search_across_instances_stays_a_search_and_is_shared():
+    expressions, hidden, rewritten, shared = rewrite(f'SUM({ACROSS})', f'MAX({ACROSS})')
+    assert rewritten == 0
+    assert expressions == ['SUM(srch1)', 'MAX(srch1)']
+    assert hidden == [[{'expression': ACROSS, 'id': 'srch1', 'visible': False}]]
+    assert shared == 1
+
+
+def test_checked_in_dashboards_are_current():
+    with open(dashboard_optimizer.SOURCE) as f:
+        source = json.load(f)
+    with open(dashboard_optimizer.OUTPUT) as f:
+        written = json.load(f)
+    with open(dashboard_optimizer.TEMPLATE) as f:
+        template = json.load(f)
+    optimized, _, _ = dashboard_optimizer.optimize(source, known_series())
+    assert optimized == written
+    assert dashboard_optimizer.build_template(optimized, template) == template
+    # Nothing in the shipped dashboards is narrowed to particular instances
+    assert 'REMOVE_EMPTY(REMOVE_EMPTY(' not in json.dumps(written)
+    assert not any(len(row) > 3 and row[2] == 'InstanceId' for w in written['widgets']
+                   for row in w['properties'].get('metrics', []))
@@ -0,0 +1,166 @@
+import json
+import os
+import socketserver
+import threading
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from docker_api import API_VERSION, DockerAPIError, DockerClient
+
+
+class FakeDocker:
+    """Docker Engine API on a local unix socket; routes map (method, path) -> handler(query, body)"""
+
+    def __init__(self, path):
+        self.path = path
+        self.routes = {}
+        self.requests = []
+        self.connections = 0
+        self.drop_after_reply = False  # close the socket without telling the client, like an idle timeout
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                fake.connections += 1
+
+            def _handle(self):
+                url = urlparse(self.path)
+                assert url.path.startswith(f'/{API_VERSION}/')
+                path = url.path[len(API_VERSION) + 1:]
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length)) if length else None
+                query = {k: v[0] for k, v in parse_qs(url.query).items()}
+                fake.requests.append((self.command, path, query, body))
+                handler = fake.routes.get((self.command, path))
+                if handler is None:
+                    return self._reply(404, {'message': f'no such route {path}'})
+                result = handler(query, body)
+                if isinstance(result, list) and result and isinstance(result[0], tuple):
+                    return self._stream(result)
+                status, payload = result
+                self._reply(status, payload)
+
+            def _reply(self, status, payload):
+                data = json.dumps(payload).encode() if payload is not None else b''
+                self.send_response(status)
+                if data:
+                    self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                if fake.drop_after_reply:
+                    self.close_connection = True
+
+            def _stream(self, frames):
+                # Hijacked exec stream: 8-byte header per frame, then the daemon hangs up
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/vnd.docker.raw-stream')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                for stream, chunk in frames:
+                    self.wfile.write(bytes([stream, 0, 0, 0]) + len(chunk).to_bytes(4, 'big') + chunk)
+                self.close_connection = True
+
+            do_GET = do_POST = _handle
+
+            def log_message(self, *args):
+                pass
+
+        class Server(socketserver.ThreadingUnixStreamServer):
+            daemon_threads = True
+
+        self.server = Server(path, Handler)
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def docker(tmp_path):
+    fake = FakeDocker(os.path.join(str(tmp_path), 'docker.sock'))
+    client = DockerClient(f'unix://{fake.path}', timeout=2)
+    yield fake, client
+    client.close()
+    fake.close()
+
+
+def test_container_states(docker):
+    fake, client = docker
+    fake.routes[('GET', '/containers/json')] = lambda query, body: (200, [
+        {'Names': ['/kafka-1'], 'State': 'running', 'Status': 'Up 2 hours'},
+        {'Names': ['/kafka-2'], 'State': 'running', 'Status': 'Up 2 hours (unhealthy)'},
+        {'Names': ['/kafka-3'], 'State': 'exited', 'Status': 'Exited (137) 5 minutes ago'},
+        {'Names': ['/kafka-10'], 'State': 'running', 'Status': 'Up'},  # name filter is a substring match
+    ])
+    states = client.container_states(['kafka-1', 'kafka-2', 'kafka-3', 'zookeeper-1'])
+
+    assert states == {'kafka-1': 'running', 'kafka-2': 'unhealthy', 'kafka-3': 'exited', 'zookeeper-1': 'missing'}
+    _, _, query, _ = fake.requests[0]
+    assert query['all'] == '1'
+    assert json.loads(query['filters']) == {'name': ['kafka-1', 'kafka-2', 'kafka-3', 'zookeeper-1']}
+
+
+def test_top(docker):
+    fake, client = docker
+    fake.routes[('GET', '/containers/kafka-1/top')] = lambda query, body: (200, {
+        'Titles': ['PID', 'COMMAND'],
+        'Processes': [['1', '/bin/bash /etc/confluent/docker/run'], ['42', 'java -cp /tmp KafkaProducer1']],
+    })
+    processes = client.top('kafka-1')
+
+    assert processes == [{'PID': '1', 'COMMAND': '/bin/bash /etc/confluent/docker/run'},
+                         {'PID': '42', 'COMMAND': 'java -cp /tmp KafkaProducer1'}]
+    assert fake.requests[0][2] == {'ps_args': '-eo pid,args'}
+
+
+def test_start_and_restart(docker):
+    fake, client = docker
+    fake.routes[('POST', '/containers/kafka-1/start')] = lambda query, body: (304, None)
+    fake.routes[('POST', '/containers/kafka-2/restart')] = lambda query, body: (204, None)
+
+    assert client.start('kafka-1') is None  # already running
+    client.restart('kafka-2', timeout=7)
+    assert fake.requests[-1][:3] == ('POST', '/containers/kafka-2/restart', {'t': '7'})
+    with pytest.raises(DockerAPIError) as error:
+        client.start('kafka-9')
+    assert error.value.status == 404
+    assert 'no such route' in error.value.message
+
+
+def test_stale_pooled_connection_is_retried_once(docker):
+    fake, client = docker
+    fake.routes[('POST', '/containers/kafka-1/start')] = lambda query, body: (204, None)
+    fake.drop_after_reply = True
+    client.start('kafka-1')
+    assert fake.connections == 1
+
+    # The pooled connection is dead now; the request goes out again on a fresh one
+    client.start('kafka-1')
+    assert len(fake.requests) == 2
+    assert fake.connections == 2
+
+
+def test_exec_lines_reassembles_stdout_frames(docker):
+    fake, client = docker
+    fake.routes[('POST', '/containers/kafka-1/exec')] = lambda query, body: (201, {'Id': 'abc'})
+    fake.routes[('POST', '/exec/abc/start')] = lambda query, body: [
+        (1, b'GROUP TOPIC PARTITION\ngroup-a top'),
+        (2, b'Could not start Jolokia agent\n'),  # stderr: skipped
+        (1, b'ic-1 0\n'),
+        (1, b''),
+        (1, b'group-b topic-2 1'),  # no trailing newline
+    ]
+    lines = list(client.exec_lines('kafka-1', ['kafka-consumer-groups', '--describe'], env=['KAFKA_OPTS=']))
+
+    assert lines == ['GROUP TOPIC PARTITION', 'group-a topic-1 0', 'group-b topic-2 1']
+    _, _, _, create = fake.requests[0]
+    assert create['Cmd'] == ['kafka-consumer-groups', '--describe']
+    assert create['Env'] == ['KAFKA_OPTS=']
+    assert create['AttachStdout'] and not create['AttachStderr']
@@ -0,0 +1,127 @@
+import json
+import threading
+import time
+from collections import Counter
+
+import pytest
+
+import fleet
+import widget_verifier
+from fleet import FileLeaseStore, FleetWatchdog, HashRing, load_inventory
+
+
+@pytest.fixture
+def inventory(tmp_path):
+    clusters = [{'name': f'cluster-{n}', 'instance_id': f'i-{n:08x}', 'region': ('us-west-2', 'eu-west-1')[n % 2],
+                 'docker_host': 'unix:///nonexistent'} for n in range(40)]
+    path = tmp_path / 'inventory.json'
+    path.write_text(json.dumps({'defaults': {'sns_topic_arn': None}, 'clusters': clusters}))
+    return load_inventory(str(path))
+
+
+def test_hash_ring_spreads_keys_and_moves_few_on_join():
+    keys = [f'cluster-{n}' for n in range(1000)]
+    three = HashRing(['a', 'b', 'c'])
+    owners = {key: three.owner(key) for key in keys}
+    assert set(owners.values()) == {'a', 'b', 'c'}
+    assert min(Counter(owners.values()).values()) > 150
+
+    four = HashRing(['a', 'b', 'c', 'd'])
+    moved = [key for key in keys if four.owner(key) != owners[key]]
+    assert all(four.owner(key) == 'd' for key in moved)
+    assert len(moved) < 400
+    assert HashRing([]).owner('cluster-1') is None
+
+
+def test_leases_expire_and_release(tmp_path):
+    leases = FileLeaseStore(str(tmp_path), ttl=30)
+    leases.heartbeat('a', now=1000)
+    leases.heartbeat('b', now=1010)
+
+    assert leases.live_members(now=1020) == ['a', 'b']
+    assert leases.live_members(now=1035) == ['b']
+    leases.heartbeat('a', now=1035)
+    assert leases.live_members(now=1036) == ['a', 'b']
+    leases.release('b')
+    assert leases.live_members(now=1036) == ['a']
+
+
+def test_rebalance_partitions_clusters_and_hands_off(tmp_path, inventory):
+    leases = FileLeaseStore(str(tmp_path / 'leases'), ttl=30)
+    replicas = [FleetWatchdog(inventory, leases, member_id=f'replica-{n}', max_workers=1) for n in range(3)]
+    for replica in replicas:
+        replica.rebalance(now=1000)
+    for replica in replicas:
+        replica.rebalance(now=1001)
+
+    owned = [set(r.owned) for r in replicas]
+    assert all(owned)
+    assert set().union(*owned) == {t.name for t in inventory}
+    assert sum(len(o) for o in owned) == len(inventory)
+
+    # replica-2 stops heartbeating: its clusters move to the survivors once its lease expires
+    for replica in replicas[:2]:
+        replica.rebalance(now=1020)
+    assert [set(r.owned) for r in replicas[:2]] == owned[:2]
+    for replica in replicas[:2]:
+        replica.rebalance(now=1040)
+    assert set(replicas[0].owned) | set(replicas[1].owned) == {t.name for t in inventory}
+    assert set(replicas[0].owned) >= owned[0] and set(replicas[1].owned) >= owned[1]
+    for replica in replicas:
+        replica.close()
+
+
+def test_heartbeat_thread_renews_lease_during_a_long_tick(tmp_path, inventory):
+    leases = FileLeaseStore(str(tmp_path), ttl=0.3)
+    watchdog = FleetWatchdog(inventory, leases, member_id='slow', max_workers=1)
+    watchdog.start_heartbeat(0.05)
+    time.sleep(0.6)  # longer than the TTL, without calling rebalance()
+
+    assert leases.live_members() == ['slow']
+    watchdog.close()
+    assert leases.live_members() == []
+
+
+def test_failing_region_does_not_stop_the_others(tmp_path, inventory, monkeypatch):
+    def verify_instances(cw, instance_ids):
+        if cw == 'eu-west-1':
+            raise RuntimeError('Throttling')
+        return {i: [widget_verifier.WidgetResult('kafka.partition.offline', {}, None, False)] for i in instance_ids}
+
+    monkeypatch.setattr(fleet.widget_verifier, 'verify_instances', verify_instances)
+    watchdog = FleetWatchdog(inventory, FileLeaseStore(str(tmp_path)), member_id='only', max_workers=1,
+                             cw_factory=lambda region: region, alert_cooldown=0)
+    watchdog.rebalance()
+    failed = watchdog.tick_widgets()
+
+    assert set(failed) == {t.name for t in inventory if t.region == 'us-west-2'}
+    watchdog.close()
+
+
+def test_hung_docker_host_is_reported_not_waited_for(tmp_path, inventory, monkeypatch):
+    hung = inventory[0]._replace(check_timeout=0.2)
+    release = threading.Event()
+
+    def check_containers(target):
+        if target.name == hung.name:
+            release.wait(10)
+        return {}
+
+    watchdog = FleetWatchdog([hung, inventory[1]], FileLeaseStore(str(tmp_path)), member_id='only', max_workers=2,
+                             alert_cooldown=0)
+    monkeypatch.setattr(watchdog, 'check_containers', check_containers)
+    try:
+        watchdog.rebalance()
+        started = time.monotonic()
+        assert watchdog.tick_containers() == {hung.name: {'docker': 'no answer within 0.2s'}}
+        assert time.monotonic() - started < 2
+        # Still in flight: the next tick doesn't pile a second check onto that host
+        assert watchdog.tick_containers() == {}
+    finally:
+        release.set()
+        watchdog.close()
+
+
+def test_inventory_defaults(inventory):
+    assert inventory[0].check_timeout == 60
+    assert inventory[0].containers == fleet.docker_api.COMPOSE_CONTAINERS
@@ -0,0 +1,42 @@
+from freshness import FreshnessIndex, series_key
+
+PRODUCER = {'InstanceId': 'i-1', 'client-id': 'dashboard-java-producer'}
+EXPECTED = series_key('kafka.producer.request-rate', PRODUCER)
+
+
+def datum(metric, value=1.0, **dims):
+    return {'MetricName': metric, 'Value': value, 'Dimensions': [{'Name': k, 'Value': v} for k, v in dims.items()]}
+
+
+def test_expected_series_alert_once_per_cooldown():
+    index = FreshnessIndex(default_slo=180, cooldown=1800)
+    index.expect([EXPECTED], now=0)
+
+    assert index.alerts_due(now=100) == []
+    assert [key for key, _, _ in index.alerts_due(now=200)] == [EXPECTED]
+    assert index.alerts_due(now=300) == []
+    assert [key for key, _, _ in index.alerts_due(now=2001)] == [EXPECTED]
+
+
+def test_recovered_series_stops_alerting():
+    index = FreshnessIndex(default_slo=180)
+    index.expect([EXPECTED], now=0)
+    index.alerts_due(now=200)
+    index.record([datum('kafka.producer.request-rate', 5.0, **PRODUCER)], now=250)
+
+    assert index.alerts_due(now=300) == []
+    assert index.stale(now=500) == [(EXPECTED, 250, 5.0)]
+
+
+def test_series_that_stop_on_purpose_never_alert_and_expire():
+    index = FreshnessIndex(default_slo=60, expire_after=10)
+    index.expect([EXPECTED], now=0)
+    index.record([datum('kafka.consumer.group.time-to-catch-up', 42.0, group='deleted', topic='t'),
+                  datum('kafka.producer.request-rate', 1.0, **PRODUCER)],
+                 now=0)
+
+    assert index.stale(now=120) == [(EXPECTED, 120, 1.0)]
+    assert len(index._last_sent) == 2
+    index.stale(now=601)
+    assert list(index._last_sent) == [EXPECTED]
+    assert len(index) == 1
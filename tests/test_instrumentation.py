@@ -0,0 +1,128 @@
+import asyncio
+import json
+import subprocess
+import sys
+from datetime import datetime
+
+import pytest
+
+from instrumentation import Histogram, Instrumentation, spawned_executable
+from scheduler import Scheduler
+from sinks import EmfSink
+
+WHEN = datetime(2024, 3, 1, 12, 0)
+DATUM = {'MetricName': 'kafka.partition.offline', 'Unit': 'Count', 'Timestamp': WHEN, 'Value': 0.0,
+         'Dimensions': [{'Name': 'InstanceId', 'Value': 'i-1'}]}
+
+
+def outcomes(registry):
+    return {labels: h.count for (name, labels), h in registry.histograms.items()
+            if name == 'keepalive_check_duration_seconds'}
+
+
+def run_checks(scheduler):
+    async def run():
+        task = asyncio.ensure_future(scheduler.run_async())
+        await asyncio.sleep(0.1)
+        task.cancel()
+
+    asyncio.run(run())
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram(buckets=(1, 5))
+    for value in (0.5, 1, 3, 7):
+        histogram.observe(value)
+    assert list(histogram.cumulative()) == [(1, 2), (5, 3), (float('inf'), 4)]
+    assert (histogram.count, histogram.sum) == (4, 11.5)
+
+
+def test_timed_labels_records_with_the_running_check():
+    registry = Instrumentation()
+    with registry.timed('sample'):
+        registry.inc('keepalive_aws_calls_total', check=registry.current_check())
+    with pytest.raises(RuntimeError), registry.timed('verify'):
+        raise RuntimeError('boom')
+
+    assert registry.current_check() == 'main'
+    assert registry.counters[('keepalive_aws_calls_total', (('check', 'sample'),))] == 1
+    assert outcomes(registry) == {(('check', 'sample'), ('outcome', 'ok')): 1,
+                                  (('check', 'verify'), ('outcome', 'error')): 1}
+
+
+def test_checks_that_handle_their_own_errors_report_them():
+    registry = Instrumentation()
+    scheduler = Scheduler(instrumentation=registry)
+    scheduler.register('healthy', lambda: None, interval=60)
+    scheduler.register('handled', lambda: False, interval=60)
+    scheduler.register('raised', lambda: 1 / 0, interval=60)
+    run_checks(scheduler)
+
+    assert outcomes(registry) == {(('check', 'healthy'), ('outcome', 'ok')): 1,
+                                  (('check', 'handled'), ('outcome', 'error')): 1,
+                                  (('check', 'raised'), ('outcome', 'error')): 1}
+    assert {name: c.failures for name, c in scheduler.checks.items()} == {'healthy': 0, 'handled': 1, 'raised': 1}
+
+
+@pytest.mark.parametrize('args, expected', [
+    (('/usr/bin/docker', ['docker', 'exec'], None, None), 'docker'),
+    ((None, ['/usr/local/bin/docker-compose', 'up', '-d'], None, None), 'docker-compose'),
+    ((None, 'C:\\tools\\docker.exe exec kafka-1', None, None), 'C:\\tools\\docker.exe'),
+    ((None, b'/usr/bin/docker top kafka-1', None, None), 'docker'),
+    ((None, '', None, None), '?'),
+    ((None, [], None, None), '?'),
+])
+def test_spawned_executable(args, expected):
+    assert spawned_executable(args) == expected
+
+
+def test_audit_hook_counts_spawns_by_check():
+    registry = Instrumentation()
+    registry.install_audit_hook()
+    registry.install_audit_hook()  # once per process
+    with registry.timed('kafka'):
+        subprocess.run([sys.executable, '-c', 'pass'], check=True)
+
+    spawns = {labels: value for (name, labels), value in registry.counters.items()
+              if name == 'keepalive_subprocess_spawns_total'}
+    assert spawns == {(('check', 'kafka'), ('executable', spawned_executable((sys.executable, [])))): 1}
+
+
+def test_aws_calls_and_request_bytes_are_counted(cloudwatch):
+    registry = Instrumentation()
+    client = registry.instrument_client(cloudwatch.client())
+    with registry.timed('metrics'):
+        client.put_metric_data(Namespace='CWAgent', MetricData=[DATUM])
+
+    labels = (('check', 'metrics'), ('operation', 'PutMetricData'), ('service', 'cloudwatch'))
+    assert registry.counters[('keepalive_aws_calls_total', labels)] == 1
+    assert registry.counters[('keepalive_aws_request_bytes_total', labels)] > 0
+
+
+def test_emf_bytes_are_counted(tmp_path):
+    registry = Instrumentation()
+    path = tmp_path / 'emf.log'
+    sink = registry.instrument_sink(EmfSink(f'file://{path}'))
+    with registry.timed('metrics'):
+        sink.send([DATUM, DATUM])
+
+    assert registry.counters[('keepalive_emf_bytes_total', (('check', 'metrics'), ('endpoint', 'file')))] == \
+        path.stat().st_size
+
+
+def test_prometheus_and_json_exposition():
+    registry = Instrumentation()
+    registry.inc('keepalive_check_timeouts_total', check='verify "slow"')
+    registry.observe('keepalive_check_duration_seconds', 0.2, check='kafka', outcome='ok')
+
+    text = registry.prometheus_text()
+    assert '# TYPE keepalive_check_timeouts_total counter' in text
+    assert 'keepalive_check_timeouts_total{check="verify \\"slow\\""} 1' in text
+    assert 'keepalive_check_duration_seconds_bucket{check="kafka",outcome="ok",le="0.25"} 1' in text
+    assert 'keepalive_check_duration_seconds_bucket{check="kafka",outcome="ok",le="0.1"} 0' in text
+    assert 'keepalive_check_duration_seconds_count{check="kafka",outcome="ok"} 1' in text
+
+    snapshot = json.loads(json.dumps(registry.snapshot()))
+    (histogram,) = snapshot['histograms']
+    assert histogram['labels'] == {'check': 'kafka', 'outcome': 'ok'}
+    assert histogram['buckets']['inf'] == 1
@@ -0,0 +1,208 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import jmx_collector
+from catalog import CATALOG, CompiledCatalog
+from jmx_collector import JolokiaCollector, Target
+
+PRODUCER = 'kafka.producer:type=producer-metrics,client-id=*'
+OFFLINE = 'kafka.controller:type=KafkaController,name=OfflinePartitionsCount'
+UNDER_REPLICATED = 'kafka.server:type=ReplicaManager,name=UnderReplicatedPartitions'
+REQUESTS = 'kafka.network:type=RequestMetrics,name=RequestsPerSec,request=Produce'
+
+
+class FakeJolokia:
+    """Local Jolokia agent answering bulk reads from a {(mbean, attribute): reply} table"""
+
+    def __init__(self):
+        self.values = {}  # (mbean, attribute) -> value, or (status, error) for a failed read
+        self.posts = []
+        self.delay = 0
+        self.http_status = 200
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                reads = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                fake.posts.append(reads)
+                time.sleep(fake.delay)
+                data = json.dumps([fake.reply(r) for r in reads]).encode()
+                self.send_response(fake.http_status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            daemon_threads = True
+
+            def handle_error(self, request, client_address):
+                pass  # the collector hung up on a deliberately slow reply
+
+        self.server = Server(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/jolokia/'
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+
+    def reply(self, read):
+        value = self.values.get((read['mbean'], read['attribute']))
+        if value is None:
+            return {'status': 404, 'error_type': 'javax.management.InstanceNotFoundException'}
+        if isinstance(value, tuple):
+            return {'status': value[0], 'error': value[1]}
+        if '*' in read['mbean']:
+            # a pattern read answers {mbean: {attribute: value}} for every match
+            value = {mbean: {read['attribute']: v} for mbean, v in value.items()}
+        return {'status': 200, 'value': value}
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def agents():
+    started = []
+
+    def start():
+        agent = FakeJolokia()
+        started.append(agent)
+        return agent
+
+    yield start
+    for agent in started:
+        agent.close()
+
+
+def collector(*targets, timeout=2):
+    return JolokiaCollector('i-test', list(targets), timeout=timeout, catalog=CompiledCatalog('i-test', max_series=0))
+
+
+def by_series(samples):
+    return {(metric, tuple((d['Name'], d['Value']) for d in dims)): value for metric, value, _, dims in samples}
+
+
+def test_bulk_read_maps_mbeans_onto_catalog_metrics(agents):
+    agent = agents()
+    agent.values[(PRODUCER, 'request-rate')] = {
+        'kafka.producer:type=producer-metrics,client-id=dashboard-java-producer': 12.5,
+        'kafka.producer:type=producer-metrics,client-id=other-app': 'NaN',
+    }
+    samples = collector(Target('KafkaProducer1', 'producer', None, agent.url)).collect()
+
+    assert len(agent.posts) == 1
+    reads = {(r['mbean'], r['attribute']) for r in agent.posts[0]}
+    assert reads == {(m.mbean, m.attribute) for m in CATALOG if m.kind == 'producer'}
+    assert by_series(samples) == {
+        ('kafka.producer.request-rate', (('InstanceId', 'i-test'), ('ProducerGroupName', 'KafkaProducer'),
+                                         ('client-id', 'dashboard-java-producer'))): 12.5
+    }
+
+
+def test_proxy_mode_names_the_jmx_target(agents):
+    proxy = agents()
+    jmx_url = 'service:jmx:rmi:///jndi/rmi://127.0.0.1:9104/jmxrmi'
+    JolokiaCollector('i-test', [Target('KafkaProducer1', 'producer', jmx_url, None)], jolokia_url=proxy.url).collect()
+
+    assert proxy.posts and all(r['target'] == {'url': jmx_url} for r in proxy.posts[0])
+
+
+def test_counters_publish_deltas_and_skip_resets(agents):
+    agent = agents()
+    c = collector(Target('kafka-1', 'broker', None, agent.url))
+    deltas = []
+    for total in (100, 130, 5, 25):
+        agent.values[(REQUESTS, 'Count')] = total
+        deltas.append([v for m, v, _, _ in c.collect() if m == 'kafka.request.count'])
+    assert deltas == [[], [30], [], [20]]
+
+
+def test_brokers_reduce_to_one_sample_per_series(agents):
+    brokers = [agents() for _ in range(3)]
+    for agent, offline, urp, requests in zip(brokers, (0, 0, 3), (1, 2, 0), (10, 20, 30)):
+        agent.values[(OFFLINE, 'Value')] = offline
+        agent.values[(UNDER_REPLICATED, 'Value')] = urp
+        agent.values[(REQUESTS, 'Count')] = requests
+    c = collector(*(Target(f'kafka-{n}', 'broker', None, a.url) for n, a in enumerate(brokers, 1)))
+    c.collect()
+    for agent in brokers:
+        agent.values[(REQUESTS, 'Count')] += 5
+    samples = c.collect()
+
+    values = {}
+    for metric, value, _, _ in samples:
+        values.setdefault(metric, []).append(value)
+    assert values['kafka.partition.offline'] == [3]  # only the controller reports it: max
+    assert values['kafka.partition.under_replicated'] == [3]  # each broker its own partitions: sum
+    assert values['kafka.request.count'] == [15]  # counter deltas: sum
+
+
+def test_failed_reads_are_skipped(agents):
+    agent = agents()
+    agent.values[(OFFLINE, 'Value')] = 2
+    agent.values[(UNDER_REPLICATED, 'Value')] = (500, 'java.lang.IllegalStateException')
+    c = collector(Target('kafka-1', 'broker', None, agent.url))
+    metrics = {m for m, _, _, _ in c.collect()}
+
+    assert 'kafka.partition.offline' in metrics
+    assert 'kafka.partition.under_replicated' not in metrics
+    assert c.last_errors == {}
+
+
+def test_http_error_is_reported_per_target(agents):
+    good, bad = agents(), agents()
+    good.values[(OFFLINE, 'Value')] = 1
+    bad.http_status = 503
+    c = collector(Target('kafka-1', 'broker', None, good.url), Target('kafka-2', 'broker', None, bad.url))
+    samples = c.collect()
+
+    assert [m for m, _, _, _ in samples] == ['kafka.partition.offline']
+    assert set(c.last_errors) == {'kafka-2'}
+
+
+def test_slow_target_times_out_without_blocking_the_rest(agents):
+    fast, slow = agents(), agents()
+    fast.values[(OFFLINE, 'Value')] = 1
+    slow.values[(OFFLINE, 'Value')] = 7
+    slow.delay = 1.5
+    c = collector(Target('kafka-1', 'broker', None, fast.url), Target('kafka-2', 'broker', None, slow.url),
+                  timeout=0.5)
+    started = time.monotonic()
+    samples = c.collect()
+
+    assert time.monotonic() - started < 1.5
+    assert [v for m, v, _, _ in samples if m == 'kafka.partition.offline'] == [1]
+    assert 'kafka-2' in c.last_errors
+
+
+def test_default_targets_are_host_reachable():
+    agent_targets = jmx_collector.default_targets(jolokia_url=None)
+    assert all(t.jolokia_url.startswith('http://127.0.0.1:') for t in agent_targets)
+    assert {t.jolokia_url for t in agent_targets if t.kind == 'broker'} == {
+        f'http://127.0.0.1:{port}/jolokia/' for port in (8778, 8779, 8780)}
+    assert 'http://127.0.0.1:10104/jolokia/' in {t.jolokia_url for t in agent_targets}
+
+    proxied = jmx_collector.default_targets(jolokia_url='http://proxy/jolokia/')
+    assert all(t.jolokia_url is None and '//127.0.0.1:' in t.jmx_url for t in proxied)
+
+
+def test_pattern_reads_take_each_mbeans_attribute(agents):
+    agent = agents()
+    gc = 'java.lang:type=GarbageCollector,name=*'
+    c = collector(Target('kafka-1', 'broker', None, agent.url))
+    for young, old in ((10, 1), (14, 1)):
+        agent.values[(gc, 'CollectionCount')] = {
+            'java.lang:type=GarbageCollector,name=G1 Young Generation': young,
+            'java.lang:type=GarbageCollector,name=G1 Old Generation': old,
+        }
+        samples = c.collect()
+
+    gc_counts = {dict((d['Name'], d['Value']) for d in dims)['name']: value
+                 for metric, value, _, dims in samples if metric == 'jvm.gc.collections.count'}
+    assert gc_counts == {'G1 Young Generation': 4, 'G1 Old Generation': 0}
@@ -0,0 +1,140 @@
+import os
+
+import pytest
+
+from log_tailer import InotifyWatcher, LogTailer, PatternSet
+
+ERROR = b'2024-01-01 12:00:00 ERROR Error sending message to kafka-1\n'
+WARN = b'2024-01-01 12:00:00 WARN slow ack from kafka-2\n'
+INFO = b'2024-01-01 12:00:00 INFO sent 100 records\n'
+
+
+@pytest.fixture
+def log(tmp_path):
+    path = tmp_path / 'app.log'
+    path.write_bytes(ERROR * 3)  # history from before the tailer started
+    return str(path)
+
+
+def tailer(log, tmp_path, **kwargs):
+    return LogTailer({'App': log}, str(tmp_path / 'state' / 'offsets.json'), **kwargs)
+
+
+def append(path, data):
+    with open(path, 'ab') as f:
+        f.write(data)
+
+
+def counts(t):
+    return {category: n for (_, category), n in t.drain_counts().items() if n}
+
+
+def test_counts_only_lines_appended_after_first_sight(log, tmp_path):
+    t = tailer(log, tmp_path)
+    t.tail_all()
+    assert counts(t) == {}
+
+    append(log, INFO * 5 + ERROR + WARN + b'2024-01-01 12:00:01 ERROR half a li')
+    t.tail_all()
+    assert counts(t) == {'errors': 1, 'warnings': 1}
+
+    append(log, b'ne\n')  # the partial line is counted once it is complete
+    t.tail_all()
+    assert counts(t) == {'errors': 1}
+
+
+def test_truncated_file_is_read_from_the_start(log, tmp_path):
+    t = tailer(log, tmp_path)
+    t.tail_all()
+    with open(log, 'wb') as f:
+        f.write(WARN)
+    t.tail_all()
+    assert counts(t) == {'warnings': 1}
+
+
+def test_replaced_file_is_read_from_the_start(log, tmp_path):
+    t = tailer(log, tmp_path)
+    t.tail_all()
+    replacement = tmp_path / 'app.log.new'
+    replacement.write_bytes(INFO * 10 + ERROR * 2)  # longer than the old offset: only the inode tells
+    os.replace(replacement, log)
+    t.tail_all()
+    assert counts(t) == {'errors': 2}
+
+
+def test_rotation_keeps_copies_and_follows_an_appending_writer(log, tmp_path):
+    t = tailer(log, tmp_path, max_bytes=len(ERROR) * 5, keep=2)
+    t.tail_all()
+    append(log, ERROR * 2)
+    t.tail_all()
+    assert counts(t) == {'errors': 2}
+    assert (t.rotations, os.path.getsize(log)) == (1, 0)
+
+    append(log, WARN * 7)
+    t.tail_all()
+    assert counts(t) == {'warnings': 7}
+    assert (t.rotations, os.path.getsize(log)) == (2, 0)
+    assert open(f'{log}.1', 'rb').read() == WARN * 7
+    assert open(f'{log}.2', 'rb').read() == ERROR * 5
+
+    append(log, INFO + ERROR)
+    t.tail_all()
+    assert counts(t) == {'errors': 1}
+    assert t.no_rotate == set()
+
+
+def test_restart_resumes_from_the_checkpoint(log, tmp_path):
+    first = tailer(log, tmp_path)
+    first.tail_all()
+    append(log, ERROR)
+    first.tail_all()
+    assert counts(first) == {'errors': 1}
+
+    append(log, WARN * 2)  # written while the watchdog was down
+    second = tailer(log, tmp_path)
+    second.tail_all()
+    assert counts(second) == {'warnings': 2}
+
+
+def test_non_appending_writer_hole_is_skipped_and_rotation_stops(tmp_path):
+    log = str(tmp_path / 'app.log')
+    with open(log, 'wb', buffering=0) as writer:  # '>' instead of '>>'
+        t = tailer(log, tmp_path, max_bytes=len(ERROR) * 2)
+        t.tail_all()
+        writer.write(ERROR * 3)
+        t.tail_all()
+        assert counts(t) == {'errors': 3}
+        assert t.rotations == 1
+
+        writer.write(WARN)  # lands at the old offset, past a hole of NULs
+        assert os.path.getsize(log) == len(ERROR * 3 + WARN)
+        t.tail_all()
+        assert counts(t) == {'warnings': 1}
+        assert t.no_rotate == {log}
+
+        writer.write(ERROR * 3)
+        t.tail_all()
+        assert counts(t) == {'errors': 3}
+        assert t.rotations == 1
+
+
+def test_line_counts_for_its_highest_priority_category():
+    patterns = PatternSet()
+    data = (b'WARN retrying: Error sending message to kafka-1\n'
+            b'WARN java.io.IOException: connection reset\n'
+            b'Exception in thread "main" ERROR\n' + INFO + WARN)
+    assert patterns.count(data) == {'errors': 2, 'exceptions': 1, 'warnings': 1}
+    assert PatternSet(keywords=None).count(data) == patterns.count(data)
+
+
+def test_inotify_reports_the_modified_log(log, tmp_path):
+    try:
+        watcher = InotifyWatcher([str(tmp_path)])
+    except (OSError, AttributeError) as e:
+        pytest.skip(f'inotify unavailable: {e}')
+    try:
+        assert watcher.wait(0.05) is None
+        append(log, ERROR)
+        assert log in watcher.wait(1)
+    finally:
+        watcher.close()
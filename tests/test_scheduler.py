@@ -0,0 +1,36 @@
+import asyncio
+import threading
+
+from scheduler import Scheduler
+
+
+def test_pool_has_a_worker_per_check():
+    scheduler = Scheduler()
+    started = threading.Barrier(10, timeout=5)
+    for n in range(9):
+        scheduler.register(f'check-{n}', started.wait, interval=60, timeout=10)
+
+    async def run():
+        task = asyncio.ensure_future(scheduler.run_async())
+        # All nine checks are in their first run at once: none is queued behind another
+        await asyncio.get_running_loop().run_in_executor(None, started.wait)
+        task.cancel()
+
+    asyncio.run(run())
+    assert scheduler._executor._max_workers == 9
+    assert all(c.failures == 0 and c.timeouts == 0 for c in scheduler.checks.values())
+
+
+def test_explicit_pool_size_wins():
+    scheduler = Scheduler(max_workers=2)
+    for n in range(5):
+        scheduler.register(f'check-{n}', lambda: None, interval=60)
+
+    async def run():
+        task = asyncio.ensure_future(scheduler.run_async())
+        await asyncio.sleep(0.05)
+        task.cancel()
+
+    asyncio.run(run())
+    assert scheduler._executor._max_workers == 2
+    assert all(c.runs == 1 for c in scheduler.checks.values())
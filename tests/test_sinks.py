@@ -0,0 +1,140 @@
+import json
+import socket
+import threading
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from sinks import EmfSink, emf_documents, emf_values
+
+WHEN = datetime(2024, 3, 1, 12, 0, 0, 250000)  # naive UTC, as from datetime.utcnow()
+WHEN_MS = 1709294400250
+
+
+def datum(name, value, **dims):
+    return {'MetricName': name, 'Value': value, 'Unit': 'Count', 'Timestamp': WHEN,
+            'Dimensions': [{'Name': k, 'Value': v} for k, v in dims.items()]}
+
+
+DATUMS = [datum('kafka.partition.offline', 0.0, InstanceId='i-1', ClusterName='kafka-cluster'),
+          datum('kafka.partition.under_replicated', 2.0, InstanceId='i-1', ClusterName='kafka-cluster'),
+          datum('kafka.producer.request-rate', 5.5, InstanceId='i-1', **{'client-id': 'dashboard-java-producer'})]
+
+
+def check(documents):
+    assert len(documents) == 2
+    cluster, producer = sorted(documents, key=lambda d: 'ClusterName' not in d)
+    assert cluster['_aws']['Timestamp'] == WHEN_MS
+    assert cluster['_aws']['CloudWatchMetrics'] == [{
+        'Namespace': 'CWAgent',
+        'Dimensions': [['InstanceId', 'ClusterName']],
+        'Metrics': [{'Name': 'kafka.partition.offline', 'Unit': 'Count'},
+                    {'Name': 'kafka.partition.under_replicated', 'Unit': 'Count'}],
+    }]
+    assert (cluster['InstanceId'], cluster['ClusterName']) == ('i-1', 'kafka-cluster')
+    assert (cluster['kafka.partition.offline'], cluster['kafka.partition.under_replicated']) == (0.0, 2.0)
+    assert producer['client-id'] == 'dashboard-java-producer'
+    assert producer['kafka.producer.request-rate'] == 5.5
+
+
+@pytest.fixture
+def local_tz(monkeypatch):
+    """Run with a local timezone far from UTC, where local-time conversion would show"""
+    monkeypatch.setenv('TZ', 'America/Los_Angeles')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_naive_timestamps_are_utc(local_tz):
+    assert emf_documents([DATUMS[0]])[0]['_aws']['Timestamp'] == WHEN_MS
+    aware = dict(DATUMS[0], Timestamp=WHEN.replace(tzinfo=timezone.utc))
+    assert emf_documents([aware])[0]['_aws']['Timestamp'] == WHEN_MS
+
+
+def test_statistic_sets_keep_count_sum_min_max():
+    (values,) = emf_values({'StatisticValues': {'SampleCount': 4, 'Sum': 20.0, 'Minimum': 1.0, 'Maximum': 9.0}})
+    assert (len(values), sum(values), min(values), max(values)) == (4, 20.0, 1.0, 9.0)
+
+
+@pytest.mark.parametrize('stats', [
+    {'SampleCount': 1000, 'Sum': 1000.0, 'Minimum': 0.0, 'Maximum': 1000.0},  # mostly zeros, one spike
+    {'SampleCount': 1000, 'Sum': 9990.0, 'Minimum': 0.0, 'Maximum': 10.0},  # mostly at the maximum
+    {'SampleCount': 250, 'Sum': 1250.0, 'Minimum': 5.0, 'Maximum': 5.0},
+])
+def test_large_statistic_sets_split_across_documents(stats):
+    stat_datum = {'MetricName': 'kafka.app.log.errors', 'Unit': 'Count', 'Timestamp': WHEN, 'StatisticValues': stats,
+                  'Dimensions': [{'Name': 'InstanceId', 'Value': 'i-1'}]}
+    documents = emf_documents([stat_datum, datum('kafka.app.log.warnings', 3.0, InstanceId='i-1')])
+
+    chunks = [doc['kafka.app.log.errors'] for doc in documents if 'kafka.app.log.errors' in doc]
+    assert all(len(chunk) <= 100 for chunk in chunks)
+    values = [v for chunk in chunks for v in chunk]
+    assert len(values) == stats['SampleCount']
+    assert sum(values) == pytest.approx(stats['Sum'])
+    assert (min(values), max(values)) == (stats['Minimum'], stats['Maximum'])
+    assert all(doc['_aws']['Timestamp'] == WHEN_MS for doc in documents)
+    assert sum('kafka.app.log.warnings' in doc for doc in documents) == 1
+
+
+def test_values_with_counts_are_not_truncated():
+    chunks = emf_values({'Values': [1.0, 2.0], 'Counts': [150, 60]})
+    assert [len(chunk) for chunk in chunks] == [100, 100, 10]
+    assert sum(sum(chunk) for chunk in chunks) == 150 + 120
+
+
+def test_file_endpoint(tmp_path):
+    path = tmp_path / 'emf.log'
+    sink = EmfSink(f'file://{path}')
+    assert sink.send(DATUMS) == 2
+    check([json.loads(line) for line in path.read_text().splitlines()])
+
+
+def test_tcp_endpoint_reconnects_after_listener_drops(local_tz):
+    listener = socket.create_server(('127.0.0.1', 0))
+    received = []
+
+    def serve(connections):
+        for _ in range(connections):
+            conn, _ = listener.accept()
+            with conn, conn.makefile() as f:
+                received.append([json.loads(line) for line in f])
+
+    server = threading.Thread(target=serve, args=(2,), daemon=True)
+    server.start()
+    sink = EmfSink(f'tcp://127.0.0.1:{listener.getsockname()[1]}')
+    assert sink.send(DATUMS) == 2
+    # Kill the kept-open socket (as when the agent restarts): the next send must land on a new connection
+    sink._sock.shutdown(socket.SHUT_WR)
+    deadline = time.time() + 5
+    while not received and time.time() < deadline:
+        time.sleep(0.01)
+    sink.send(DATUMS)
+    sink.close()
+    server.join(timeout=5)
+    listener.close()
+
+    assert len(received) == 2
+    check(received[0])
+    check(received[1])
+
+
+def test_udp_endpoint_sends_one_document_per_datagram(local_tz):
+    listener = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    listener.bind(('127.0.0.1', 0))
+    listener.settimeout(5)
+    sink = EmfSink(f'udp://127.0.0.1:{listener.getsockname()[1]}')
+    assert sink.send(DATUMS) == 2
+    datagrams = [listener.recv(65536) for _ in range(2)]
+    sink.close()
+    listener.close()
+
+    assert all(d.endswith(b'\n') and d.count(b'\n') == 1 for d in datagrams)
+    check([json.loads(d) for d in datagrams])
+
+
+def test_unsupported_endpoint():
+    with pytest.raises(ValueError):
+        EmfSink('http://127.0.0.1:25888')
@@ -0,0 +1,215 @@
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from freshness import FreshnessIndex, series_key
+from sinks import PutMetricDataSink
+from spool import MAX_DATUM_AGE, MetricSpool, SpoolDrainer, SpoolingSink
+
+
+class ClientError(Exception):
+    """Shaped like botocore's ClientError as far as the spool cares"""
+
+    def __init__(self, code, status):
+        super().__init__(f"{code} ({status})")
+        self.response = {'Error': {'Code': code}, 'ResponseMetadata': {'HTTPStatusCode': status}}
+
+
+class RecordingSink:
+    def __init__(self):
+        self.batches = []
+        self.fail_with = None
+        self.reject = lambda datums: None
+
+    def send(self, datums):
+        if self.fail_with is not None:
+            raise self.fail_with
+        error = self.reject(datums)
+        if error is not None:
+            raise error
+        self.batches.append(datums)
+        return 1
+
+    def close(self):
+        pass
+
+
+def batch(n, **extra):
+    return [dict({'MetricName': 'm', 'Value': float(n)}, **extra)]
+
+
+def values(batches):
+    return [b[0]['Value'] for b in batches]
+
+
+@pytest.fixture
+def spool(tmp_path):
+    return MetricSpool(str(tmp_path / 'spool'))
+
+
+def drain_all(drainer):
+    while drainer.drain_once():
+        pass
+
+
+def test_failed_send_is_spooled(spool):
+    sink = RecordingSink()
+    sink.fail_with = OSError('connection refused')
+    publisher = SpoolingSink(sink, spool)
+
+    assert publisher.send(batch(1)) == 0
+    assert spool
+    assert spool.peek()[3] == batch(1)
+
+
+def test_new_batches_queue_behind_backlog_and_replay_in_order(spool):
+    sink = RecordingSink()
+    publisher = SpoolingSink(sink, spool)
+    sink.fail_with = OSError('down')
+    publisher.send(batch(1))
+    sink.fail_with = None
+    publisher.send(batch(2))
+    publisher.send(batch(3))
+
+    assert sink.batches == []
+    drain_all(SpoolDrainer(spool, sink))
+    assert values(sink.batches) == [1, 2, 3]
+    assert not spool
+
+    publisher.send(batch(4))
+    assert values(sink.batches) == [1, 2, 3, 4]
+
+
+def test_oldest_segment_evicted_over_cap(tmp_path):
+    spool = MetricSpool(str(tmp_path), max_bytes=400, segment_bytes=100)
+    for n in range(20):
+        spool.append(batch(n))
+
+    assert spool.size() <= 400 + 100
+    assert spool.evicted_batches > 0
+    sink = RecordingSink()
+    drain_all(SpoolDrainer(spool, sink))
+    replayed = values(sink.batches)
+    assert replayed == sorted(replayed)
+    assert replayed[-1] == 19
+    assert replayed[0] == spool.evicted_batches
+
+
+def test_cursor_survives_restart(tmp_path):
+    directory = str(tmp_path)
+    spool = MetricSpool(directory)
+    for n in (1, 2, 3):
+        spool.append(batch(n))
+    sink = RecordingSink()
+    SpoolDrainer(spool, sink).drain_once()
+
+    restarted = MetricSpool(directory)
+    drain_all(SpoolDrainer(restarted, sink))
+    assert values(sink.batches) == [1, 2, 3]
+
+
+def test_datums_outside_timestamp_window_are_dropped(spool):
+    now = datetime.utcnow()
+    spool.append([{'MetricName': 'old', 'Value': 1.0, 'Timestamp': now - MAX_DATUM_AGE - timedelta(minutes=1)},
+                  {'MetricName': 'new', 'Value': 2.0, 'Timestamp': now}])
+    spool.append(batch(3, Timestamp=now - timedelta(days=30)))
+    sink = RecordingSink()
+    drainer = SpoolDrainer(spool, sink)
+    drain_all(drainer)
+
+    assert [[d['MetricName'] for d in b] for b in sink.batches] == [['new']]
+    assert sink.batches[0][0]['Timestamp'] == now
+    assert drainer.expired == 2
+    assert not spool
+
+
+def test_poison_batch_is_quarantined_and_skipped(spool):
+    sink = RecordingSink()
+    sink.reject = lambda datums: ClientError('InvalidParameterValue', 400) if datums[0]['Value'] == 2 else None
+    for n in (1, 2, 3):
+        spool.append(batch(n))
+    drainer = SpoolDrainer(spool, sink)
+    drain_all(drainer)
+
+    assert values(sink.batches) == [1, 3]
+    assert drainer.rejected == 1
+    assert spool.quarantined_batches == 1
+    with open(os.path.join(spool.directory, 'quarantine.jsonl')) as f:
+        record = json.loads(f.readline())
+    assert record['datums'] == batch(2)
+    assert 'InvalidParameterValue' in record['reason']
+
+
+def test_rejected_live_send_is_not_spooled(spool):
+    sink = RecordingSink()
+    sink.fail_with = ClientError('InvalidParameterValue', 400)
+    SpoolingSink(sink, spool).send(batch(1))
+
+    assert not spool
+    assert spool.quarantined_batches == 1
+
+
+@pytest.mark.parametrize('error', [ClientError('Throttling', 400), ClientError('InternalServiceError', 500),
+                                   OSError('timed out')])
+def test_transient_errors_keep_the_batch(spool, error):
+    sink = RecordingSink()
+    sink.fail_with = error
+    spool.append(batch(1))
+    drainer = SpoolDrainer(spool, sink)
+
+    with pytest.raises(type(error)):
+        drainer.drain_once()
+    assert spool.quarantined_batches == 0
+    sink.fail_with = None
+    drain_all(drainer)
+    assert values(sink.batches) == [1]
+
+
+def test_replayed_batches_are_reported_as_sent(spool):
+    sink = RecordingSink()
+    sent = []
+    spool.append(batch(1))
+    spool.append(batch(2, Timestamp=datetime.utcnow() - timedelta(days=30)))
+    drain_all(SpoolDrainer(spool, sink, on_sent=sent.append))
+
+    assert sent == [batch(1)]
+
+
+def test_put_metric_data_errors_are_spooled_and_replayed(cloudwatch, spool):
+    now = datetime.utcnow().replace(microsecond=0)
+    dims = [{'Name': 'InstanceId', 'Value': 'i-1'}]
+    datums = [{'MetricName': 'kafka.partition.offline', 'Value': 0.0, 'Unit': 'Count', 'Timestamp': now,
+               'Dimensions': dims}]
+    freshness = FreshnessIndex(default_slo=600)
+    key = series_key('kafka.partition.offline', dims)
+    freshness.expect([key], now=time.time() - 3600)  # last sent an hour ago
+    sink = PutMetricDataSink(cloudwatch.client())
+    publisher = SpoolingSink(sink, spool)
+    drainer = SpoolDrainer(spool, sink, on_sent=freshness.record)
+
+    cloudwatch.failures.extend([(400, 'Throttling'), (400, 'Throttling'), (500, 'InternalServiceError')])
+    assert publisher.send(datums) == 0  # throttled: spooled
+    assert spool
+    with pytest.raises(Exception, match='Throttling'):
+        drainer.drain_once()
+    assert drainer.rate == 1.0
+    with pytest.raises(Exception, match='InternalServiceError'):
+        drainer.drain_once()
+    assert drainer.rate == drainer.min_rate
+    assert [k for k, _, _ in freshness.stale()] == [key]
+
+    drain_all(drainer)
+    assert not spool
+    assert drainer.replayed == 1
+    assert freshness.stale() == []
+    (replayed,) = cloudwatch.requests('PutMetricData')[-1]['MetricData']
+    assert replayed['MetricName'] == 'kafka.partition.offline'
+    assert len(cloudwatch.requests('PutMetricData')) == 4
+
+    cloudwatch.failures.append((400, 'InvalidParameterValue'))
+    assert publisher.send(datums) == 0
+    assert not spool and spool.quarantined_batches == 1
+    assert publisher.send(datums) == 1
@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+
+import widget_verifier
+from widget_verifier import build_queries, fetch_latest, verify_instances
+
+METRICS = [('kafka.partition.offline', {'ClusterName': 'kafka-cluster'}),
+           ('kafka.producer.request-rate', {'ProducerGroupName': 'KafkaProducer', 'client-id': 'dashboard-java-producer'})]
+
+
+def series(instance_id, name, dims):
+    return name, frozenset(dict(dims, InstanceId=instance_id).items())
+
+
+def test_build_queries():
+    queries = build_queries('i-1', METRICS, period=60, id_prefix='x')
+    assert [q['Id'] for q in queries] == ['x0', 'x1']
+    assert queries[1]['MetricStat'] == {
+        'Metric': {'Namespace': 'CWAgent', 'MetricName': 'kafka.producer.request-rate',
+                   'Dimensions': [{'Name': 'InstanceId', 'Value': 'i-1'},
+                                  {'Name': 'ProducerGroupName', 'Value': 'KafkaProducer'},
+                                  {'Name': 'client-id', 'Value': 'dashboard-java-producer'}]},
+        'Period': 60,
+        'Stat': 'Average',
+    }
+    assert all(q['ReturnData'] for q in queries)
+
+
+def test_fetch_latest_batches_500_queries_and_follows_next_token(cloudwatch):
+    metrics = [(f'kafka.test.m{n}', {'ClusterName': 'kafka-cluster'}) for n in range(1201)]
+    queries = build_queries('i-1', metrics)
+    for n in range(0, 1201, 100):
+        cloudwatch.values[series('i-1', *metrics[n])] = n
+    cloudwatch.page_size = 200
+    end = datetime.utcnow()
+
+    latest = fetch_latest(cloudwatch.client(), queries, end - timedelta(minutes=15), end)
+
+    assert latest == {f'm{n}': float(n) for n in range(0, 1201, 100)}
+    requests = cloudwatch.requests('GetMetricData')
+    # 500 + 500 + 201 queries, each paged 200 results at a time
+    assert [(len(r['MetricDataQueries']), r.get('NextToken')) for r in requests] == [
+        (500, None), (500, '200'), (500, '400'),
+        (500, None), (500, '200'), (500, '400'),
+        (201, None), (201, '200')]
+    assert all(r['ScanBy'] == 'TimestampDescending' for r in requests)
+
+
+def test_verify_instances_in_shared_calls(cloudwatch):
+    cloudwatch.values[series('i-1', *METRICS[0])] = 0
+    cloudwatch.values[series('i-1', *METRICS[1])] = 12.5
+    cloudwatch.values[series('i-2', *METRICS[1])] = 3
+
+    results = verify_instances(cloudwatch.client(), ['i-1', 'i-2'], METRICS)
+
+    assert len(cloudwatch.requests('GetMetricData')) == 1
+    assert [(r.metric, r.value, r.ok) for r in results['i-1']] == [
+        ('kafka.partition.offline', 0.0, True), ('kafka.producer.request-rate', 12.5, True)]
+    assert [(r.metric, r.value, r.ok) for r in results['i-2']] == [
+        ('kafka.partition.offline', None, False), ('kafka.producer.request-rate', 3.0, True)]
+
+
+def test_client_uses_the_stub_endpoint(cloudwatch, monkeypatch):
+    monkeypatch.setattr(widget_verifier, 'ENDPOINT_URL', cloudwatch.url)
+    monkeypatch.setattr(widget_verifier, '_client', None)
+    for name in ('AWS_ACCESS_KEY_ID', 'AWS_SECRET_ACCESS_KEY'):
+        monkeypatch.setenv(name, 'testing')
+    cloudwatch.values[series('i-1', *METRICS[0])] = 1
+
+    results = widget_verifier.verify_widgets(instance_id='i-1', metrics=METRICS)
+    assert [r.ok for r in results] == [True, False]